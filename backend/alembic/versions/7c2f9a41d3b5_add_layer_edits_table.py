@@ -0,0 +1,44 @@
+"""Add layer_edits table
+
+Revision ID: 7c2f9a41d3b5
+Revises: e3d11425572b
+Create Date: 2026-10-17 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2f9a41d3b5'
+down_revision: Union[str, Sequence[str], None] = 'e3d11425572b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ordered, non-destructive edit operations per layer
+    op.create_table(
+        'layer_edits',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('layer_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),  # Order within the layer's stack
+        sa.Column('op', sa.String(length=50), nullable=False),  # e.g., "crop", "rotate", "brush"
+        sa.Column('params', sa.JSON(), nullable=False),  # Operation parameters
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['layer_id'], ['layers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_layer_edits_id', 'layer_edits', ['id'])
+    op.create_index('ix_layer_edits_layer_id', 'layer_edits', ['layer_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Drop the layer_edits table
+    op.drop_index('ix_layer_edits_layer_id', table_name='layer_edits')
+    op.drop_index('ix_layer_edits_id', table_name='layer_edits')
+    op.drop_table('layer_edits')
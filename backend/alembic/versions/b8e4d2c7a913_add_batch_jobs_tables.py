@@ -0,0 +1,72 @@
+"""Add batch_jobs and batch_job_items tables
+
+Revision ID: b8e4d2c7a913
+Revises: 7c2f9a41d3b5
+Create Date: 2026-10-17 14:05:52.913204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4d2c7a913'
+down_revision: Union[str, Sequence[str], None] = '7c2f9a41d3b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Durable queue of batch operations
+    op.create_table(
+        'batch_jobs',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),  # e.g., "export", "process"
+        sa.Column('status', sa.String(length=20), nullable=False),  # queued, running, completed, failed, cancelled
+        sa.Column('priority', sa.Integer(), nullable=False),  # Higher runs first
+        sa.Column('payload', sa.JSON(), nullable=False),  # Settings shared by every item
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('completed', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('item_seconds', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_batch_jobs_id', 'batch_jobs', ['id'])
+    op.create_index('ix_batch_jobs_status', 'batch_jobs', ['status'])
+
+    # One row per layer in a job
+    op.create_table(
+        'batch_job_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.String(length=36), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),  # Order within the job
+        sa.Column('layer_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),  # pending, running, completed, failed, cancelled
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['batch_jobs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_batch_job_items_id', 'batch_job_items', ['id'])
+    op.create_index('ix_batch_job_items_job_id', 'batch_job_items', ['job_id'])
+    op.create_index('ix_batch_job_items_status', 'batch_job_items', ['status'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Drop the job tables
+    op.drop_index('ix_batch_job_items_status', table_name='batch_job_items')
+    op.drop_index('ix_batch_job_items_job_id', table_name='batch_job_items')
+    op.drop_index('ix_batch_job_items_id', table_name='batch_job_items')
+    op.drop_table('batch_job_items')
+    op.drop_index('ix_batch_jobs_status', table_name='batch_jobs')
+    op.drop_index('ix_batch_jobs_id', table_name='batch_jobs')
+    op.drop_table('batch_jobs')
@@ -0,0 +1,46 @@
+"""Add content-addressed originals
+
+Revision ID: c41f7e2a9b06
+Revises: b8e4d2c7a913
+Create Date: 2026-10-17 16:22:08.417530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7e2a9b06'
+down_revision: Union[str, Sequence[str], None] = 'b8e4d2c7a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # One row per stored original, counting the images that reference it
+    op.create_table(
+        'originals',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+
+    # Images point at their original by content hash
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_images_content_hash', ['content_hash'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Drop the content hash and the originals table
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.drop_index('ix_images_content_hash')
+        batch_op.drop_column('content_hash')
+    op.drop_table('originals')
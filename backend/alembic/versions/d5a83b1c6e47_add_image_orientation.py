@@ -0,0 +1,32 @@
+"""Add image orientation
+
+Revision ID: d5a83b1c6e47
+Revises: c41f7e2a9b06
+Create Date: 2026-10-17 17:48:31.206114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a83b1c6e47'
+down_revision: Union[str, Sequence[str], None] = 'c41f7e2a9b06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # EXIF orientation read from the image header at import
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.add_column(sa.Column('orientation', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Drop the orientation column
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.drop_column('orientation')
@@ -0,0 +1,60 @@
+"""Add image camera metadata
+
+Revision ID: f2b97c3d0e18
+Revises: d5a83b1c6e47
+Create Date: 2026-10-17 19:12:05.482317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b97c3d0e18'
+down_revision: Union[str, Sequence[str], None] = 'd5a83b1c6e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+METADATA_COLUMNS = (
+    ('camera_make', sa.String(length=64)),
+    ('camera_model', sa.String(length=64)),
+    ('lens_model', sa.String(length=128)),
+    ('iso', sa.Integer()),
+    ('aperture', sa.Float()),
+    ('exposure_time', sa.Float()),
+    ('focal_length', sa.Float()),
+    ('captured_at', sa.DateTime()),
+)
+
+SINGLE_INDEXES = ('iso', 'aperture', 'exposure_time', 'focal_length', 'captured_at')
+
+# Existing columns the library can also sort by
+SORT_INDEXES = ('created_at', 'filename')
+
+COMPOSITE_INDEXES = ('camera_make', 'camera_model', 'lens_model')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # EXIF metadata read at import, indexed for library queries
+    with op.batch_alter_table('images') as batch_op:
+        for name, column_type in METADATA_COLUMNS:
+            batch_op.add_column(sa.Column(name, column_type, nullable=True))
+        for name in SINGLE_INDEXES + SORT_INDEXES:
+            batch_op.create_index(f'ix_images_{name}', [name], unique=False)
+        for name in COMPOSITE_INDEXES:
+            batch_op.create_index(f'ix_images_{name}_captured_at', [name, 'captured_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Drop the metadata indexes and columns
+    with op.batch_alter_table('images') as batch_op:
+        for name in COMPOSITE_INDEXES:
+            batch_op.drop_index(f'ix_images_{name}_captured_at')
+        for name in SINGLE_INDEXES + SORT_INDEXES:
+            batch_op.drop_index(f'ix_images_{name}')
+        for name, _ in METADATA_COLUMNS:
+            batch_op.drop_column(name)
@@ -2,19 +2,25 @@
 Image Adjustments API
 Apply real-time adjustments using OpenCV image processor
 """
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Response
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from typing import Optional
 import numpy as np
 import cv2
 from pathlib import Path
+import time
 
-from backend.db import get_db
+from backend.db import get_db, SessionLocal
 from backend.models.layers import Layer
-from backend.services.image_processor import ImageProcessor
+from backend.services.image_processor import ImageProcessor, AdjustmentPipeline
+from backend.services.pyramid import fit_to_size
+from backend.services.edit_stack import layer_source_path, render_layer
+from backend.services.preview import PreviewCoalescer, encode_image
+from backend.services.compute import ComputeQueueFull, compute_executor
 
 router = APIRouter(prefix="/api/adjustments", tags=["adjustments"])
+preview_coalescer = PreviewCoalescer()
 
 
 class AdjustmentRequest(BaseModel):
@@ -26,13 +32,16 @@ class AdjustmentRequest(BaseModel):
     highlights: Optional[float] = 0
     shadows: Optional[float] = 0
     sharpness: Optional[float] = 1.0
+    preview_size: Optional[int] = None  # Longest side in px; renders from a pyramid proxy
 
 
-@router.post("/apply")
-async def apply_adjustments(request: AdjustmentRequest, db: Session = Depends(get_db)):
-    """
-    Apply adjustments to a layer and return processed image
-    """
+class PreviewRequest(AdjustmentRequest):
+    """Live preview request; the rendered JPEG is returned in the response body"""
+    preview_size: int = Field(1024, gt=0)  # Previews are always rendered from a proxy
+    quality: int = Field(80, ge=1, le=100)  # JPEG quality
+
+
+def _apply_adjustments(request: AdjustmentRequest, db: Session):
     try:
         # Get layer from database
         layer = db.query(Layer).filter(Layer.id == request.layer_id).first()
@@ -42,39 +51,25 @@ async def apply_adjustments(request: AdjustmentRequest, db: Session = Depends(ge
         if not layer.content:
             raise HTTPException(status_code=400, detail="Layer has no image content")
         
-        # Load original image
-        img = ImageProcessor.load_image(layer.content)
-        
-        # Apply adjustments in sequence
-        if request.brightness != 0:
-            img = ImageProcessor.adjust_brightness(img, request.brightness)
+        # Render the layer's edit stack, for previews on the smallest proxy level that is large enough
+        img = render_layer(db, layer, preview_size=request.preview_size)
+        if request.preview_size:
+            img = fit_to_size(img, request.preview_size)
         
-        if request.contrast != 0:
-            img = ImageProcessor.adjust_contrast(img, request.contrast)
-        
-        if request.saturation != 0:
-            img = ImageProcessor.adjust_saturation(img, request.saturation)
-        
-        if request.exposure != 0:
-            img = ImageProcessor.adjust_exposure(img, request.exposure)
-        
-        if request.highlights != 0:
-            img = ImageProcessor.adjust_highlights(img, request.highlights)
-        
-        if request.shadows != 0:
-            img = ImageProcessor.adjust_shadows(img, request.shadows)
-        
-        if request.sharpness != 1.0:
-            img = ImageProcessor.sharpen(img, request.sharpness)
+        # Apply all adjustments in a single fused pass
+        img = AdjustmentPipeline.from_request(request).apply(img)
         
         # Save processed image to temp location
-        temp_path = Path(layer.content).parent / f"adjusted_{layer.id}.jpg"
+        temp_path = Path(layer_source_path(layer)).parent / f"adjusted_{layer.id}.jpg"
         ImageProcessor.save_image(img, str(temp_path))
         
         return {
             "success": True,
             "layer_id": layer.id,
             "processed_path": str(temp_path),
+            "width": img.shape[1],
+            "height": img.shape[0],
+            "preview_size": request.preview_size,
             "adjustments_applied": {
                 "brightness": request.brightness,
                 "contrast": request.contrast,
@@ -87,4 +82,67 @@ async def apply_adjustments(request: AdjustmentRequest, db: Session = Depends(ge
         }
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error applying adjustments: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error applying adjustments: {str(e)}")
+
+
+def _render_preview(layer: Layer, request: PreviewRequest) -> bytes:
+    """Render an adjusted preview from the pyramid and encode it in memory"""
+    with SessionLocal() as db:
+        img = render_layer(db, layer, preview_size=request.preview_size)
+    img = fit_to_size(img, request.preview_size)
+    img = AdjustmentPipeline.from_request(request).apply(img)
+    return encode_image(img, ".jpg", request.quality)
+
+
+@router.post("/apply")
+async def apply_adjustments(request: AdjustmentRequest, db: Session = Depends(get_db)):
+    """
+    Apply adjustments to a layer and return processed image
+    """
+    return await compute_executor.run("adjustments", _apply_adjustments, request, db)
+
+
+@router.post("/preview")
+async def preview_adjustments(request: PreviewRequest, db: Session = Depends(get_db)):
+    """
+    Render a live adjustment preview and stream the JPEG bytes back.
+    Nothing is written to disk. If a newer preview request for the same
+    layer arrives while this one is still waiting for its turn, this one
+    returns 204 No Content without rendering. A render that has started is
+    always returned: it is newer than what the client is showing, so a
+    continuous slider drag keeps producing frames.
+    """
+    layer = db.query(Layer).filter(Layer.id == request.layer_id).first()
+    if not layer:
+        raise HTTPException(status_code=404, detail="Layer not found")
+    
+    if not layer.content:
+        raise HTTPException(status_code=400, detail="Layer has no image content")
+    
+    ticket = preview_coalescer.begin(layer.id)
+    try:
+        async with preview_coalescer.lock(layer.id):
+            if not preview_coalescer.is_current(layer.id, ticket):
+                return Response(status_code=204)
+        
+            started = time.perf_counter()
+            try:
+                data = await compute_executor.run("preview", _render_preview, layer, request)
+            except ComputeQueueFull:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error rendering preview: {str(e)}")
+            render_ms = (time.perf_counter() - started) * 1000
+    
+        return Response(
+            content=data,
+            media_type="image/jpeg",
+            headers={
+                "Cache-Control": "no-store",
+                "X-Preview-Ticket": str(ticket),
+                "X-Render-Time-Ms": f"{render_ms:.1f}",
+            }
+        )
+    finally:
+        # Forget the layer once its newest request is done
+        preview_coalescer.finish(layer.id, ticket)
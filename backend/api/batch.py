@@ -1,17 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from fastapi import Depends
 from typing import List, Optional
 from pydantic import BaseModel
-from pathlib import Path
-import shutil
 import uuid
-from datetime import datetime
 
 from ..db import get_db
 from ..models.models import Image
 from ..models.projects import Project
-from ..services.image_processor import ImageProcessor
+from ..services.compute import compute_executor
+from ..services.jobs import job_queue
+from ..services.library import apply_metadata
+from ..services.originals import acquire_original, remove_unreferenced
+from ..services.thumbnails import generate_renditions_quietly
+from ..services.uploads import IMPORT_COMMIT_CHUNK, StreamingMultipartImporter, UploadedFile
 
 router = APIRouter()
 
@@ -27,37 +30,36 @@ class BatchExportRequest(BaseModel):
     format: str = "jpeg"
     quality: int = 95
     prefix: str = "exported"
-
-class BatchExportResponse(BaseModel):
-    batch_id: str
-    total_files: int
-    exported: List[dict]
-    failed: List[dict]
+    priority: int = 0  # Higher runs first
 
 class BatchProcessRequest(BaseModel):
     layer_ids: List[int]
     adjustments: dict
     output_format: str = "jpeg"
+    priority: int = 0  # Higher runs first
 
-# Storage setup
-UPLOAD_DIR = Path("backend/uploads")
-EXPORT_DIR = Path("backend/exports")
-UPLOAD_DIR.mkdir(exist_ok=True)
-EXPORT_DIR.mkdir(exist_ok=True)
+class BatchPriorityRequest(BaseModel):
+    priority: int  # Higher runs first
 
 @router.post("/batch/import", response_model=BatchImportResponse)
 async def batch_import_images(
-    files: List[UploadFile] = File(...),
+    request: Request,
+    background_tasks: BackgroundTasks,
     project_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
     """
     Import multiple images at once.
     Supports drag-and-drop multi-file import.
+    
+    The multipart body is parsed as it arrives: each file is written to
+    disk, hashed and validated chunk by chunk, and all image rows are
+    inserted at the end (in chunks of DARKROOM_IMPORT_COMMIT_CHUNK rows
+    when set), so neither the upload nor the commits scale with file count.
+    Files whose content is already stored share the existing original.
+    Thumbnails and screen previews are generated after the response.
     """
     batch_id = str(uuid.uuid4())
-    imported = []
-    failed = []
     
     # Verify project exists if provided
     if project_id:
@@ -65,48 +67,24 @@ async def batch_import_images(
         if not project:
             raise HTTPException(status_code=404, detail="Project not found")
     
-    for file in files:
-        try:
-            # Validate file type
-            if not file.content_type or not file.content_type.startswith('image/'):
-                failed.append({
-                    "filename": file.filename,
-                    "error": "Invalid file type. Must be an image."
-                })
-                continue
-            
-            # Save file
-            file_extension = Path(file.filename).suffix
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            file_path = UPLOAD_DIR / unique_filename
-            
-            with file_path.open("wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            # Create database record
-            db_image = Image(
-                filename=file.filename,
-                path=f"/uploads/{unique_filename}",
-                original_path=str(file_path)
-            )
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
-            
-            imported.append({
-                "id": db_image.id,
-                "filename": file.filename,
-                "path": db_image.path,
-                "size": file_path.stat().st_size
-            })
-            
-        except Exception as e:
-            failed.append({
-                "filename": file.filename,
-                "error": str(e)
-            })
-            db.rollback()
+    try:
+        importer = StreamingMultipartImporter(request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(importer.write, chunk)
+        files = await run_in_threadpool(importer.finish)
+    except Exception:
+        # Client disconnected or sent a malformed body
+        importer.discard()
+        raise
+    imported = await run_in_threadpool(_insert_images, db, [f for f in files if not f.error])
+    originals = {f.sha256: str(f.path) for f in files if not f.error}
+    background_tasks.add_task(generate_renditions_quietly, [(path, key) for key, path in originals.items()])
     
+    failed = [{"filename": f.filename, "error": f.error} for f in files if f.error]
     return BatchImportResponse(
         batch_id=batch_id,
         total_files=len(files),
@@ -114,185 +92,126 @@ async def batch_import_images(
         failed=failed
     )
 
-@router.post("/batch/export", response_model=BatchExportResponse)
+def _insert_images(db: Session, files: List[UploadedFile]) -> List[dict]:
+    chunk_size = IMPORT_COMMIT_CHUNK or len(files) or 1
+    imported = []
+    for start in range(0, len(files), chunk_size):
+        chunk = files[start:start + chunk_size]
+        rows = [
+            apply_metadata(Image(
+                filename=f.filename,
+                filepath=str(f.path.resolve()),
+                width=f.width,
+                height=f.height,
+                format=f.format,
+                orientation=f.orientation,
+                content_hash=f.sha256
+            ), f.metadata)
+            for f in chunk
+        ]
+        try:
+            db.add_all(rows)
+            for f in chunk:
+                acquire_original(db, f.sha256, f.path, f.size)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Earlier chunks are committed; only blobs nothing references are removed
+            for f in files[start:]:
+                if f.created:
+                    remove_unreferenced(db, f.sha256, f.path)
+            raise
+        imported.extend(
+            {
+                "id": row.id,
+                "filename": f.filename,
+                "path": str(f.path.resolve()),
+                "size": f.size,
+                "sha256": f.sha256,
+                "width": f.width,
+                "height": f.height,
+                "orientation": f.orientation
+            }
+            for row, f in zip(rows, chunk)
+        )
+    return imported
+
+def _submit_batch(kind: str, layer_ids: List[int], payload: dict, priority: int, db: Session) -> dict:
+    job = job_queue.submit(db, kind, layer_ids, payload, priority=priority)
+    return job_queue.status(db, job.id)
+
+@router.post("/batch/export", status_code=202)
 async def batch_export_images(
     request: BatchExportRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
     Export multiple images with the same settings.
     Useful for batch processing workflows.
-    """
-    batch_id = str(uuid.uuid4())
-    exported = []
-    failed = []
-    
-    processor = ImageProcessor()
     
-    for layer_id in request.layer_ids:
-        try:
-            # Get layer from database (you'll need to import Layer model)
-            from ..models.layers import Layer
-            layer = db.query(Layer).filter(Layer.id == layer_id).first()
-            
-            if not layer:
-                failed.append({
-                    "layer_id": layer_id,
-                    "error": "Layer not found"
-                })
-                continue
-            
-            # Get original image path
-            image = db.query(Image).filter(Image.id == layer.image_id).first()
-            if not image:
-                failed.append({
-                    "layer_id": layer_id,
-                    "error": "Image not found"
-                })
-                continue
-            
-            # Load and export image
-            input_path = Path(image.original_path)
-            if not input_path.exists():
-                # Try relative path
-                input_path = UPLOAD_DIR / Path(image.path).name
-            
-            if not input_path.exists():
-                failed.append({
-                    "layer_id": layer_id,
-                    "error": "Image file not found"
-                })
-                continue
-            
-            # Generate output filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_filename = f"{request.prefix}_{layer_id}_{timestamp}.{request.format}"
-            output_path = EXPORT_DIR / output_filename
-            
-            # Export with quality settings
-            img = processor.load_image(str(input_path))
-            processor.save_image(img, str(output_path), quality=request.quality)
-            
-            exported.append({
-                "layer_id": layer_id,
-                "filename": output_filename,
-                "path": f"/exports/{output_filename}",
-                "size": output_path.stat().st_size
-            })
-            
-        except Exception as e:
-            failed.append({
-                "layer_id": layer_id,
-                "error": str(e)
-            })
-    
-    return BatchExportResponse(
-        batch_id=batch_id,
-        total_files=len(request.layer_ids),
-        exported=exported,
-        failed=failed
+    The export is queued as a background job and this returns immediately;
+    poll /batch/{batch_id}/status for progress.
+    """
+    payload = {"format": request.format, "quality": request.quality, "prefix": request.prefix}
+    return await compute_executor.run(
+        "batch", _submit_batch, "export", request.layer_ids, payload, request.priority, db
     )
 
-@router.post("/batch/process")
+@router.post("/batch/process", status_code=202)
 async def batch_process_images(
     request: BatchProcessRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
     Apply the same adjustments to multiple images.
     Perfect for consistent batch editing.
-    """
-    batch_id = str(uuid.uuid4())
-    processed = []
-    failed = []
-    
-    processor = ImageProcessor()
     
-    for layer_id in request.layer_ids:
-        try:
-            from ..models.layers import Layer
-            layer = db.query(Layer).filter(Layer.id == layer_id).first()
-            
-            if not layer:
-                failed.append({
-                    "layer_id": layer_id,
-                    "error": "Layer not found"
-                })
-                continue
-            
-            image = db.query(Image).filter(Image.id == layer.image_id).first()
-            if not image:
-                failed.append({
-                    "layer_id": layer_id,
-                    "error": "Image not found"
-                })
-                continue
-            
-            # Load image
-            input_path = Path(image.original_path)
-            if not input_path.exists():
-                input_path = UPLOAD_DIR / Path(image.path).name
-            
-            if not input_path.exists():
-                failed.append({
-                    "layer_id": layer_id,
-                    "error": "Image file not found"
-                })
-                continue
-            
-            img = processor.load_image(str(input_path))
-            
-            # Apply adjustments
-            adjustments = request.adjustments
-            if adjustments.get('brightness'):
-                img = processor.adjust_brightness(img, adjustments['brightness'])
-            if adjustments.get('contrast'):
-                img = processor.adjust_contrast(img, adjustments['contrast'])
-            if adjustments.get('saturation'):
-                img = processor.adjust_saturation(img, adjustments['saturation'])
-            
-            # Save processed image
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_filename = f"processed_{layer_id}_{timestamp}.{request.output_format}"
-            output_path = UPLOAD_DIR / output_filename
-            
-            processor.save_image(img, str(output_path))
-            
-            # Update layer path
-            layer.image_path = f"/uploads/{output_filename}"
-            db.commit()
-            
-            processed.append({
-                "layer_id": layer_id,
-                "path": f"/uploads/{output_filename}"
-            })
-            
-        except Exception as e:
-            failed.append({
-                "layer_id": layer_id,
-                "error": str(e)
-            })
-            db.rollback()
-    
-    return {
-        "batch_id": batch_id,
-        "total_files": len(request.layer_ids),
-        "processed": processed,
-        "failed": failed
-    }
+    Processing is queued as a background job and this returns immediately;
+    poll /batch/{batch_id}/status for progress.
+    """
+    payload = {"adjustments": request.adjustments, "output_format": request.output_format}
+    return await compute_executor.run(
+        "batch", _submit_batch, "process", request.layer_ids, payload, request.priority, db
+    )
 
 @router.get("/batch/{batch_id}/status")
-async def get_batch_status(batch_id: str):
+async def get_batch_status(
+    batch_id: str,
+    include_items: bool = False,
+    db: Session = Depends(get_db)
+):
     """
     Get the status of a batch operation.
     Useful for tracking long-running batch jobs.
+    
+    Reports per-item counts, percent complete and an ETA based on the
+    throughput so far; include_items adds each layer's result or error.
+    """
+    status = job_queue.status(db, batch_id, include_items=include_items)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return status
+
+@router.post("/batch/{batch_id}/cancel")
+async def cancel_batch(batch_id: str, db: Session = Depends(get_db)):
+    """
+    Cancel a batch operation. Items already being processed finish; the
+    rest are skipped.
+    """
+    if job_queue.cancel(db, batch_id) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return job_queue.status(db, batch_id)
+
+@router.patch("/batch/{batch_id}")
+async def reorder_batch(
+    batch_id: str,
+    request: BatchPriorityRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Change a batch operation's priority. Higher priorities run first; jobs
+    with equal priority run in submission order.
     """
-    # In a real implementation, you'd store batch status in database or cache
-    return {
-        "batch_id": batch_id,
-        "status": "completed",
-        "progress": 100,
-        "message": "Batch operation completed successfully"
-    }
\ No newline at end of file
+    if job_queue.set_priority(db, batch_id, request.priority) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return job_queue.status(db, batch_id)
@@ -3,26 +3,44 @@ Brush Tool API - Handle brush stroke saving and rendering
 """
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Tuple
-import numpy as np
-import cv2
+import math
 from pathlib import Path
 
 from backend.db import get_db
+from backend.models.edits import LayerEdit
 from backend.models.layers import Layer
-from backend.services.image_processor import ImageProcessor
+from backend.services.brush import pack_stroke, unpack_stroke
+from backend.services.edit_stack import append_edit, layer_size, layer_source_path
 
 router = APIRouter(prefix="/api/brush", tags=["brush"])
-processor = ImageProcessor()
+
+# Largest accepted stroke coordinate magnitude, in pixels; keeps points exact in float32 and fixed-point rasterization
+MAX_COORDINATE = 1_000_000
 
 
 class BrushStroke(BaseModel):
     """Single brush stroke data"""
-    points: List[float]  # Flattened array of x, y coordinates
-    color: str  # Hex color like "#FF0000"
-    size: int  # Brush size in pixels
-    opacity: float  # 0.0 to 1.0
+    points: List[float] = Field(min_length=2)  # Flattened array of x, y coordinates
+    color: str = Field(pattern=r"^#?[0-9A-Fa-f]{6}$")  # Hex color like "#FF0000"
+    size: int = Field(ge=1)  # Brush size in pixels
+    opacity: float = Field(ge=0.0, le=1.0)  # 0.0 to 1.0
+
+    @field_validator("points")
+    @classmethod
+    def _check_pairs(cls, points: List[float]) -> List[float]:
+        if len(points) % 2:
+            raise ValueError("points must be x, y pairs")
+        return points
+
+    def drawable(self) -> bool:
+        """
+        True if every coordinate is finite and within ``MAX_COORDINATE``.
+        Checked by the endpoint rather than a validator: validation errors
+        echo their input, and NaN cannot be encoded in the JSON response.
+        """
+        return all(math.isfinite(value) and abs(value) <= MAX_COORDINATE for value in self.points)
 
 
 class BrushSaveRequest(BaseModel):
@@ -39,56 +57,75 @@ async def save_brush_strokes(
     """
     Save brush strokes to a layer
     
-    Creates a new image with brush strokes rendered on top of existing layer image
+    Strokes are appended to the layer's non-destructive edit stack with
+    their points packed as float32, and rendered on top of the existing
+    layer image when pixels are needed. The render cache already holds the
+    layer as of the previous save, so only the new strokes are rasterized.
     """
     # Get layer from database
     layer = db.query(Layer).filter(Layer.id == request.layer_id).first()
     if not layer:
         raise HTTPException(status_code=404, detail=f"Layer {request.layer_id} not found")
     
-    # Get image path
-    image_path = layer.image_path
-    if image_path.startswith('/uploads/'):
-        image_path = image_path[9:]  # Remove /uploads/ prefix
+    if not layer.content:
+        raise HTTPException(status_code=400, detail="Layer has no image content")
     
-    full_path = Path("uploads") / image_path
-    if not full_path.exists():
-        raise HTTPException(status_code=404, detail=f"Image file not found: {image_path}")
+    # Strokes are stored and rendered later, so anything the rasterizer can't draw is refused now
+    for index, stroke in enumerate(request.strokes):
+        if not stroke.drawable():
+            raise HTTPException(
+                status_code=422,
+                detail=f"Stroke {index}: points must be finite numbers within ±{MAX_COORDINATE}"
+            )
     
-    # Load base image
-    base_image = cv2.imread(str(full_path), cv2.IMREAD_UNCHANGED)
-    if base_image is None:
-        raise HTTPException(status_code=400, detail="Failed to load image")
+    image_path = layer_source_path(layer)
+    if not Path(image_path).exists():
+        raise HTTPException(status_code=404, detail=f"Image file not found: {image_path}")
     
-    # Apply brush strokes
     try:
-        for stroke in request.strokes:
-            base_image = processor.apply_brush_stroke(
-                base_image,
-                stroke.points,
-                stroke.color,
-                stroke.size,
-                stroke.opacity
-            )
+        append_edit(db, layer, "brush", {"strokes": [pack_stroke(stroke.dict()) for stroke in request.strokes]})
+        width, height = layer_size(db, layer)
+        layer.width = width
+        layer.height = height
+        db.commit()
+        db.refresh(layer)
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to apply brush strokes: {str(e)}")
     
-    # Save modified image
-    output_filename = f"{full_path.stem}_brushed{full_path.suffix}"
-    output_path = full_path.parent / output_filename
-    cv2.imwrite(str(output_path), base_image)
-    
-    # Update layer in database
-    layer.image_path = f"/uploads/{output_filename}"
-    layer.width = base_image.shape[1]
-    layer.height = base_image.shape[0]
-    db.commit()
-    db.refresh(layer)
-    
     return {
         "success": True,
         "message": f"Brush strokes saved successfully",
         "layer_id": layer.id,
-        "new_path": layer.image_path,
+        "new_path": f"/api/edits/{layer.id}/render",
         "stroke_count": len(request.strokes)
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/{layer_id}/strokes")
+async def list_brush_strokes(layer_id: int, db: Session = Depends(get_db)):
+    """
+    List the brush strokes in a layer's edit stack, bottom first, with
+    points unpacked to flattened x, y lists
+    """
+    layer = db.query(Layer).filter(Layer.id == layer_id).first()
+    if not layer:
+        raise HTTPException(status_code=404, detail=f"Layer {layer_id} not found")
+
+    edits = (
+        db.query(LayerEdit)
+        .filter(LayerEdit.layer_id == layer_id, LayerEdit.op == "brush")
+        .order_by(LayerEdit.position)
+        .all()
+    )
+    return {
+        "layer_id": layer_id,
+        "edits": [
+            {
+                "id": edit.id,
+                "position": edit.position,
+                "strokes": [unpack_stroke(stroke) for stroke in edit.params["strokes"]],
+            }
+            for edit in edits
+        ]
+    }
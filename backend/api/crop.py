@@ -12,6 +12,9 @@ from pathlib import Path
 from backend.db import get_db
 from backend.models.layers import Layer
 from backend.services.image_processor import ImageProcessor
+from backend.services.pyramid import fit_to_size
+from backend.services.edit_stack import append_edit, layer_size, layer_source_path, render_layer
+from backend.services.compute import compute_executor
 
 router = APIRouter(prefix="/api/crop", tags=["crop"])
 
@@ -24,12 +27,26 @@ class CropRequest(BaseModel):
     width: int
     height: int
     aspect_ratio: Optional[str] = None  # e.g., "16:9", "4:3", "1:1"
+    preview_size: Optional[int] = None  # Longest side in px; renders a preview without updating the layer
 
 
 class RotateRequest(BaseModel):
     """Request model for rotate operation"""
     layer_id: int
     angle: float  # Degrees, positive = clockwise
+    preview_size: Optional[int] = None  # Longest side in px; renders a preview without updating the layer
+
+
+class FlipRequest(BaseModel):
+    """Request model for flip operation"""
+    layer_id: int
+    horizontal: bool = True  # True = mirror left-right, False = top-bottom
+
+
+class ScaleRequest(BaseModel):
+    """Request model for scale operation"""
+    layer_id: int
+    factor: float  # e.g., 0.5 halves both dimensions
 
 
 class CropResponse(BaseModel):
@@ -42,6 +59,84 @@ class CropResponse(BaseModel):
     height: Optional[int] = None
 
 
+def _preview_response(img, layer: Layer, operation: str, preview_size: int) -> CropResponse:
+    """Save a preview render next to the layer image without touching the layer"""
+    preview = fit_to_size(img, preview_size)
+    original_path = Path(layer_source_path(layer))
+    preview_path = original_path.parent / f"{original_path.stem}_{operation}_preview.jpg"
+    ImageProcessor.save_image(preview, str(preview_path))
+    
+    return CropResponse(
+        success=True,
+        message=f"{operation.capitalize()} preview rendered",
+        layer_id=layer.id,
+        new_path=str(preview_path),
+        width=preview.shape[1],
+        height=preview.shape[0]
+    )
+
+
+def _get_image_layer(db: Session, layer_id: int) -> Layer:
+    layer = db.query(Layer).filter(Layer.id == layer_id).first()
+    if not layer:
+        raise HTTPException(status_code=404, detail="Layer not found")
+    
+    if not layer.content:
+        raise HTTPException(status_code=400, detail="Layer has no content")
+    
+    image_path = layer_source_path(layer)
+    if not os.path.exists(image_path):
+        raise HTTPException(status_code=404, detail=f"Image file not found: {image_path}")
+    
+    return layer
+
+
+def _apply_crop(request: CropRequest, db: Session):
+    try:
+        layer = _get_image_layer(db, request.layer_id)
+        
+        # Clamp the crop to the layer's current (edited) size
+        width, height = layer_size(db, layer)
+        x, y, crop_width, crop_height = ImageProcessor.clamp_crop(
+            width,
+            height,
+            request.x,
+            request.y,
+            request.width,
+            request.height
+        )
+        params = {"x": x, "y": y, "width": crop_width, "height": crop_height}
+        
+        if request.preview_size:
+            cropped = render_layer(
+                db,
+                layer,
+                preview_size=request.preview_size,
+                extra_edits=[("crop", params)],
+                extent=max(crop_width, crop_height, 1)
+            )
+            return _preview_response(cropped, layer, "crop", request.preview_size)
+        
+        append_edit(db, layer, "crop", params)
+        layer.width = crop_width
+        layer.height = crop_height
+        db.commit()
+        
+        return CropResponse(
+            success=True,
+            message="Crop applied successfully",
+            layer_id=request.layer_id,
+            new_path=f"/api/edits/{layer.id}/render",
+            width=crop_width,
+            height=crop_height
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Crop failed: {str(e)}")
+
+
 @router.post("/apply", response_model=CropResponse)
 async def apply_crop(
     request: CropRequest,
@@ -50,60 +145,48 @@ async def apply_crop(
     """
     Apply crop to an image layer
     Supports both direct coordinates and aspect ratio constraints
+    
+    The crop is appended to the layer's non-destructive edit stack; the
+    original file is never rewritten.
     """
+    return await compute_executor.run("crop", _apply_crop, request, db)
+
+
+def _rotate_image(request: RotateRequest, db: Session):
     try:
-        # Get layer from database
-        layer = db.query(Layer).filter(Layer.id == request.layer_id).first()
-        if not layer:
-            raise HTTPException(status_code=404, detail="Layer not found")
-        
-        if not layer.content:
-            raise HTTPException(status_code=400, detail="Layer has no content")
-        
-        # Load the image
-        image_path = layer.content
-        if image_path.startswith("/uploads/"):
-            image_path = "backend" + image_path
-        
-        if not os.path.exists(image_path):
-            raise HTTPException(status_code=404, detail=f"Image file not found: {image_path}")
-        
-        processor = ImageProcessor()
-        img = processor.load_image(image_path)
+        layer = _get_image_layer(db, request.layer_id)
+        params = {"angle": request.angle}
         
-        # Apply crop
-        cropped = processor.crop_image(
-            img,
-            request.x,
-            request.y,
-            request.width,
-            request.height
-        )
+        if request.preview_size:
+            rotated = render_layer(
+                db,
+                layer,
+                preview_size=request.preview_size,
+                extra_edits=[("rotate", params)]
+            )
+            return _preview_response(rotated, layer, "rotate", request.preview_size)
         
-        # Save cropped image with new filename
-        original_path = Path(image_path)
-        new_filename = f"{original_path.stem}_cropped{original_path.suffix}"
-        new_path = original_path.parent / new_filename
+        width, height = layer_size(db, layer)
+        new_width, new_height = ImageProcessor.rotated_size(width, height, request.angle)
         
-        processor.save_image(cropped, str(new_path))
-        
-        # Update layer in database
-        layer.content = str(new_path).replace("backend", "")
-        layer.width = request.width
-        layer.height = request.height
+        append_edit(db, layer, "rotate", params)
+        layer.width = new_width
+        layer.height = new_height
         db.commit()
         
         return CropResponse(
             success=True,
-            message="Crop applied successfully",
+            message=f"Image rotated {request.angle}° successfully",
             layer_id=request.layer_id,
-            new_path=layer.content,
-            width=request.width,
-            height=request.height
+            new_path=f"/api/edits/{layer.id}/render",
+            width=new_width,
+            height=new_height
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Crop failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Rotation failed: {str(e)}")
 
 
 @router.post("/rotate", response_model=CropResponse)
@@ -114,51 +197,84 @@ async def rotate_image(
     """
     Rotate an image layer by arbitrary angle
     Positive angles rotate clockwise, negative counter-clockwise
+    
+    The rotation is appended to the layer's non-destructive edit stack.
     """
+    return await compute_executor.run("crop", _rotate_image, request, db)
+
+
+def _flip_image(request: FlipRequest, db: Session):
     try:
-        # Get layer from database
-        layer = db.query(Layer).filter(Layer.id == request.layer_id).first()
-        if not layer:
-            raise HTTPException(status_code=404, detail="Layer not found")
-        
-        if not layer.content:
-            raise HTTPException(status_code=400, detail="Layer has no content")
-        
-        # Load the image
-        image_path = layer.content
-        if image_path.startswith("/uploads/"):
-            image_path = "backend" + image_path
-        
-        if not os.path.exists(image_path):
-            raise HTTPException(status_code=404, detail=f"Image file not found: {image_path}")
-        
-        processor = ImageProcessor()
-        img = processor.load_image(image_path)
+        layer = _get_image_layer(db, request.layer_id)
+        width, height = layer_size(db, layer)
         
-        # Apply rotation
-        rotated = processor.rotate_image(img, request.angle)
+        append_edit(db, layer, "flip", {"horizontal": request.horizontal})
+        layer.width = width
+        layer.height = height
+        db.commit()
         
-        # Save rotated image with new filename
-        original_path = Path(image_path)
-        new_filename = f"{original_path.stem}_rotated{original_path.suffix}"
-        new_path = original_path.parent / new_filename
+        return CropResponse(
+            success=True,
+            message=f"Image flipped {'horizontally' if request.horizontal else 'vertically'}",
+            layer_id=request.layer_id,
+            new_path=f"/api/edits/{layer.id}/render",
+            width=width,
+            height=height
+        )
         
-        processor.save_image(rotated, str(new_path))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Flip failed: {str(e)}")
+
+
+@router.post("/flip", response_model=CropResponse)
+async def flip_image(
+    request: FlipRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Mirror an image layer horizontally or vertically (lossless)
+    """
+    return await compute_executor.run("crop", _flip_image, request, db)
+
+
+def _scale_image(request: ScaleRequest, db: Session):
+    if request.factor <= 0:
+        raise HTTPException(status_code=400, detail="Scale factor must be positive")
+    
+    try:
+        layer = _get_image_layer(db, request.layer_id)
+        width, height = layer_size(db, layer)
+        new_width = max(1, round(width * request.factor))
+        new_height = max(1, round(height * request.factor))
         
-        # Update layer in database
-        layer.content = str(new_path).replace("backend", "")
-        layer.width = rotated.shape[1]
-        layer.height = rotated.shape[0]
+        append_edit(db, layer, "scale", {"factor": request.factor})
+        layer.width = new_width
+        layer.height = new_height
         db.commit()
         
         return CropResponse(
             success=True,
-            message=f"Image rotated {request.angle}° successfully",
+            message=f"Image scaled by {request.factor}",
             layer_id=request.layer_id,
-            new_path=layer.content,
-            width=rotated.shape[1],
-            height=rotated.shape[0]
+            new_path=f"/api/edits/{layer.id}/render",
+            width=new_width,
+            height=new_height
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Rotation failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Scale failed: {str(e)}")
+
+
+@router.post("/scale", response_model=CropResponse)
+async def scale_image(
+    request: ScaleRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Resize an image layer by a uniform factor
+    """
+    return await compute_executor.run("crop", _scale_image, request, db)
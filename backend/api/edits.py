@@ -0,0 +1,146 @@
+"""
+Edit Stack API
+Inspect, render and undo a layer's non-destructive edit stack
+"""
+from fastapi import APIRouter, HTTPException, Depends, Response
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from backend.db import get_db
+from backend.models.edits import LayerEdit
+from backend.models.layers import Layer
+from backend.services.edit_stack import render_layer
+from backend.services.pyramid import fit_to_size
+from backend.services.preview import encode_image
+from backend.services.compute import compute_executor
+
+router = APIRouter(prefix="/api/edits", tags=["edits"])
+
+
+def _get_layer(db: Session, layer_id: int) -> Layer:
+    layer = db.query(Layer).filter(Layer.id == layer_id).first()
+    if not layer:
+        raise HTTPException(status_code=404, detail="Layer not found")
+    
+    if not layer.content:
+        raise HTTPException(status_code=400, detail="Layer has no image content")
+    
+    return layer
+
+
+def _refresh_size(db: Session, layer: Layer) -> None:
+    """Re-derive the layer size after the stack shrinks (prefix renders are cached)"""
+    img = render_layer(db, layer)
+    layer.width = img.shape[1]
+    layer.height = img.shape[0]
+
+
+@router.get("/{layer_id}")
+async def list_edits(layer_id: int, db: Session = Depends(get_db)):
+    """
+    List the operations in a layer's edit stack, bottom first
+    """
+    _get_layer(db, layer_id)
+    edits = (
+        db.query(LayerEdit)
+        .filter(LayerEdit.layer_id == layer_id)
+        .order_by(LayerEdit.position)
+        .all()
+    )
+    return {
+        "layer_id": layer_id,
+        "edits": [
+            {
+                "id": edit.id,
+                "position": edit.position,
+                "op": edit.op,
+                "params": edit.params,
+                "created_at": edit.created_at,
+            }
+            for edit in edits
+        ]
+    }
+
+
+def _render_edits(layer_id: int, preview_size: Optional[int], quality: int, db: Session):
+    layer = _get_layer(db, layer_id)
+    try:
+        img = render_layer(db, layer, preview_size=preview_size)
+        if preview_size:
+            img = fit_to_size(img, preview_size)
+        data = encode_image(img, ".jpg", quality)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering layer: {str(e)}")
+    
+    return Response(content=data, media_type="image/jpeg")
+
+
+@router.get("/{layer_id}/render")
+async def render_edits(
+    layer_id: int,
+    preview_size: Optional[int] = None,
+    quality: int = 90,
+    db: Session = Depends(get_db)
+):
+    """
+    Render the layer's original plus its edit stack and return JPEG bytes.
+    With preview_size the render runs on a pyramid proxy.
+    """
+    return await compute_executor.run("edits", _render_edits, layer_id, preview_size, quality, db)
+
+
+def _undo_last_edit(layer_id: int, db: Session):
+    layer = _get_layer(db, layer_id)
+    edit = (
+        db.query(LayerEdit)
+        .filter(LayerEdit.layer_id == layer_id)
+        .order_by(LayerEdit.position.desc())
+        .first()
+    )
+    if not edit:
+        raise HTTPException(status_code=404, detail="Layer has no edits")
+    
+    db.delete(edit)
+    db.flush()
+    _refresh_size(db, layer)
+    db.commit()
+    
+    return {
+        "success": True,
+        "message": f"Removed {edit.op} edit",
+        "layer_id": layer_id,
+        "width": layer.width,
+        "height": layer.height
+    }
+
+
+@router.delete("/{layer_id}/last")
+async def undo_last_edit(layer_id: int, db: Session = Depends(get_db)):
+    """
+    Remove the topmost operation from a layer's edit stack
+    """
+    return await compute_executor.run("edits", _undo_last_edit, layer_id, db)
+
+
+def _clear_edits(layer_id: int, db: Session):
+    layer = _get_layer(db, layer_id)
+    removed = db.query(LayerEdit).filter(LayerEdit.layer_id == layer_id).delete()
+    db.flush()
+    _refresh_size(db, layer)
+    db.commit()
+    
+    return {
+        "success": True,
+        "message": f"Removed {removed} edits",
+        "layer_id": layer_id,
+        "width": layer.width,
+        "height": layer.height
+    }
+
+
+@router.delete("/{layer_id}")
+async def clear_edits(layer_id: int, db: Session = Depends(get_db)):
+    """
+    Remove every operation from a layer's edit stack, restoring the original
+    """
+    return await compute_executor.run("edits", _clear_edits, layer_id, db)
@@ -13,6 +13,8 @@ import uuid
 from backend.db import get_db, STORAGE_DIR
 from backend.models.layers import Layer
 from backend.services.image_processor import ImageProcessor
+from backend.services.edit_stack import render_layer
+from backend.services.compute import compute_executor
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
@@ -24,11 +26,7 @@ class ExportRequest(BaseModel):
     filename: Optional[str] = None
 
 
-@router.post("/")
-async def export_image(request: ExportRequest, db: Session = Depends(get_db)):
-    """
-    Export a layer as an image file
-    """
+def _export_image(request: ExportRequest, db: Session):
     try:
         # Get layer from database
         layer = db.query(Layer).filter(Layer.id == request.layer_id).first()
@@ -38,8 +36,8 @@ async def export_image(request: ExportRequest, db: Session = Depends(get_db)):
         if not layer.content:
             raise HTTPException(status_code=400, detail="Layer has no image content")
         
-        # Load image
-        img = ImageProcessor.load_image(layer.content)
+        # Render the layer's edit stack at full resolution
+        img = render_layer(db, layer)
         
         # Determine export filename
         if request.filename:
@@ -72,6 +70,14 @@ async def export_image(request: ExportRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error exporting image: {str(e)}")
 
 
+@router.post("/")
+async def export_image(request: ExportRequest, db: Session = Depends(get_db)):
+    """
+    Export a layer as an image file
+    """
+    return await compute_executor.run("export", _export_image, request, db)
+
+
 @router.get("/download/{filename}")
 async def download_export(filename: str):
     """
@@ -1,51 +1,60 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from backend.db import STORAGE_DIR, get_db  # Ensure these imports match your structure
+from backend.db import get_db  # Ensure these imports match your structure
 from backend.models.models import Image as ImageModel
 from backend.models.layers import Layer  # Import Layer model
+from backend.services.exif import read_metadata
+from backend.services.library import apply_metadata
+from backend.services.originals import acquire_original, remove_unreferenced, save_original
+from backend.services.probe import probe_file
+from backend.services.pyramid import PreviewPyramid
+from backend.services.thumbnails import generate_renditions_quietly, rendition_url
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
-import uuid
-from PIL import Image as PILImage, UnidentifiedImageError
-import io
 
 router = APIRouter(prefix="/api", tags=["imports"])
 
 @router.post("/import", status_code=201)
-async def import_image(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def import_image(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+):
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded")
 
-    # Generate a unique filename for storage
+    # Stream the upload into content-addressed storage; identical files share one original
     suffix = Path(file.filename).suffix
-    unique_name = f"{uuid.uuid4().hex}{suffix}"
-    save_path = Path(STORAGE_DIR) / "originals" / unique_name
-    save_path.parent.mkdir(parents=True, exist_ok=True)  # Ensure the directory exists
+    save_path, content_hash, size, created = await run_in_threadpool(save_original, file.file, suffix)
 
-    try:
-        # Save the uploaded file to disk
-        contents = await file.read()
-        with save_path.open("wb") as f:
-            f.write(contents)
-
-        # Extract image metadata using PIL
-        with PILImage.open(io.BytesIO(contents)) as img:
-            width, height = img.size
-            fmt = img.format
+    # Read size, format and orientation from the header; no pixels are decoded
+    probe = probe_file(save_path)
+    if probe is None:
+        if created:
+            remove_unreferenced(db, content_hash, save_path)
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid image format")
 
+    try:
         # Insert into `images` table
         image_record = ImageModel(
             filename=file.filename,
             filepath=str(save_path.resolve()),
-            width=width,
-            height=height,
-            format=fmt,
+            width=probe.width,
+            height=probe.height,
+            format=probe.format,
+            orientation=probe.orientation,
+            content_hash=content_hash,
         )
+        # Camera, lens, exposure and capture time go into indexed columns for library queries
+        apply_metadata(image_record, await run_in_threadpool(read_metadata, save_path))
         db.add(image_record)
+        acquire_original(db, content_hash, save_path, size)
         db.commit()
         db.refresh(image_record)
 
-        # Insert into `layers` table
+        # Insert into `layers` table, sized as displayed (decoders apply the orientation)
+        width, height = probe.display_size
         layer_record = Layer(
             project_id=0,  # Default project ID (can vary depending on your app logic)
             type="image",  # Always "image" for now
@@ -64,6 +73,10 @@ async def import_image(file: UploadFile = File(...), db: Session = Depends(get_d
         db.commit()
         db.refresh(layer_record)
 
+        # Build the thumbnail, screen preview and preview pyramid after the response is sent
+        background_tasks.add_task(generate_renditions_quietly, [(str(save_path), content_hash)])
+        background_tasks.add_task(PreviewPyramid(str(save_path)).build)
+
         # Return the combined response for the uploaded image using Layer data
         return {
             "id": layer_record.id,
@@ -73,8 +86,7 @@ async def import_image(file: UploadFile = File(...), db: Session = Depends(get_d
             "width": layer_record.width,
             "height": layer_record.height,
             "format": image_record.format,
+            "thumbnail_url": rendition_url(image_record.id, "thumbnail", image_record.filepath, content_hash),
         }
-    except UnidentifiedImageError:
-        raise HTTPException(status_code=400, detail="Uploaded file is not a valid image format")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process uploaded image: {e}")
\ No newline at end of file
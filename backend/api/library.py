@@ -0,0 +1,149 @@
+"""
+Library API
+Filter, sort and page through the image catalogue by camera metadata
+"""
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from backend.db import get_db
+from backend.models.models import Image
+from backend.services.library import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    ImageInUseError,
+    LibraryQueryError,
+    backfill_metadata,
+    delete_image,
+    facet_counts,
+    query_images,
+)
+from backend.services.thumbnails import rendition_url
+
+router = APIRouter(prefix="/api/library", tags=["library"])
+
+
+def _image_summary(image: Image) -> dict:
+    return {
+        "id": image.id,
+        "filename": image.filename,
+        "format": image.format,
+        "width": image.width,
+        "height": image.height,
+        "orientation": image.orientation,
+        "camera_make": image.camera_make,
+        "camera_model": image.camera_model,
+        "lens_model": image.lens_model,
+        "iso": image.iso,
+        "aperture": image.aperture,
+        "exposure_time": image.exposure_time,
+        "focal_length": image.focal_length,
+        "captured_at": image.captured_at,
+        "created_at": image.created_at,
+        "thumbnail_url": rendition_url(image.id, "thumbnail", image.filepath, image.content_hash),
+    }
+
+
+@router.get("/images")
+async def list_images(
+    camera_make: Optional[str] = None,
+    camera_model: Optional[str] = None,
+    lens_model: Optional[str] = None,
+    format: Optional[str] = None,
+    iso_min: Optional[int] = None,
+    iso_max: Optional[int] = None,
+    aperture_min: Optional[float] = None,
+    aperture_max: Optional[float] = None,
+    exposure_time_min: Optional[float] = None,
+    exposure_time_max: Optional[float] = None,
+    focal_length_min: Optional[float] = None,
+    focal_length_max: Optional[float] = None,
+    captured_at_min: Optional[datetime] = None,
+    captured_at_max: Optional[datetime] = None,
+    sort: str = "captured_at",
+    order: Literal["asc", "desc"] = "desc",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    One page of images matching every given filter (ranges are inclusive),
+    sorted by ``sort`` (captured_at, created_at, iso, aperture,
+    exposure_time, focal_length, filename or id). Pass the returned
+    ``next_cursor`` back as ``cursor`` for the following page; it is null
+    on the last page. Filters and sorts run on indexed columns, so pages
+    come back in milliseconds even for large catalogues.
+    """
+    filters = {
+        "camera_make": camera_make,
+        "camera_model": camera_model,
+        "lens_model": lens_model,
+        "format": format,
+        "iso_min": iso_min,
+        "iso_max": iso_max,
+        "aperture_min": aperture_min,
+        "aperture_max": aperture_max,
+        "exposure_time_min": exposure_time_min,
+        "exposure_time_max": exposure_time_max,
+        "focal_length_min": focal_length_min,
+        "focal_length_max": focal_length_max,
+        "captured_at_min": captured_at_min,
+        "captured_at_max": captured_at_max,
+    }
+    try:
+        images, next_cursor = query_images(db, filters, sort, order == "desc", limit, cursor)
+    except LibraryQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "images": [_image_summary(image) for image in images],
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/facets/{field}")
+async def get_facets(
+    field: str,
+    camera_make: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Distinct values of camera_make, camera_model or lens_model with their
+    image counts, most common first, for building filter menus.
+    ``camera_make`` narrows models and lenses to one manufacturer.
+    """
+    try:
+        counts = facet_counts(db, field, {"camera_make": camera_make})
+    except LibraryQueryError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"field": field, "values": [{"value": value, "count": count} for value, count in counts]}
+
+
+@router.post("/metadata/backfill")
+async def backfill_library_metadata(db: Session = Depends(get_db)):
+    """
+    Read and index camera metadata for images imported before metadata
+    was stored. Safe to run repeatedly; images that already have metadata
+    are skipped.
+    """
+    updated = await run_in_threadpool(backfill_metadata, db)
+    return {"updated": updated}
+
+
+@router.delete("/images/{image_id}")
+async def delete_library_image(image_id: int, db: Session = Depends(get_db)):
+    """
+    Remove an image from the library. Its original file is deleted when no
+    other image shares the same bytes; deleting the last image behind a
+    file that a layer still shows is refused with 409.
+    """
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        removed = await run_in_threadpool(delete_image, db, image)
+    except ImageInUseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "image_id": image_id, "original_removed": removed}
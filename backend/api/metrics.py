@@ -0,0 +1,56 @@
+"""
+Metrics API
+Runtime counters for the backend's caches and workers
+"""
+from fastapi import APIRouter
+
+from backend.services.image_cache import image_cache
+from backend.services.compute import compute_executor
+from backend.services.batch import pipeline_stats
+from backend.services.compositor import composite_cache
+from backend.services.brush import brush_stats
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("/image-cache")
+async def get_image_cache_stats():
+    """
+    Hit/miss counters and occupancy of the decoded-image cache
+    """
+    return image_cache.stats()
+
+
+@router.get("/compute")
+async def get_compute_stats():
+    """
+    Queue depth, running jobs, and per-endpoint wait/run times of the compute executor
+    """
+    return compute_executor.stats()
+
+
+@router.get("/batch-pipeline")
+async def get_batch_pipeline_stats():
+    """
+    Busy, starved and blocked time per batch pipeline stage (read, process,
+    encode); the stage with the highest occupancy limits batch throughput
+    """
+    return pipeline_stats.snapshot()
+
+
+@router.get("/composite-cache")
+async def get_composite_cache_stats():
+    """
+    Full, incremental and unchanged project composite renders, canvas pixels
+    composited, and occupancy of the composite cache
+    """
+    return composite_cache.stats()
+
+
+@router.get("/brush")
+async def get_brush_stats():
+    """
+    Strokes rasterized and their point counts before and after resampling
+    and simplification
+    """
+    return brush_stats.stats()
@@ -2,7 +2,7 @@
 Projects API
 Manage photo editing projects (Lightroom-style)
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from typing import List, Optional
@@ -11,6 +11,9 @@ from datetime import datetime
 from backend.db import get_db
 from backend.models.projects import Project
 from backend.models.layers import Layer
+from backend.services.compute import compute_executor
+from backend.services.compositor import canvas_size, composite_cache, flatten, visible_layers
+from backend.services.preview import encode_image
 
 router = APIRouter(prefix="/api/projects", tags=["projects"])
 
@@ -103,6 +106,50 @@ async def get_project(project_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error getting project: {str(e)}")
 
 
+COMPOSITE_FORMATS = {
+    "png": (".png", "image/png"),
+    "jpeg": (".jpg", "image/jpeg"),
+    "webp": (".webp", "image/webp"),
+}
+
+
+def _render_composite(project_id: int, fmt: str, preview_size: Optional[int], quality: int, db: Session):
+    scale = 1.0
+    if preview_size:
+        width, height = canvas_size(visible_layers(db, project_id))
+        scale = min(1.0, preview_size / max(width, height))
+    img = composite_cache.render(db, project_id, scale=scale)
+    suffix, media_type = COMPOSITE_FORMATS[fmt]
+    if suffix == ".jpg":
+        img = flatten(img)
+    return Response(content=encode_image(img, suffix, quality), media_type=media_type)
+
+
+@router.get("/{project_id}/composite")
+async def get_project_composite(
+    project_id: int,
+    format: str = "png",
+    preview_size: Optional[int] = None,
+    quality: int = 90,
+    db: Session = Depends(get_db)
+):
+    """
+    Render the project's visible image layers into one image, blended bottom
+    to top by z_index with each layer's opacity and blend mode. PNG and WebP
+    keep transparency; JPEG is flattened onto white. With preview_size the
+    canvas is scaled so its longest side is at most that many pixels.
+    
+    Composites are cached: after a layer is moved, faded or edited only the
+    area it covered and now covers is blended again.
+    """
+    if format not in COMPOSITE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(COMPOSITE_FORMATS)}")
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return await compute_executor.run("composite", _render_composite, project_id, format, preview_size, quality, db)
+
+
 @router.delete("/{project_id}")
 async def delete_project(project_id: int, db: Session = Depends(get_db)):
     """Delete a project and all its layers"""
@@ -113,6 +160,7 @@ async def delete_project(project_id: int, db: Session = Depends(get_db)):
         
         db.delete(project)
         db.commit()
+        composite_cache.invalidate(project_id)
         
         return {"success": True, "message": f"Project {project_id} deleted"}
     except Exception as e:
@@ -1,14 +1,24 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from fastapi import Depends
 from pydantic import BaseModel
 from pathlib import Path
-import shutil
-import uuid
 from typing import Optional
+import logging
+import numpy as np
 
 from ..db import get_db
 from ..models.models import Image
+from ..services.originals import acquire_original, remove_unreferenced, save_original
+from ..services.compute import compute_executor
+from ..services.exif import METADATA_FIELDS, read_metadata
+from ..services.library import apply_metadata
+from ..services.raw import RawUnavailable, develop, developed_path, extract_embedded_preview, load_preview
+from ..services.thumbnails import generate_renditions_quietly, register_decoder, rendition_url
+
+logger = logging.getLogger("darkroom.raw")
 
 router = APIRouter()
 
@@ -50,15 +60,17 @@ class RAWImportResponse(BaseModel):
     aperture: Optional[float]
     shutter_speed: Optional[str]
     focal_length: Optional[float]
+    preview_url: Optional[str] = None  # Embedded camera preview, available right after import
+    thumbnail_url: Optional[str] = None  # Versioned rendition URL, cacheable forever
 
-# Storage setup
-UPLOAD_DIR = Path("backend/uploads")
-RAW_DIR = UPLOAD_DIR / "raw"
-UPLOAD_DIR.mkdir(exist_ok=True)
-RAW_DIR.mkdir(exist_ok=True)
+@register_decoder(*SUPPORTED_RAW_FORMATS)
+def decode_raw_preview(path: Path, min_long_side: int) -> np.ndarray:
+    """Rendition source for RAW files: the embedded preview, or a half-size development"""
+    return load_preview(path)
 
 @router.post("/raw/import", response_model=RAWImportResponse)
 async def import_raw_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     settings: Optional[RAWImportRequest] = None,
     db: Session = Depends(get_db)
@@ -75,41 +87,53 @@ async def import_raw_file(
             detail=f"Unsupported RAW format. Supported formats: {', '.join(SUPPORTED_RAW_FORMATS.keys())}"
         )
     
+    created = False
     try:
-        # Save RAW file
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = RAW_DIR / unique_filename
-        
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Save RAW file to content-addressed storage; re-imports share one original
+        file_path, content_hash, size, created = await run_in_threadpool(save_original, file.file, file_extension)
         
-        # Extract EXIF metadata (requires rawpy or exiftool)
-        metadata = extract_raw_metadata(str(file_path))
+        # Extract EXIF metadata straight from the file's IFDs
+        metadata = await run_in_threadpool(extract_raw_metadata, str(file_path))
         
         # Create database record
         db_image = Image(
             filename=file.filename,
-            path=f"/uploads/raw/{unique_filename}",
-            original_path=str(file_path)
+            filepath=str(file_path.resolve()),
+            format=file_extension.lstrip('.').upper(),
+            orientation=metadata['orientation'] if metadata['orientation'] in range(1, 9) else 1,
+            content_hash=content_hash
         )
+        apply_metadata(db_image, metadata)
         db.add(db_image)
+        acquire_original(db, content_hash, file_path, size)
         db.commit()
         db.refresh(db_image)
         
+        # The embedded preview is cheap to copy out, so it is ready before the response
+        preview = await run_in_threadpool(_extract_preview, file_path)
+        
+        # Thumbnail and screen preview come from the embedded preview, after the response
+        background_tasks.add_task(generate_renditions_quietly, [(str(file_path), content_hash)])
+        
         return RAWImportResponse(
             id=db_image.id,
             filename=file.filename,
-            path=db_image.path,
+            path=db_image.filepath,
             raw_format=SUPPORTED_RAW_FORMATS[file_extension],
             camera_make=metadata.get('make'),
             camera_model=metadata.get('model'),
             iso=metadata.get('iso'),
             aperture=metadata.get('aperture'),
             shutter_speed=metadata.get('shutter_speed'),
-            focal_length=metadata.get('focal_length')
+            focal_length=metadata.get('focal_length'),
+            preview_url=f"/api/raw/{db_image.id}/preview" if preview else None,
+            thumbnail_url=rendition_url(db_image.id, "thumbnail", db_image.filepath, content_hash)
         )
         
     except Exception as e:
+        db.rollback()
+        if created:
+            remove_unreferenced(db, content_hash, file_path)
         raise HTTPException(status_code=500, detail=f"Failed to import RAW file: {str(e)}")
 
 @router.get("/raw/supported-formats")
@@ -128,86 +152,99 @@ async def get_supported_raw_formats():
         ]
     }
 
+def _extract_preview(file_path: Path) -> Optional[Path]:
+    try:
+        return extract_embedded_preview(file_path)
+    except Exception as e:
+        logger.warning("No embedded preview for %s: %s", file_path, e)
+        return None
+
+def _get_raw_image(db: Session, image_id: int) -> Image:
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not Path(image.filepath).exists():
+        raise HTTPException(status_code=404, detail="RAW file not found")
+    return image
+
+@router.get("/raw/{image_id}/preview")
+async def get_raw_preview(
+    image_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    The camera's embedded JPEG preview, for instant display before any demosaic.
+    """
+    image = _get_raw_image(db, image_id)
+    try:
+        preview = await run_in_threadpool(extract_embedded_preview, Path(image.filepath))
+    except RawUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    if preview is None:
+        raise HTTPException(status_code=404, detail="RAW file has no embedded preview")
+    return FileResponse(preview, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+def _process(raw_path: Path, settings: dict, half_size: bool) -> dict:
+    target = developed_path(raw_path, settings, half_size)
+    cached = target.exists()
+    img = process_raw_with_settings(str(raw_path), settings, half_size)
+    return {
+        "processed_path": str(target.resolve()),
+        "width": img.shape[1],
+        "height": img.shape[0],
+        "cached": cached
+    }
+
 @router.post("/raw/{image_id}/process")
 async def process_raw_image(
     image_id: int,
     settings: RAWImportRequest,
+    half_size: bool = False,
     db: Session = Depends(get_db)
 ):
     """
     Process RAW image with specified settings.
     Non-destructive processing - original RAW file preserved.
-    """
-    image = db.query(Image).filter(Image.id == image_id).first()
-    if not image:
-        raise HTTPException(status_code=404, detail="Image not found")
     
-    raw_path = Path(image.original_path)
-    if not raw_path.exists():
-        raise HTTPException(status_code=404, detail="RAW file not found")
+    The developed image is cached by file content and settings, so
+    reprocessing with the same settings returns immediately. ``half_size``
+    develops at half resolution, about 4x faster, for previews.
+    """
+    image = _get_raw_image(db, image_id)
+    raw_path = Path(image.filepath)
     
     try:
-        # Process RAW file (requires rawpy library)
-        processed_image = process_raw_with_settings(
-            str(raw_path),
-            settings.dict()
-        )
-        
-        # Save processed image
-        processed_filename = f"{raw_path.stem}_processed.jpg"
-        processed_path = UPLOAD_DIR / processed_filename
-        
-        # Save the processed image (placeholder - needs actual implementation)
-        # processed_image.save(str(processed_path))
-        
-        return {
-            "message": "RAW image processed successfully",
-            "original_path": image.path,
-            "processed_path": f"/uploads/{processed_filename}",
-            "settings_applied": settings.dict()
-        }
-        
+        result = await compute_executor.run("raw", _process, raw_path, settings.dict(), half_size)
+    except RawUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process RAW image: {str(e)}")
+    
+    return {
+        "message": "RAW image processed successfully",
+        "original_path": image.filepath,
+        **result,
+        "settings_applied": settings.dict()
+    }
 
 def extract_raw_metadata(file_path: str) -> dict:
     """
     Extract EXIF metadata from RAW file.
     
-    Note: This is a placeholder. In production, you would use:
-    - rawpy library for reading RAW files
-    - piexif or exifread for EXIF extraction
+    Reads make, model, lens, ISO, aperture, shutter speed, focal length,
+    orientation and capture time by walking the file's TIFF/EXIF IFDs
+    (see services/exif.py); fields the file does not record are None.
     """
-    # Placeholder implementation
-    return {
-        'make': 'Unknown',
-        'model': 'Unknown',
-        'iso': None,
-        'aperture': None,
-        'shutter_speed': None,
-        'focal_length': None
-    }
+    metadata = read_metadata(file_path)
+    return {field: metadata[field] for field in METADATA_FIELDS}
 
-def process_raw_with_settings(file_path: str, settings: dict):
+def process_raw_with_settings(file_path: str, settings: dict, half_size: bool = False) -> np.ndarray:
     """
-    Process RAW file with specified settings.
-    
-    Note: This is a placeholder. In production, you would use:
-    - rawpy library for RAW processing
-    - Apply demosaicing, white balance, exposure compensation
-    - Apply tone curves and color grading
+    Process RAW file with specified settings (BGR result).
+    Demosaics with LibRaw via rawpy, applying white balance, exposure
+    compensation, highlight recovery and shadow recovery.
     """
-    # Placeholder implementation
-    # In production:
-    # import rawpy
-    # with rawpy.imread(file_path) as raw:
-    #     rgb = raw.postprocess(
-    #         use_camera_wb=settings.get('auto_white_balance'),
-    #         highlight_mode=rawpy.HighlightMode.Blend if settings.get('highlight_recovery') else rawpy.HighlightMode.Clip,
-    #         exp_shift=settings.get('exposure_compensation', 0.0)
-    #     )
-    #     return rgb
-    pass
+    return develop(Path(file_path), settings, half_size)
 
 @router.get("/raw/{image_id}/metadata")
 async def get_raw_metadata(
@@ -222,7 +259,7 @@ async def get_raw_metadata(
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    raw_path = Path(image.original_path)
+    raw_path = Path(image.filepath)
     if not raw_path.exists():
         raise HTTPException(status_code=404, detail="RAW file not found")
     
@@ -9,7 +9,7 @@ import os
 
 from backend.db import get_db
 from backend.models.layers import Layer
-from backend.services.image_processor import ImageProcessor
+from backend.services.edit_stack import append_edit, layer_source_path
 
 router = APIRouter(prefix="/api", tags=["text_shapes"])
 
@@ -62,39 +62,19 @@ async def add_text_overlay(
         if not layer:
             raise HTTPException(status_code=404, detail="Layer not found")
         
-        # Get the image path
-        image_path = layer.image_path
-        if image_path.startswith('/uploads/'):
-            image_path = image_path[9:]  # Remove /uploads/ prefix
-        full_path = os.path.join('uploads', image_path)
-        
-        if not os.path.exists(full_path):
+        image_path = layer_source_path(layer)
+        if not os.path.exists(image_path):
             raise HTTPException(status_code=404, detail="Image file not found")
         
-        # Initialize image processor
-        processor = ImageProcessor()
-        
-        # Add text overlay
-        result_path = processor.add_text_overlay(
-            full_path,
-            text=request.text,
-            font=request.font,
-            font_size=request.font_size,
-            color=request.color,
-            position=(request.x, request.y),
-            bold=request.bold,
-            italic=request.italic
-        )
-        
-        # Update layer in database
-        layer.image_path = f'/uploads/{os.path.basename(result_path)}'
+        # Append the text to the layer's non-destructive edit stack
+        append_edit(db, layer, "text", request.dict(exclude={"layer_id"}))
         db.commit()
         
         return {
             "success": True,
             "message": f"Text '{request.text}' added successfully",
             "layer_id": layer.id,
-            "new_path": layer.image_path
+            "new_path": f"/api/edits/{layer.id}/render"
         }
         
     except HTTPException:
@@ -124,40 +104,19 @@ async def add_shape(
         if not layer:
             raise HTTPException(status_code=404, detail="Layer not found")
         
-        # Get the image path
-        image_path = layer.image_path
-        if image_path.startswith('/uploads/'):
-            image_path = image_path[9:]  # Remove /uploads/ prefix
-        full_path = os.path.join('uploads', image_path)
-        
-        if not os.path.exists(full_path):
+        image_path = layer_source_path(layer)
+        if not os.path.exists(image_path):
             raise HTTPException(status_code=404, detail="Image file not found")
         
-        # Initialize image processor
-        processor = ImageProcessor()
-        
-        # Add shape
-        result_path = processor.add_shape(
-            full_path,
-            shape_type=request.shape_type,
-            position=(request.x, request.y),
-            width=request.width,
-            height=request.height,
-            fill_color=request.fill_color,
-            stroke_color=request.stroke_color,
-            stroke_width=request.stroke_width,
-            rotation=request.rotation
-        )
-        
-        # Update layer in database
-        layer.image_path = f'/uploads/{os.path.basename(result_path)}'
+        # Append the shape to the layer's non-destructive edit stack
+        append_edit(db, layer, "shape", request.dict(exclude={"layer_id"}))
         db.commit()
         
         return {
             "success": True,
             "message": f"{request.shape_type.capitalize()} added successfully",
             "layer_id": layer.id,
-            "new_path": layer.image_path
+            "new_path": f"/api/edits/{layer.id}/render"
         }
         
     except HTTPException:
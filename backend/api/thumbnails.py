@@ -0,0 +1,68 @@
+"""
+Thumbnails API
+Serves the cached thumbnail and screen preview of imported images
+"""
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from backend.db import get_db
+from backend.models.models import Image
+from backend.services.compute import compute_executor
+from backend.services.thumbnails import (
+    RENDITION_SIZES,
+    generate_renditions,
+    rendition_key,
+    rendition_path,
+    rendition_version,
+)
+
+router = APIRouter(prefix="/api/images", tags=["thumbnails"])
+
+# A versioned URL (``?v=`` from ``rendition_url``) names fixed bytes, so browsers may keep it for a year
+RENDITION_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# The plain id-based URL can change meaning (new size, reused id, edited file), so it is revalidated by ETag
+UNVERSIONED_CACHE_CONTROL = "no-cache"
+
+
+def _render(source_path: str, key: str, kind: str):
+    return generate_renditions(source_path, key)[kind]
+
+
+@router.get("/{image_id}/{kind}")
+async def get_rendition(image_id: int, kind: str, request: Request, db: Session = Depends(get_db)):
+    """
+    Fixed-size JPEG rendition of an image: ``thumbnail`` or ``preview``.
+    Renditions are normally generated at import; a missing one is generated
+    on first request. Requests carrying the current ``v`` version (see the
+    ``thumbnail_url`` of library and import responses) are cacheable
+    forever; others are revalidated against the ETag.
+    """
+    if kind not in RENDITION_SIZES:
+        raise HTTPException(status_code=404, detail=f"Unknown rendition. Available: {', '.join(RENDITION_SIZES)}")
+
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    try:
+        key = rendition_key(image.filepath, image.content_hash)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Original file not found")
+
+    version = rendition_version(key, kind)
+    etag = f'"{version}"'
+    versioned = request.query_params.get("v") == version
+    headers = {"Cache-Control": RENDITION_CACHE_CONTROL if versioned else UNVERSIONED_CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    path = rendition_path(key, kind)
+    if not path.exists():
+        try:
+            path = await compute_executor.run("thumbnail", _render, image.filepath, key, kind)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
@@ -5,12 +5,16 @@ This module now reads configuration from environment variables:
 - DARKROOM_STORAGE_PATH or STORAGE_PATH: path to storage directory (default: backend/storage)
 - DARKROOM_DATABASE_URL or DATABASE_URL: full DB URL (e.g. sqlite:///path/to/db.sqlite) or a path
   (if a plain path is provided it will be resolved under the storage directory and converted to a sqlite URL).
+- DARKROOM_DB_BUSY_TIMEOUT: seconds a SQLite connection waits for another writer's lock before failing (default: 30)
+
+SQLite databases run in WAL mode so the API can read while job workers write.
 
 It will ensure the storage directory (and DB parent) exist.
 """
 import os
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from typing import Generator, Optional
 
@@ -25,6 +29,9 @@ if _storage_env:
 else:
     STORAGE_DIR = DEFAULT_STORAGE_DIR
 
+# Seconds a SQLite connection waits for a write lock (overridable via env var)
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("DARKROOM_DB_BUSY_TIMEOUT", "30"))
+
 # Ensure storage dir exists
 STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -61,8 +68,35 @@ def _build_database_url() -> (str, Optional[Path]):
 
 DATABASE_URL, DB_PATH = _build_database_url()
 
+def create_db_engine(url: str) -> Engine:
+    """
+    Engine for ``url``. SQLite connections are shared across threads, use
+    WAL (readers no longer block the writer, nor it them) and wait up to
+    SQLITE_BUSY_TIMEOUT for a competing writer instead of failing at once
+    with "database is locked".
+    """
+    if not url.startswith("sqlite:"):
+        return create_engine(url, future=True)
+
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT},
+        future=True
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}")
+        finally:
+            cursor.close()
+
+    return engine
+
 # SQLAlchemy engine and session
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, future=True)
+engine = create_db_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 
 # Base class for models
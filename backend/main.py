@@ -26,6 +26,13 @@ from backend.api.presets import router as presets_router  # Import presets route
 from backend.api.text_shapes import router as text_shapes_router  # Import text & shapes router
 from backend.api.batch import router as batch_router  # Import batch processing router
 from backend.api.raw import router as raw_router  # Import RAW file router
+from backend.api.metrics import router as metrics_router  # Import metrics router
+from backend.api.edits import router as edits_router  # Import edit stack router
+from backend.api.thumbnails import router as thumbnails_router  # Import thumbnails router
+from backend.api.library import router as library_router  # Import library query router
+from backend.services.compute import ComputeQueueFull
+from backend.services.jobs import job_queue
+from backend.services.batch import shutdown_batch_pool
 
 APP_TITLE = "Darkroom Backend - Hybrid Lightroom + Photoshop"
 
@@ -47,6 +54,10 @@ app.include_router(presets_router)
 app.include_router(text_shapes_router)
 app.include_router(batch_router)
 app.include_router(raw_router)
+app.include_router(metrics_router)
+app.include_router(edits_router)
+app.include_router(thumbnails_router)
+app.include_router(library_router)
 
 # FIXED CORS SETTINGS: Explicitly allow both localhost origins
 app.add_middleware(
@@ -58,6 +69,12 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(ComputeQueueFull)
+async def compute_queue_full_handler(request, exc: ComputeQueueFull):
+    """Shed load when image work is backed up instead of queueing without bound"""
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+
+
 @app.on_event("startup")
 def on_startup():
     """
@@ -72,6 +89,19 @@ def on_startup():
     except Exception as e:
         logger.exception("Unable to initialize the database on startup: %s", e)
 
+    # Start the background batch workers (re-queues items interrupted by a restart)
+    job_queue.start()
+    logger.info("Batch job workers started: %d", job_queue.workers)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    """
+    Let batch workers finish their current item before exiting.
+    """
+    job_queue.stop(timeout=30)
+    shutdown_batch_pool()
+
 
 @app.get("/health", tags=["health"])
 def health():
@@ -1,5 +1,7 @@
 from backend.db import Base  # Import Base from db.py
 from .layers import Layer  # Expose the Layer model
 from .projects import Project  # Expose the Project model
-from .models import Image  # Expose the Image model
-from .presets import Preset  # Expose the Preset model
\ No newline at end of file
+from .models import Image, OriginalBlob  # Expose the Image and original blob models
+from .presets import Preset  # Expose the Preset model
+from .edits import LayerEdit  # Expose the LayerEdit model
+from .jobs import BatchJob, BatchJobItem  # Expose the background job models
@@ -0,0 +1,26 @@
+"""
+Layer edit stack database model
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from datetime import datetime
+from backend.db import Base
+
+
+class LayerEdit(Base):
+    """One non-destructive operation in a layer's ordered edit stack"""
+    __tablename__ = "layer_edits"
+
+    id = Column(Integer, primary_key=True, index=True)
+    layer_id = Column(
+        Integer,
+        ForeignKey("layers.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    position = Column(Integer, nullable=False)  # Order within the layer's stack, starting at 0
+    op = Column(String(50), nullable=False)  # e.g., "crop", "rotate", "brush", "text", "shape"
+    params = Column(JSON, nullable=False)  # Operation parameters in full-resolution pixels
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<LayerEdit id={self.id} layer_id={self.layer_id} position={self.position} op={self.op}>"
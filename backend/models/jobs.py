@@ -0,0 +1,50 @@
+"""
+Background job queue database models
+"""
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Text
+from datetime import datetime
+from backend.db import Base
+
+
+class BatchJob(Base):
+    """A queued batch operation (e.g. export or process) over many layers"""
+    __tablename__ = "batch_jobs"
+
+    id = Column(String(36), primary_key=True, index=True)  # UUID, returned to clients as batch_id
+    kind = Column(String(50), nullable=False)  # e.g., "export", "process"
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, running, completed, failed, cancelled
+    priority = Column(Integer, nullable=False, default=0)  # Higher runs first; ties run oldest first
+    payload = Column(JSON, nullable=False)  # Settings shared by every item
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    item_seconds = Column(Float, nullable=False, default=0.0)  # Summed processing time of finished items
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<BatchJob id={self.id} kind={self.kind} status={self.status} {self.completed + self.failed}/{self.total}>"
+
+
+class BatchJobItem(Base):
+    """One layer within a batch job"""
+    __tablename__ = "batch_job_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(
+        String(36),
+        ForeignKey("batch_jobs.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    position = Column(Integer, nullable=False)  # Order within the job
+    layer_id = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending, running, completed, failed, cancelled
+    result = Column(JSON, nullable=True)  # Handler output, e.g. the exported file
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<BatchJobItem id={self.id} job_id={self.job_id} layer_id={self.layer_id} status={self.status}>"
@@ -1,22 +1,55 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Float, Index, Text
 from backend.db import Base  # Import Base from db.py
 
 class Image(Base):
     __tablename__ = "images"
 
     id = Column(Integer, primary_key=True)
-    filename = Column(String, nullable=False)
+    filename = Column(String, nullable=False, index=True)  # Library sort key
     filepath = Column(String, nullable=False)
     width = Column(Integer)
     height = Column(Integer)
     format = Column(String(50))
+    orientation = Column(Integer, default=1)  # EXIF orientation (1-8); width/height are the stored, unrotated size
+    content_hash = Column(String(64), index=True)  # SHA-256 of the original; see OriginalBlob
+
+    # Camera metadata read from EXIF at import, indexed for library queries (see services/library.py)
+    camera_make = Column(String(64))
+    camera_model = Column(String(64))
+    lens_model = Column(String(128))
+    iso = Column(Integer, index=True)
+    aperture = Column(Float, index=True)  # f-number
+    exposure_time = Column(Float, index=True)  # Seconds
+    focal_length = Column(Float, index=True)  # Millimetres
+    captured_at = Column(DateTime, index=True)  # DateTimeOriginal, camera local time
 
     # Avoid using the attribute name `metadata` (it's reserved by SQLAlchemy's declarative Base).
     # Store the DB column as "metadata" but expose it on the model as `metadata_json`.
     metadata_json = Column("metadata", Text)
 
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # Library sort key
+
+    __table_args__ = (
+        # Filter by camera or lens and list newest first (the library's default view) from one index;
+        # the leading column also serves plain lookups and facet counts
+        Index("ix_images_camera_make_captured_at", "camera_make", "captured_at"),
+        Index("ix_images_camera_model_captured_at", "camera_model", "captured_at"),
+        Index("ix_images_lens_model_captured_at", "lens_model", "captured_at"),
+    )
+
+    def __repr__(self):
+        return f"<Image id={self.id} filename={self.filename}>"
+
+class OriginalBlob(Base):
+    """A content-addressed original file, shared by every image with the same bytes"""
+    __tablename__ = "originals"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # Images referencing this blob
     created_at = Column(DateTime, default=datetime.utcnow)
 
     def __repr__(self):
-        return f"<Image id={self.id} filename={self.filename}>"
\ No newline at end of file
+        return f"<OriginalBlob sha256={self.sha256[:12]} refs={self.ref_count}>"
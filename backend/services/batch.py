@@ -0,0 +1,233 @@
+"""
+Batch Service
+Per-layer handlers for background batch jobs, run on a process pool
+
+Configuration:
+- DARKROOM_BATCH_PROCESSES: worker processes rendering batch items (default: CPU count, 0 renders in-process)
+- DARKROOM_BATCH_CHUNK: layers streamed through one worker's read/process/encode pipeline at a time (default: 8)
+"""
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from sqlalchemy.orm import Session
+
+from backend.models.layers import Layer
+from backend.services import tiling
+from backend.services.edit_stack import EditStackRenderer, edit_renderer, layer_source_path, load_edits
+from backend.services.image_cache import image_cache
+from backend.services.image_processor import AdjustmentPipeline
+from backend.services.jobs import register_handler
+from backend.services.pipeline import PipelineStats, StagedPipeline
+
+# Worker processes rendering batch items (overridable via env var)
+_processes_env = os.environ.get("DARKROOM_BATCH_PROCESSES")
+BATCH_PROCESSES = int(_processes_env) if _processes_env else (os.cpu_count() or 1)
+
+# Layers per pipeline run on one worker (overridable via env var)
+BATCH_CHUNK_SIZE = int(os.environ.get("DARKROOM_BATCH_CHUNK", "8"))
+
+# Decoded/processed images allowed to wait between pipeline stages
+PIPELINE_QUEUE_SIZE = 2
+
+# Storage setup
+UPLOAD_DIR = Path("backend/uploads")
+EXPORT_DIR = Path("backend/exports")
+UPLOAD_DIR.mkdir(exist_ok=True)
+EXPORT_DIR.mkdir(exist_ok=True)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Stage totals reported by the workers, for GET /api/metrics/batch-pipeline
+pipeline_stats = PipelineStats()
+
+
+# ------------------------------------------------------------------ worker side
+
+def _init_worker() -> None:
+    """
+    Runs once per worker process. Parallelism comes from the processes (and
+    the overlapping pipeline stages within each), so OpenCV and tile
+    processing run single-threaded. Every item is a different image, so the
+    decode and render caches are disabled to keep each worker's memory at
+    the images in flight.
+    """
+    cv2.setNumThreads(1)
+    tiling.TILE_THREADS = 1
+    image_cache.max_bytes = 0
+    edit_renderer.cache.max_bytes = 0
+
+
+@lru_cache(maxsize=32)
+def _pipeline(adjustments_json: str) -> AdjustmentPipeline:
+    """Per-process pipeline cache; its point LUTs are memoized by ``compile_point_lut``"""
+    return AdjustmentPipeline.from_dict(json.loads(adjustments_json))
+
+
+def _read(task: dict) -> Tuple[dict, np.ndarray]:
+    """Reader stage: disk read and decode"""
+    img = cv2.imdecode(np.fromfile(task["source_path"], dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Could not load image from {task['source_path']}")
+    return task, img
+
+
+def _process(entry: Tuple[dict, np.ndarray]) -> Tuple[dict, np.ndarray]:
+    """Processing stage: edit stack, then shared adjustments"""
+    task, img = entry
+    img = EditStackRenderer.apply_edits(img, task["edits"])
+    if task.get("adjustments_json") is not None:
+        img = _pipeline(task["adjustments_json"]).apply(img)
+    return task, img
+
+
+def _encode(entry: Tuple[dict, np.ndarray]) -> None:
+    """Encoder stage: encode and write"""
+    task, img = entry
+    ok, data = cv2.imencode(Path(task["output_path"]).suffix, img, [cv2.IMWRITE_JPEG_QUALITY, task["quality"]])
+    if not ok:
+        raise ValueError(f"Could not encode {task['output_path']}")
+    data.tofile(task["output_path"])
+
+
+def render_chunk(tasks: List[dict]) -> Tuple[List[Optional[str]], dict]:
+    """
+    Stream render tasks through a read -> process -> encode pipeline, so
+    the next file is read and decoded while the previous one is encoded.
+
+    Each task is a dict of ``source_path``, JSON ``edits``, ``output_path``,
+    ``quality`` and optional ``adjustments_json``: paths and JSON only, so a
+    few hundred bytes cross the process boundary per image. Returns one
+    error message (or None) per task and the pipeline's stage stats.
+    """
+    pipeline = StagedPipeline(
+        [("read", _read), ("process", _process), ("encode", _encode)],
+        queue_size=PIPELINE_QUEUE_SIZE
+    )
+    outputs, stats = pipeline.run(tasks)
+    return [str(output) if isinstance(output, Exception) else None for output in outputs], stats
+
+
+# ------------------------------------------------------------------ parent side
+
+def get_batch_pool() -> ProcessPoolExecutor:
+    """Shared process pool for batch items, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=BATCH_PROCESSES,
+                # Job and compute threads are running, so do not fork
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def shutdown_batch_pool() -> None:
+    """Stop the worker processes (they are restarted on next use)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_in_batch_pool(func: Callable, *args):
+    """Run ``func`` on a worker process and wait, or in this thread when the pool is disabled"""
+    if BATCH_PROCESSES <= 0:
+        return func(*args)
+    try:
+        return get_batch_pool().submit(func, *args).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool for later items
+        shutdown_batch_pool()
+        raise
+
+
+def _get_image_layer(db: Session, layer_id: int) -> Layer:
+    layer = db.query(Layer).filter(Layer.id == layer_id).first()
+    if not layer:
+        raise ValueError("Layer not found")
+    if not layer.content:
+        raise ValueError("Layer has no image content")
+    return layer
+
+
+def _render_layers(
+    db: Session,
+    layer_ids: List[int],
+    output_path_for: Callable[[int], Path],
+    quality: int = 95,
+    adjustments: Optional[dict] = None
+) -> List[Union[Path, Exception]]:
+    """Render a chunk of layers on one worker; returns each output path or the error"""
+    outcomes: List[Union[Path, Exception, None]] = [None] * len(layer_ids)
+    adjustments_json = json.dumps(adjustments, sort_keys=True) if adjustments is not None else None
+    tasks, slots = [], []
+    for index, layer_id in enumerate(layer_ids):
+        try:
+            layer = _get_image_layer(db, layer_id)
+        except ValueError as e:
+            outcomes[index] = e
+            continue
+        output_path = output_path_for(layer_id)
+        tasks.append({
+            "source_path": str(Path(layer_source_path(layer)).resolve()),
+            "edits": load_edits(db, layer.id),
+            "output_path": str(output_path.resolve()),
+            "quality": quality,
+            "adjustments_json": adjustments_json,
+        })
+        slots.append((index, output_path))
+
+    if tasks:
+        errors, stats = run_in_batch_pool(render_chunk, tasks)
+        pipeline_stats.add(stats)
+        for (index, output_path), error in zip(slots, errors):
+            outcomes[index] = ValueError(error) if error else output_path
+    return outcomes
+
+
+@register_handler("export", chunk_size=BATCH_CHUNK_SIZE)
+def export_layers(db: Session, layer_ids: List[int], payload: dict) -> list:
+    """Render layers' edit stacks and write them to the exports directory"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    def output_path_for(layer_id: int) -> Path:
+        return EXPORT_DIR / f"{payload['prefix']}_{layer_id}_{timestamp}.{payload['format']}"
+    
+    outcomes = _render_layers(db, layer_ids, output_path_for, quality=payload["quality"])
+    return [
+        outcome if isinstance(outcome, Exception) else {
+            "filename": outcome.name,
+            "path": f"/exports/{outcome.name}",
+            "size": outcome.stat().st_size
+        }
+        for outcome in outcomes
+    ]
+
+
+@register_handler("process", chunk_size=BATCH_CHUNK_SIZE)
+def process_layers(db: Session, layer_ids: List[int], payload: dict) -> list:
+    """Apply shared adjustments to rendered layers and save the results to uploads"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    def output_path_for(layer_id: int) -> Path:
+        return UPLOAD_DIR / f"processed_{layer_id}_{timestamp}.{payload['output_format']}"
+    
+    outcomes = _render_layers(db, layer_ids, output_path_for, adjustments=payload["adjustments"])
+    return [
+        outcome if isinstance(outcome, Exception) else {"path": f"/uploads/{outcome.name}"}
+        for outcome in outcomes
+    ]
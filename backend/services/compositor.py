@@ -0,0 +1,661 @@
+"""
+Compositor Service
+Renders a project's layer stack into one image
+
+Layers are blended bottom to top (``z_index``, then id) following the W3C
+compositing model: the layer's blend mode mixes its colour with the
+backdrop, and the mix is composited source-over with the layer's alpha
+times its opacity. Hidden and fully transparent layers are skipped, and
+each layer is blended only inside its rectangle on the canvas, so a layer
+costs its overlap with the canvas, not the canvas size.
+
+Configuration:
+- DARKROOM_COMPOSITE_CACHE_MB: byte budget for cached project composites in MiB (default: 1024)
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+from sqlalchemy.orm import Session
+
+from backend.models.layers import Layer
+from backend.services.edit_stack import layer_source_path, load_edits, render_layer
+from backend.services.image_cache import DecodedImageCache
+from backend.services.tiling import Tile, map_tiles, plan_tiles
+
+logger = logging.getLogger("darkroom.compositor")
+
+# Byte budget for cached composites and their partial stacks (overridable via env var)
+COMPOSITE_CACHE_BYTES = int(float(os.environ.get("DARKROOM_COMPOSITE_CACHE_MB", "1024")) * 1024 * 1024)
+
+# (x0, y0, x1, y1) in canvas pixels, end-exclusive
+Rect = Tuple[int, int, int, int]
+
+# Blend functions take (backdrop, source) colours as float32 in [0, 1] and return the mixed colour
+BlendFunction = Callable[[np.ndarray, np.ndarray], np.ndarray]
+BLEND_MODES: Dict[str, BlendFunction] = {}
+
+# Layer types with image content the compositor can render
+COMPOSITED_LAYER_TYPES = ("image",)
+
+
+def register_blend_mode(*names: str) -> Callable[[BlendFunction], BlendFunction]:
+    """Decorator registering a blend function under one or more mode names"""
+    def decorator(func: BlendFunction) -> BlendFunction:
+        for name in names:
+            BLEND_MODES[name] = func
+        return func
+    return decorator
+
+
+@register_blend_mode("normal")
+def _normal(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return source
+
+
+@register_blend_mode("multiply")
+def _multiply(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return backdrop * source
+
+
+@register_blend_mode("screen")
+def _screen(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return backdrop + source - backdrop * source
+
+
+@register_blend_mode("hard_light")
+def _hard_light(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    doubled = 2.0 * source
+    return np.where(source <= 0.5, backdrop * doubled, _screen(backdrop, doubled - 1.0))
+
+
+@register_blend_mode("overlay")
+def _overlay(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return _hard_light(source, backdrop)
+
+
+@register_blend_mode("soft_light")
+def _soft_light(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    dark = ((16.0 * backdrop - 12.0) * backdrop + 4.0) * backdrop
+    d = np.where(backdrop <= 0.25, dark, np.sqrt(backdrop))
+    return np.where(
+        source <= 0.5,
+        backdrop - (1.0 - 2.0 * source) * backdrop * (1.0 - backdrop),
+        backdrop + (2.0 * source - 1.0) * (d - backdrop),
+    )
+
+
+@register_blend_mode("darken")
+def _darken(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return np.minimum(backdrop, source)
+
+
+@register_blend_mode("lighten")
+def _lighten(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return np.maximum(backdrop, source)
+
+
+@register_blend_mode("color_dodge")
+def _color_dodge(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dodged = np.minimum(1.0, backdrop / (1.0 - source))
+    return np.where(backdrop <= 0.0, 0.0, np.where(source >= 1.0, 1.0, dodged))
+
+
+@register_blend_mode("color_burn")
+def _color_burn(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        burned = 1.0 - np.minimum(1.0, (1.0 - backdrop) / source)
+    return np.where(backdrop >= 1.0, 1.0, np.where(source <= 0.0, 0.0, burned))
+
+
+@register_blend_mode("difference")
+def _difference(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return np.abs(backdrop - source)
+
+
+@register_blend_mode("exclusion")
+def _exclusion(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return backdrop + source - 2.0 * backdrop * source
+
+
+@register_blend_mode("add", "linear_dodge")
+def _add(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return np.minimum(1.0, backdrop + source)
+
+
+@register_blend_mode("subtract")
+def _subtract(backdrop: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return np.maximum(0.0, backdrop - source)
+
+
+def blend_function(mode: Optional[str]) -> BlendFunction:
+    """Blend function for a mode name such as ``"multiply"`` or ``"color-dodge"``; unknown modes blend as normal"""
+    name = (mode or "normal").strip().lower().replace("-", "_").replace(" ", "_")
+    func = BLEND_MODES.get(name)
+    if func is None:
+        logger.warning("Unknown blend mode %r, using normal", mode)
+        return _normal
+    return func
+
+
+class CompositeLayer:
+    """
+    One layer placed on the canvas: its pixels (BGR or BGRA uint8), the
+    canvas rectangle they are scaled into, and how they blend.
+    """
+
+    __slots__ = ("image", "rect", "opacity", "blend_mode", "key")
+
+    def __init__(self, image: np.ndarray, rect: Rect, opacity: float = 1.0, blend_mode: str = "normal", key=None):
+        self.image = image
+        self.rect = rect
+        self.opacity = opacity
+        self.blend_mode = blend_mode
+        self.key = key
+
+    def fitted(self) -> np.ndarray:
+        """The layer's pixels at the size of its rectangle, resampled once if they differ"""
+        width, height = self.rect[2] - self.rect[0], self.rect[3] - self.rect[1]
+        if self.image.shape[1] != width or self.image.shape[0] != height:
+            shrinking = width < self.image.shape[1] or height < self.image.shape[0]
+            interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+            self.image = cv2.resize(self.image, (width, height), interpolation=interpolation)
+        return self.image
+
+    def __repr__(self) -> str:
+        return f"CompositeLayer({self.key!r} at {self.rect}, opacity={self.opacity}, {self.blend_mode})"
+
+
+def intersect(a: Rect, b: Rect) -> Optional[Rect]:
+    """Overlap of two rectangles, or None if they do not overlap"""
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[2], b[2]), min(a[3], b[3])
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+def layer_rect(layer: Layer, width: int, height: int, scale: float = 1.0) -> Rect:
+    """Canvas rectangle of a layer whose rendered pixels are ``width`` x ``height``"""
+    x0 = int(round((layer.x or 0.0) * scale))
+    y0 = int(round((layer.y or 0.0) * scale))
+    w = layer.width if layer.width else width
+    h = layer.height if layer.height else height
+    return x0, y0, x0 + max(1, int(round(w * scale))), y0 + max(1, int(round(h * scale)))
+
+
+def composite(layers: Sequence[CompositeLayer], width: int, height: int, region: Optional[Rect] = None) -> np.ndarray:
+    """
+    Blend ``layers`` (bottom first) onto a transparent canvas and return
+    the BGRA uint8 pixels of ``region`` (default: the whole canvas).
+    """
+    region = region or (0, 0, width, height)
+    region = intersect(region, (0, 0, width, height))
+    if region is None:
+        return np.zeros((0, 0, 4), np.uint8)
+    color = np.zeros((region[3] - region[1], region[2] - region[0], 3), np.float32)
+    alpha = np.zeros(color.shape[:2] + (1,), np.float32)
+    for layer in layers:
+        blend_layer(color, alpha, region, layer)
+    return to_bgra(color, alpha)
+
+
+def blend_layer(color: np.ndarray, alpha: np.ndarray, region: Rect, layer: CompositeLayer) -> None:
+    """
+    Blend one layer in place into a canvas window covering ``region``:
+    ``color`` is premultiplied BGR and ``alpha`` the coverage, both float32
+    in [0, 1]. Only the part of the window under the layer is touched.
+    """
+    if layer.opacity <= 0.0:
+        return
+    overlap = intersect(layer.rect, region)
+    if overlap is None:
+        return
+
+    # Blend in cache-sized tiles, in parallel; each tile writes a disjoint part of the canvas
+    layer.fitted()
+    func = blend_function(layer.blend_mode)
+    tiles = plan_tiles((overlap[3] - overlap[1], overlap[2] - overlap[0]))
+
+    def run(tile: Tile) -> None:
+        rows, cols = tile.inner
+        x0, y0 = overlap[0] + cols.start, overlap[1] + rows.start
+        _blend_window(color, alpha, region, layer, func, (x0, y0, x0 + cols.stop - cols.start, y0 + rows.stop - rows.start))
+
+    map_tiles(run, tiles)
+
+
+def _blend_window(
+    color: np.ndarray, alpha: np.ndarray, region: Rect, layer: CompositeLayer, func: BlendFunction, overlap: Rect
+) -> None:
+    source, source_alpha = _layer_pixels(layer, overlap)
+    window = (slice(overlap[1] - region[1], overlap[3] - region[1]), slice(overlap[0] - region[0], overlap[2] - region[0]))
+    premultiplied, backdrop_alpha = color[window], alpha[window]
+
+    # Per-pixel alphas are expanded to three channels: NumPy broadcasts over a
+    # length-1 channel axis an order of magnitude slower than it multiplies equal shapes
+    if func is not _normal:
+        # W3C compositing: the blended colour shows where the backdrop is opaque, the plain source elsewhere
+        coverage = np.repeat(backdrop_alpha, 3, axis=2)
+        if coverage.min() >= 1.0:
+            backdrop = premultiplied
+        else:
+            backdrop = np.divide(premultiplied, coverage, out=np.zeros_like(source), where=coverage > 0.0)
+        mixed = func(backdrop, source)
+        mixed -= source
+        mixed *= coverage
+        source += mixed
+
+    # Source-over on premultiplied colour; the views write straight into the canvas
+    if isinstance(source_alpha, float):
+        remaining = 1.0 - source_alpha
+        source *= source_alpha
+    else:
+        source_alpha3 = np.repeat(source_alpha, 3, axis=2)
+        source *= source_alpha3
+        remaining = 1.0 - source_alpha3
+    premultiplied *= remaining
+    premultiplied += source
+    backdrop_alpha *= remaining if isinstance(remaining, float) else remaining[..., :1]
+    backdrop_alpha += source_alpha
+
+
+def to_bgra(color: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+    """Premultiplied float32 colour and alpha in [0, 1] as straight BGRA uint8"""
+    if alpha.min() < 1.0:
+        coverage = np.repeat(alpha, 3, axis=2)
+        color = np.divide(color, coverage, out=np.zeros_like(color), where=coverage > 0.0)
+    out = np.concatenate([color, alpha], axis=2)
+    out *= 255.0
+    out += 0.5
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+
+def flatten(bgra: np.ndarray, background: Tuple[int, int, int] = (255, 255, 255)) -> np.ndarray:
+    """BGRA composite over an opaque background colour (BGR), for formats without alpha"""
+    alpha = bgra[..., 3:4].astype(np.float32) / 255.0
+    bg = np.array(background, np.float32).reshape(1, 1, 3)
+    out = bgra[..., :3].astype(np.float32) * alpha + bg * (1.0 - alpha)
+    return np.clip(out + 0.5, 0, 255).astype(np.uint8)
+
+
+# ------------------------------------------------------------------- projects
+
+def visible_layers(db: Session, project_id: int) -> List[Layer]:
+    """A project's layers that contribute to its composite, bottom first"""
+    layers = (
+        db.query(Layer)
+        .filter(Layer.project_id == project_id)
+        .order_by(Layer.z_index, Layer.id)
+        .all()
+    )
+    return [
+        layer for layer in layers
+        if layer.visible and (layer.opacity or 0) > 0 and layer.content and layer.type in COMPOSITED_LAYER_TYPES
+    ]
+
+
+def canvas_size(layers: Sequence[Layer], scale: float = 1.0) -> Tuple[int, int]:
+    """Canvas (width, height) holding every layer placed at x, y >= 0"""
+    width = height = 0
+    for layer in layers:
+        right = (layer.x or 0.0) + (layer.width or 0.0)
+        bottom = (layer.y or 0.0) + (layer.height or 0.0)
+        width, height = max(width, right), max(height, bottom)
+    return max(1, int(math.ceil(width * scale))), max(1, int(math.ceil(height * scale)))
+
+
+def load_composite_layer(db: Session, layer: Layer, scale: float = 1.0) -> CompositeLayer:
+    """Render a layer (original plus edit stack) and place it on the canvas"""
+    preview_size = None
+    if scale < 1.0 and layer.width and layer.height:
+        preview_size = max(1, int(math.ceil(max(layer.width, layer.height) * scale)))
+    img = render_layer(db, layer, preview_size=preview_size)
+    return CompositeLayer(
+        img,
+        layer_rect(layer, img.shape[1], img.shape[0], scale),
+        opacity=min(100, layer.opacity) / 100.0,
+        blend_mode=layer.blend_mode or "normal",
+        key=layer.id,
+    )
+
+
+def composite_project(
+    db: Session,
+    project_id: int,
+    scale: float = 1.0,
+    size: Optional[Tuple[int, int]] = None,
+) -> np.ndarray:
+    """
+    BGRA composite of a project's visible image layers. The canvas is
+    ``size`` (width, height) when given, otherwise just large enough for
+    every layer; ``scale`` renders it smaller, from layer previews.
+    """
+    layers = visible_layers(db, project_id)
+    width, height = size or canvas_size(layers, scale)
+    canvas = (0, 0, width, height)
+
+    placed = []
+    for layer in layers:
+        if layer.width and layer.height and intersect(layer_rect(layer, 0, 0, scale), canvas) is None:
+            continue  # Entirely off the canvas; never rendered
+        try:
+            placed.append(load_composite_layer(db, layer, scale))
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping layer %s in project %s: %s", layer.id, project_id, e)
+    return composite(placed, width, height)
+
+
+# -------------------------------------------------------------- composite cache
+
+class _ProjectComposite:
+    """
+    Cached composite of one project at one scale: the BGRA ``pixels``
+    served, the placed layers and the state each was rendered from, and
+    optionally the partial stacks ``below`` and ``above`` the ``active``
+    layer, as premultiplied colour and alpha floats.
+    """
+
+    __slots__ = ("size", "order", "signatures", "layers", "pixels", "active", "below", "above", "last_changed")
+
+    def __init__(self, size: Tuple[int, int]):
+        self.size = size
+        self.order: List[int] = []
+        self.signatures: Dict[int, tuple] = {}
+        self.layers: Dict[int, CompositeLayer] = {}
+        width, height = size
+        self.pixels = np.zeros((height, width, 4), np.uint8)
+        self.active: Optional[int] = None
+        self.below: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.above: Optional[Tuple[np.ndarray, np.ndarray]] = None  # None when a layer above needs its backdrop
+        self.last_changed: Optional[int] = None
+
+    @property
+    def nbytes(self) -> int:
+        partials = [array for pair in (self.below, self.above) if pair for array in pair]
+        return self.pixels.nbytes + sum(array.nbytes for array in partials)
+
+    def drop_partials(self) -> None:
+        self.active, self.below, self.above = None, None, None
+
+
+class CompositeCache:
+    """
+    Byte-budget LRU of project composites that re-renders only what changed.
+
+    Each render compares every visible layer's state (placement, opacity,
+    blend mode, z_index, source file and edit stack) with the state the
+    cached composite was built from. Only the rectangles that changed
+    layers covered before and after are composited again, from the layers
+    overlapping them, so moving or fading one layer costs about its area
+    times the layers it overlaps.
+
+    When the same layer changes twice in a row (a drag, a slider), the
+    stacks below and above it are cached as well: below as a composite,
+    above pre-merged into one source-over layer when every layer above
+    blends normally (source-over is associative; other modes need their
+    backdrop and are blended again per region). Later changes to that
+    layer cost about its area alone, whatever the stack depth.
+    """
+
+    def __init__(self, max_bytes: int = COMPOSITE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, _ProjectComposite]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Per-key render locks and how many renders hold or wait on each
+        self._key_locks: Dict[tuple, List] = {}
+        self.current_bytes = 0
+        self.full_renders = 0
+        self.incremental_renders = 0
+        self.unchanged_renders = 0
+        self.pixels_composited = 0
+
+    def render(self, db: Session, project_id: int, scale: float = 1.0, size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """BGRA composite of a project, like ``composite_project``, reusing the cached result where still valid"""
+        key = (project_id, scale, size)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                return self._render_locked(db, key, project_id, scale, size)
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                self._drop_key_lock(key)
+
+    def invalidate(self, project_id: Optional[int] = None) -> None:
+        """Forget cached composites of one project, or of all projects"""
+        with self._lock:
+            for key in [key for key in self._entries if project_id is None or key[0] == project_id]:
+                self.current_bytes -= self._entries.pop(key).nbytes
+                self._drop_key_lock(key)
+
+    def stats(self) -> dict:
+        """Render counters and current occupancy"""
+        with self._lock:
+            return {
+                "full_renders": self.full_renders,
+                "incremental_renders": self.incremental_renders,
+                "unchanged_renders": self.unchanged_renders,
+                "pixels_composited": self.pixels_composited,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # ------------------------------------------------------------------ internals
+
+    def _render_locked(
+        self, db: Session, key: tuple, project_id: int, scale: float, size: Optional[Tuple[int, int]]
+    ) -> np.ndarray:
+        with self._lock:
+            state = self._entries.pop(key, None)
+            if state is not None:
+                self.current_bytes -= state.nbytes
+        state = self._update(db, project_id, scale, size, state)
+        pixels = state.pixels.copy()
+        if state.nbytes > self.max_bytes:
+            state.drop_partials()
+        with self._lock:
+            if state.nbytes <= self.max_bytes:
+                self._entries[key] = state
+                self.current_bytes += state.nbytes
+                while self.current_bytes > self.max_bytes:
+                    evicted_key, evicted = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted.nbytes
+                    self._drop_key_lock(evicted_key)
+        return pixels
+
+    def _drop_key_lock(self, key: tuple) -> None:
+        # Callers hold self._lock; a key's lock lives while it has an entry or a render using it
+        key_lock = self._key_locks.get(key)
+        if key_lock is not None and key_lock[1] == 0 and key not in self._entries:
+            del self._key_locks[key]
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _update(
+        self, db: Session, project_id: int, scale: float, size: Optional[Tuple[int, int]], state: Optional[_ProjectComposite]
+    ) -> _ProjectComposite:
+        layers = []
+        signatures = {}
+        for layer in visible_layers(db, project_id):
+            try:
+                signatures[layer.id] = _signature(db, layer)
+            except OSError as e:
+                logger.warning("Skipping layer %s in project %s: %s", layer.id, project_id, e)
+                continue
+            layers.append(layer)
+        canvas = size or canvas_size(layers, scale)
+
+        if state is None or state.size != canvas:
+            return self._full_render(db, project_id, scale, canvas, layers, signatures)
+
+        changed = [
+            layer_id for layer_id in set(signatures) | set(state.signatures)
+            if signatures.get(layer_id) != state.signatures.get(layer_id)
+        ]
+        if not changed:
+            self._count("unchanged_renders")
+            return state
+
+        # Every area a changed layer covered before or covers now
+        dirty = [state.layers[layer_id].rect for layer_id in changed if layer_id in state.layers]
+        placed = {layer_id: state.layers[layer_id] for layer_id in signatures if layer_id not in changed}
+        for layer in layers:
+            if layer.id in changed:
+                try:
+                    placed[layer.id] = load_composite_layer(db, layer, scale)
+                except (OSError, ValueError) as e:
+                    logger.warning("Skipping layer %s in project %s: %s", layer.id, project_id, e)
+                    continue
+                dirty.append(placed[layer.id].rect)
+        order = [layer.id for layer in layers if layer.id in placed]
+
+        # Partial stacks stay valid while only their layer changes and it keeps its place
+        single = changed[0] if len(changed) == 1 else None
+        if state.active is not None and (single != state.active or _stack_position(order, single) != _stack_position(state.order, single)):
+            state.drop_partials()
+        state.order, state.layers = order, placed
+        state.signatures = {layer_id: signatures[layer_id] for layer_id in order}
+        if state.active is None and single is not None and single == state.last_changed and single in placed:
+            self._build_partials(state, single)
+        state.last_changed = single
+
+        for region in _merge_rects(dirty, canvas):
+            self._recomposite(state, region)
+        self._count("incremental_renders")
+        return state
+
+    def _full_render(
+        self, db: Session, project_id: int, scale: float, canvas: Tuple[int, int], layers: List[Layer], signatures: Dict[int, tuple]
+    ) -> _ProjectComposite:
+        state = _ProjectComposite(canvas)
+        bounds = (0, 0) + canvas
+        for layer in layers:
+            if layer.width and layer.height and intersect(layer_rect(layer, 0, 0, scale), bounds) is None:
+                # Off the canvas: not rendered, but tracked so moving it back in is seen
+                state.layers[layer.id] = CompositeLayer(np.zeros((1, 1, 3), np.uint8), layer_rect(layer, 0, 0, scale), key=layer.id)
+                continue
+            try:
+                state.layers[layer.id] = load_composite_layer(db, layer, scale)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping layer %s in project %s: %s", layer.id, project_id, e)
+        state.order = [layer.id for layer in layers if layer.id in state.layers]
+        state.signatures = {layer_id: signatures[layer_id] for layer_id in state.order}
+        self._recomposite(state, bounds)
+        self._count("full_renders")
+        return state
+
+    def _build_partials(self, state: _ProjectComposite, layer_id: int) -> None:
+        width, height = state.size
+        if state.pixels.nbytes + 2 * width * height * 16 > self.max_bytes:
+            return  # Two float stacks would not fit the budget; keep compositing dirty regions from scratch
+        position = state.order.index(layer_id)
+        bounds = (0, 0, width, height)
+        below = (np.zeros((height, width, 3), np.float32), np.zeros((height, width, 1), np.float32))
+        for below_id in state.order[:position]:
+            blend_layer(below[0], below[1], bounds, state.layers[below_id])
+        above = None
+        above_layers = [state.layers[above_id] for above_id in state.order[position + 1:]]
+        if all(blend_function(layer.blend_mode) is _normal for layer in above_layers):
+            above = (np.zeros((height, width, 3), np.float32), np.zeros((height, width, 1), np.float32))
+            for layer in above_layers:
+                blend_layer(above[0], above[1], bounds, layer)
+        state.active, state.below, state.above = layer_id, below, above
+
+    def _recomposite(self, state: _ProjectComposite, region: Rect) -> None:
+        """Composite ``region`` of the canvas again and refresh its pixels"""
+        x0, y0, x1, y1 = region
+        window = (slice(y0, y1), slice(x0, x1))
+        if state.active is not None:
+            # Start from the cached stack below the active layer
+            color, alpha = state.below[0][window].copy(), state.below[1][window].copy()
+            position = state.order.index(state.active)
+            blend_layer(color, alpha, region, state.layers[state.active])
+            if state.above is not None:
+                _over(color, alpha, state.above[0][window], state.above[1][window])
+            else:
+                for layer_id in state.order[position + 1:]:
+                    blend_layer(color, alpha, region, state.layers[layer_id])
+        else:
+            color = np.zeros((y1 - y0, x1 - x0, 3), np.float32)
+            alpha = np.zeros((y1 - y0, x1 - x0, 1), np.float32)
+            for layer_id in state.order:
+                blend_layer(color, alpha, region, state.layers[layer_id])
+        state.pixels[window] = to_bgra(color, alpha)
+        self._count("pixels_composited", (x1 - x0) * (y1 - y0))
+
+
+# Shared cache used by the composite endpoint
+composite_cache = CompositeCache()
+
+
+# --------------------------------------------------------------------- helpers
+
+def _signature(db: Session, layer: Layer) -> tuple:
+    """Everything about a layer that changes its contribution to the composite"""
+    edits = json.dumps(load_edits(db, layer.id), sort_keys=True)
+    return (
+        layer.z_index, layer.x, layer.y, layer.width, layer.height, layer.opacity, layer.blend_mode,
+        DecodedImageCache.file_key(layer_source_path(layer)), hashlib.sha1(edits.encode("utf-8")).hexdigest(),
+    )
+
+
+def _stack_position(order: List[int], layer_id: Optional[int]) -> Optional[int]:
+    return order.index(layer_id) if layer_id in order else None
+
+
+def _merge_rects(rects: Sequence[Rect], canvas: Tuple[int, int]) -> List[Rect]:
+    """Rectangles clipped to the canvas, with overlapping ones merged into their bounding box"""
+    merged: List[Rect] = []
+    pending = [clipped for clipped in (intersect(rect, (0, 0) + canvas) for rect in rects) if clipped]
+    while pending:
+        rect = pending.pop()
+        for index, other in enumerate(merged):
+            if intersect(rect, other):
+                merged.pop(index)
+                pending.append((min(rect[0], other[0]), min(rect[1], other[1]), max(rect[2], other[2]), max(rect[3], other[3])))
+                break
+        else:
+            merged.append(rect)
+    return merged
+
+
+def _over(color: np.ndarray, alpha: np.ndarray, top_color: np.ndarray, top_alpha: np.ndarray) -> None:
+    """Premultiplied source-over of a pre-merged layer onto ``color``/``alpha``, in place"""
+    remaining = 1.0 - top_alpha
+    color *= np.repeat(remaining, 3, axis=2)
+    color += top_color
+    alpha *= remaining
+    alpha += top_alpha
+
+
+def _layer_pixels(layer: CompositeLayer, overlap: Rect) -> Tuple[np.ndarray, Union[float, np.ndarray]]:
+    """
+    Straight float32 colour of the part of a layer inside ``overlap``, and
+    its alpha times opacity: a per-pixel array for BGRA layers, otherwise
+    just the opacity.
+    """
+    x0, y0 = layer.rect[:2]
+    crop = layer.fitted()[overlap[1] - y0:overlap[3] - y0, overlap[0] - x0:overlap[2] - x0]
+    if crop.ndim == 2:
+        crop = cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR)
+    source = crop[..., :3].astype(np.float32)
+    source *= 1.0 / 255.0
+    if crop.shape[2] == 4:
+        source_alpha = crop[..., 3:4].astype(np.float32)
+        source_alpha *= layer.opacity / 255.0
+        return source, source_alpha
+    return source, float(layer.opacity)
@@ -0,0 +1,169 @@
+"""
+Compute Executor Service
+Runs blocking image work off the asyncio event loop
+
+Configuration:
+- DARKROOM_COMPUTE_WORKERS: threads running image jobs (default: 4)
+- DARKROOM_COMPUTE_QUEUE: jobs allowed to wait for a worker before new ones are rejected (default: 64)
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Threads running image jobs (overridable via env var)
+COMPUTE_WORKERS = int(os.environ.get("DARKROOM_COMPUTE_WORKERS", "4"))
+
+# Waiting jobs allowed across all endpoints (overridable via env var)
+COMPUTE_QUEUE_SIZE = int(os.environ.get("DARKROOM_COMPUTE_QUEUE", "64"))
+
+# Concurrent jobs per endpoint; endpoints not listed may use every worker.
+# Full resolution exports, batches and RAW development are capped so
+# interactive edits and previews always find a free worker.
+ENDPOINT_LIMITS = {
+    "export": 2,
+    "batch": 1,
+    "raw": 1,
+}
+
+
+class ComputeQueueFull(Exception):
+    """Raised when a job is submitted while the compute queue is full"""
+
+
+class ComputeExecutor:
+    """
+    Dedicated thread pool for CPU-bound request work.
+
+    ``run`` is awaited from a route: the job first waits for its endpoint's
+    concurrency slot, then for a worker thread, while the event loop keeps
+    serving other requests. A job counts as queued from submission until a
+    worker starts it; once ``max_queue`` jobs are queued, new submissions
+    fail fast with ``ComputeQueueFull`` instead of piling up.
+
+    Per endpoint, ``stats`` reports submitted/completed/failed/rejected
+    counts, the current queue depth and running jobs, and wait and run
+    times in milliseconds.
+    """
+
+    def __init__(
+        self,
+        workers: int = COMPUTE_WORKERS,
+        max_queue: int = COMPUTE_QUEUE_SIZE,
+        limits: Optional[Dict[str, int]] = None
+    ):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.limits = dict(ENDPOINT_LIMITS if limits is None else limits)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._endpoints: Dict[str, dict] = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="darkroom-compute")
+            return self._executor
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        if endpoint not in self._semaphores:
+            limit = min(self.limits.get(endpoint, self.workers), self.workers)
+            self._semaphores[endpoint] = asyncio.Semaphore(limit)
+        return self._semaphores[endpoint]
+
+    def _counters(self, endpoint: str) -> dict:
+        # Callers hold self._lock
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = {
+                "submitted": 0,
+                "completed": 0,
+                "failed": 0,
+                "rejected": 0,
+                "started": 0,
+                "queued": 0,
+                "running": 0,
+                "wait_ms_total": 0.0,
+                "wait_ms_max": 0.0,
+                "run_ms_total": 0.0,
+            }
+        return self._endpoints[endpoint]
+
+    async def run(self, endpoint: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` on a compute worker and return its result"""
+        with self._lock:
+            counters = self._counters(endpoint)
+            if self._queued >= self.max_queue:
+                counters["rejected"] += 1
+                raise ComputeQueueFull(f"Compute queue is full ({self.max_queue} jobs waiting)")
+            self._queued += 1
+            counters["queued"] += 1
+            counters["submitted"] += 1
+
+        job = {"submitted": time.perf_counter(), "started": False}
+        call = functools.partial(self._call, endpoint, job, functools.partial(func, *args, **kwargs))
+        try:
+            async with self._semaphore(endpoint):
+                return await asyncio.get_running_loop().run_in_executor(self._get_executor(), call)
+        finally:
+            with self._lock:
+                # Cancelled before a worker picked it up
+                if not job["started"]:
+                    self._queued -= 1
+                    self._counters(endpoint)["queued"] -= 1
+
+    def _call(self, endpoint: str, job: dict, func: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        with self._lock:
+            job["started"] = True
+            wait_ms = (started - job["submitted"]) * 1000
+            counters = self._counters(endpoint)
+            self._queued -= 1
+            self._running += 1
+            counters["queued"] -= 1
+            counters["started"] += 1
+            counters["running"] += 1
+            counters["wait_ms_total"] += wait_ms
+            counters["wait_ms_max"] = max(counters["wait_ms_max"], wait_ms)
+
+        failed = True
+        try:
+            result = func()
+            failed = False
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                counters["running"] -= 1
+                counters["run_ms_total"] += (time.perf_counter() - started) * 1000
+                counters["failed" if failed else "completed"] += 1
+
+    def stats(self) -> dict:
+        """Queue depth, running jobs, and per-endpoint counters and timings"""
+        with self._lock:
+            endpoints = {}
+            for endpoint, counters in self._endpoints.items():
+                started = counters["started"]
+                finished = counters["completed"] + counters["failed"]
+                endpoints[endpoint] = {
+                    **{key: value for key, value in counters.items() if not key.endswith("_total")},
+                    "limit": min(self.limits.get(endpoint, self.workers), self.workers),
+                    "avg_wait_ms": counters["wait_ms_total"] / started if started else 0.0,
+                    "avg_run_ms": counters["run_ms_total"] / finished if finished else 0.0,
+                }
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "endpoints": endpoints,
+            }
+
+
+# Shared executor used by the API endpoints
+compute_executor = ComputeExecutor()
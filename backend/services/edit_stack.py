@@ -0,0 +1,263 @@
+"""
+Edit Stack Service
+Lazily renders a layer's non-destructive edit stack from its original image
+
+Configuration:
+- DARKROOM_RENDER_CACHE_MB: byte budget for cached intermediate renders in MiB (default: 512)
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from backend.models.edits import LayerEdit
+from backend.models.layers import Layer
+from backend.services.brush import apply_strokes
+from backend.services.geometry import AffineChain
+from backend.services.image_cache import ByteBudgetLRU, DecodedImageCache
+from backend.services.image_processor import ImageProcessor
+from backend.services.pyramid import PreviewPyramid
+
+# Byte budget for rendered stack prefixes (overridable via env var)
+RENDER_CACHE_BYTES = int(float(os.environ.get("DARKROOM_RENDER_CACHE_MB", "512")) * 1024 * 1024)
+
+# An edit is an operation name plus its JSON parameters
+Edit = Tuple[str, dict]
+
+
+def _crop(chain: AffineChain, params: dict, scale: float) -> None:
+    chain.crop(
+        int(params["x"] * scale),
+        int(params["y"] * scale),
+        max(1, round(params["width"] * scale)),
+        max(1, round(params["height"] * scale))
+    )
+
+
+def _rotate(chain: AffineChain, params: dict, scale: float) -> None:
+    chain.rotate(params["angle"])
+
+
+def _flip(chain: AffineChain, params: dict, scale: float) -> None:
+    chain.flip(params.get("horizontal", True))
+
+
+def _scale(chain: AffineChain, params: dict, scale: float) -> None:
+    chain.scale(params["factor"], params["factor"])
+
+
+def _is_resampling(op: str, params: dict) -> bool:
+    return (op == "rotate" and params["angle"] % 90 != 0) or (op == "scale" and params["factor"] != 1)
+
+
+def _brush(img: np.ndarray, params: dict, scale: float) -> np.ndarray:
+    return apply_strokes(img, params["strokes"], scale)
+
+
+def _text(img: np.ndarray, params: dict, scale: float) -> np.ndarray:
+    return ImageProcessor.draw_text(
+        img,
+        text=params["text"],
+        font=params.get("font", "Arial"),
+        font_size=max(1, round(params.get("font_size", 24) * scale)),
+        color=params.get("color", "#FFFFFF"),
+        position=(round(params["x"] * scale), round(params["y"] * scale)),
+        bold=params.get("bold", False),
+        italic=params.get("italic", False)
+    )
+
+
+def _shape(img: np.ndarray, params: dict, scale: float) -> np.ndarray:
+    return ImageProcessor.draw_shape(
+        img,
+        shape_type=params["shape_type"],
+        position=(round(params["x"] * scale), round(params["y"] * scale)),
+        width=round(params.get("width", 100) * scale),
+        height=round(params.get("height", 100) * scale),
+        fill_color=params.get("fill_color"),
+        stroke_color=params.get("stroke_color", "#FFFFFF"),
+        stroke_width=max(1, round(params.get("stroke_width", 2) * scale)),
+        rotation=params.get("rotation", 0.0)
+    )
+
+
+# Params are stored in full-resolution pixels; ``scale`` maps them onto a proxy level.
+
+# Geometric operations extend an AffineChain: (chain, params, scale) -> None.
+# Consecutive geometric edits are fused and resampled once.
+GEOMETRIC_OPERATIONS: Dict[str, Callable[[AffineChain, dict, float], None]] = {
+    "crop": _crop,
+    "rotate": _rotate,
+    "flip": _flip,
+    "scale": _scale,
+}
+
+# Pixel operations: (image, params, scale) -> new image
+OPERATIONS: Dict[str, Callable[[np.ndarray, dict, float], np.ndarray]] = {
+    "brush": _brush,
+    "text": _text,
+    "shape": _shape,
+}
+
+
+class EditStackRenderer:
+    """
+    Renders an ordered list of edits on top of an original image.
+
+    Every prefix of the stack is identified by a hash chain seeded with the
+    base image's file key (path, mtime, size) and proxy scale, and each
+    intermediate result is kept in a byte-budget LRU. Rendering looks for
+    the longest cached prefix and only computes the remaining steps, so
+    appending one edit costs exactly one operation.
+
+    Runs of consecutive geometric edits are composed into one
+    ``AffineChain`` and resampled once; only the result at the end of each
+    run is cached.
+    """
+
+    def __init__(self, cache: Optional[ByteBudgetLRU] = None):
+        self.cache = cache if cache is not None else ByteBudgetLRU(RENDER_CACHE_BYTES)
+
+    @staticmethod
+    def prefix_keys(base_key: tuple, scale: float, edits: Sequence[Edit]) -> List[str]:
+        """Hash-chain keys for every prefix of ``edits``; index i covers the first i edits"""
+        keys = [hashlib.sha1(repr((base_key, scale)).encode("utf-8")).hexdigest()]
+        for op, params in edits:
+            step = json.dumps([op, params], sort_keys=True)
+            keys.append(hashlib.sha1((keys[-1] + step).encode("utf-8")).hexdigest())
+        return keys
+
+    def render(self, source_path: str, edits: Sequence[Edit], min_scale: float = 1.0) -> np.ndarray:
+        """
+        Render ``edits`` on top of ``source_path``. A ``min_scale`` below 1.0
+        renders on the smallest pyramid level with at least that scale.
+        Returns a read-only image.
+        """
+        if min_scale < 1.0:
+            base_path, scale = PreviewPyramid(source_path).level_for_scale(min_scale)
+        else:
+            base_path, scale = Path(source_path), 1.0
+
+        keys = self.prefix_keys(DecodedImageCache.file_key(str(base_path)), scale, edits)
+
+        start, img = 0, None
+        for index in range(len(edits), 0, -1):
+            if keys[index] in self.cache:
+                img = self.cache.lookup(keys[index])
+                if img is not None:
+                    start = index
+                    break
+
+        if img is None:
+            img = ImageProcessor.load_image(str(base_path))
+
+        return self.apply_edits(
+            img, edits, scale, start, on_step=lambda index, step_img: self.cache.put(keys[index], step_img)
+        )
+
+    @staticmethod
+    def apply_edits(
+        img: np.ndarray,
+        edits: Sequence[Edit],
+        scale: float = 1.0,
+        start: int = 0,
+        on_step: Optional[Callable[[int, np.ndarray], np.ndarray]] = None
+    ) -> np.ndarray:
+        """
+        Apply ``edits[start:]`` to an already decoded image without caching.
+        ``on_step(i, img)`` is called after each step with the number of edits
+        applied so far and may return a replacement image.
+        """
+        index = start
+        while index < len(edits):
+            op, params = edits[index]
+            if op in GEOMETRIC_OPERATIONS:
+                chain = AffineChain(img.shape[1], img.shape[0])
+                while index < len(edits) and edits[index][0] in GEOMETRIC_OPERATIONS:
+                    op, params = edits[index]
+                    if not chain.can_resample and _is_resampling(op, params):
+                        break
+                    GEOMETRIC_OPERATIONS[op](chain, params, scale)
+                    index += 1
+                img = chain.apply(img)
+            elif op in OPERATIONS:
+                img = OPERATIONS[op](img, params, scale)
+                index += 1
+            else:
+                raise ValueError(f"Unknown edit operation: {op}")
+            if on_step is not None:
+                img = on_step(index, img)
+        return img
+
+
+# Shared renderer used by the API endpoints
+edit_renderer = EditStackRenderer()
+
+
+def layer_source_path(layer: Layer) -> str:
+    """On-disk path of a layer's original image"""
+    path = layer.content
+    if path.startswith("/uploads/"):
+        path = "backend" + path
+    return path
+
+
+def load_edits(db: Session, layer_id: int) -> List[Edit]:
+    """Return a layer's edit stack in order"""
+    rows = (
+        db.query(LayerEdit)
+        .filter(LayerEdit.layer_id == layer_id)
+        .order_by(LayerEdit.position)
+        .all()
+    )
+    return [(row.op, row.params) for row in rows]
+
+
+def append_edit(db: Session, layer: Layer, op: str, params: dict) -> LayerEdit:
+    """Add an operation to the top of a layer's stack (the caller commits)"""
+    if op not in OPERATIONS and op not in GEOMETRIC_OPERATIONS:
+        raise ValueError(f"Unknown edit operation: {op}")
+    position = db.query(LayerEdit).filter(LayerEdit.layer_id == layer.id).count()
+    edit = LayerEdit(layer_id=layer.id, position=position, op=op, params=params)
+    db.add(edit)
+    return edit
+
+
+def render_layer(
+    db: Session,
+    layer: Layer,
+    preview_size: Optional[int] = None,
+    extra_edits: Sequence[Edit] = (),
+    extent: Optional[float] = None
+) -> np.ndarray:
+    """
+    Render a layer's current pixels: its original plus the stored edit stack
+    and any ``extra_edits`` (e.g. a pending operation being previewed). With
+    ``preview_size`` the render runs on the pyramid level that keeps
+    ``extent`` (default: the layer's longest side, in full-resolution
+    pixels) at least that many pixels.
+    """
+    source_path = layer_source_path(layer)
+    edits = load_edits(db, layer.id) + list(extra_edits)
+
+    min_scale = 1.0
+    if preview_size:
+        extent = extent or max(layer.width or 0, layer.height or 0)
+        if not extent:
+            manifest = PreviewPyramid(source_path).manifest()
+            extent = max(manifest["width"], manifest["height"])
+        min_scale = preview_size / extent
+
+    return edit_renderer.render(source_path, edits, min_scale)
+
+
+def layer_size(db: Session, layer: Layer) -> Tuple[int, int]:
+    """Current (width, height) of a layer, rendering it only if the size is unknown"""
+    if layer.width and layer.height:
+        return int(layer.width), int(layer.height)
+    img = render_layer(db, layer)
+    return img.shape[1], img.shape[0]
@@ -0,0 +1,460 @@
+"""
+EXIF Metadata Service
+Pure-Python TIFF/EXIF reader for JPEG, TIFF and camera RAW files
+
+Files are memory-mapped and IFD entries are decoded in place with
+``struct.unpack_from``, so reading metadata touches only the pages that
+hold the IFDs, never the image data. That makes it cheap enough to run
+over a whole library in one process instead of spawning an external tool
+per file.
+
+Supported containers: JPEG (APP1 Exif), TIFF and the TIFF-based RAW
+formats (CR2, NEF, NRW, ARW, DNG, PEF, SRW, ERF, KDC, DCR, MOS), Olympus
+ORF and Panasonic RW2 (TIFF variants with their own magic numbers), and
+Fujifilm RAF (through its embedded JPEG). Maker notes are followed where
+they hold the camera's preview image: Nikon, Olympus and Sony.
+"""
+import logging
+import mmap
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fractions import Fraction
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+logger = logging.getLogger("darkroom.exif")
+
+# TIFF header magic numbers: standard TIFF, Olympus ORF (two variants) and Panasonic RW2
+TIFF_MAGICS = (42, 0x4F52, 0x5352, 0x55)
+
+# Bytes per value of each TIFF field type
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+
+# struct codes of the numeric field types (rationals are read as two LONGs)
+TYPE_FORMATS = {1: "B", 3: "H", 4: "I", 5: "II", 6: "b", 8: "h", 9: "i", 10: "ii", 11: "f", 12: "d", 13: "I"}
+
+# IFDs claiming more entries than this are treated as corrupt
+MAX_IFD_ENTRIES = 4096
+
+# IFDs visited per file at most, guarding against loops in malformed files
+MAX_IFDS = 64
+
+# Tags in IFD0 and its sub-IFDs
+TAG_COMPRESSION = 0x0103
+TAG_PHOTOMETRIC = 0x0106
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_STRIP_OFFSETS = 0x0111
+TAG_ORIENTATION = 0x0112
+TAG_STRIP_BYTE_COUNTS = 0x0117
+TAG_SUB_IFDS = 0x014A
+TAG_JPEG_OFFSET = 0x0201
+TAG_JPEG_LENGTH = 0x0202
+TAG_EXIF_IFD = 0x8769
+TAG_RW2_ISO = 0x0017
+TAG_RW2_JPEG_FROM_RAW = 0x002E
+
+# Tags in the Exif IFD
+TAG_EXPOSURE_TIME = 0x829A
+TAG_F_NUMBER = 0x829D
+TAG_ISO = 0x8827
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_FOCAL_LENGTH = 0x920A
+TAG_MAKER_NOTE = 0x927C
+TAG_FOCAL_LENGTH_35MM = 0xA405
+TAG_LENS_MODEL = 0xA434
+
+# Maker-note tags pointing at preview images
+TAG_NIKON_PREVIEW_IFD = 0x0011
+TAG_OLYMPUS_CAMERA_SETTINGS = 0x2020
+TAG_OLYMPUS_PREVIEW_START = 0x0101
+TAG_OLYMPUS_PREVIEW_LENGTH = 0x0102
+TAG_SONY_PREVIEW_IMAGE = 0x2001
+
+# TIFF compression codes of JPEG-coded images
+JPEG_COMPRESSIONS = (6, 7)
+
+# Photometric interpretations of raw sensor data (never a preview)
+RAW_PHOTOMETRICS = (32803, 34892)
+
+# JPEG frame types usable as previews: baseline, extended and progressive DCT
+JPEG_PREVIEW_FRAMES = (0xC0, 0xC1, 0xC2)
+
+# Fields every result has, None when the file does not record them
+METADATA_FIELDS = (
+    "make", "model", "lens_model", "orientation", "iso", "aperture", "exposure_time",
+    "shutter_speed", "focal_length", "focal_length_35mm", "captured_at",
+)
+
+Entry = Tuple[int, int, int]  # (type, count, offset of the value)
+
+
+class ExifError(ValueError):
+    """Raised when a file's metadata structures are truncated or malformed"""
+
+
+class TiffReader:
+    """
+    Reads IFDs of one TIFF structure inside a buffer (an mmap or bytes).
+    ``base`` is the offset of the TIFF header; IFD and value offsets are
+    relative to it, as in the file.
+    """
+
+    def __init__(self, buf, base: int = 0):
+        self.buf = buf
+        self.base = base
+        if base + 8 > len(buf):
+            raise ExifError("Truncated TIFF header")
+        order = bytes(buf[base:base + 2])
+        if order == b"II":
+            self.endian = "<"
+        elif order == b"MM":
+            self.endian = ">"
+        else:
+            raise ExifError("Bad TIFF byte order")
+        magic, self.first_ifd = struct.unpack_from(self.endian + "HI", buf, base + 2)
+        if magic not in TIFF_MAGICS:
+            raise ExifError("Bad TIFF magic number")
+
+    @classmethod
+    def headerless(cls, buf, base: int, endian: str) -> "TiffReader":
+        """Reader for IFDs whose offsets are relative to ``base`` but that have no TIFF header there"""
+        reader = cls.__new__(cls)
+        reader.buf, reader.base, reader.endian, reader.first_ifd = buf, base, endian, 0
+        return reader
+
+    def read_ifd(self, offset: int) -> Tuple[Dict[int, Entry], int]:
+        """Entries of the IFD at ``offset`` by tag, plus the offset of the next IFD (0 if none)"""
+        position = self.base + offset
+        if offset <= 0 or position + 2 > len(self.buf):
+            raise ExifError("IFD offset out of range")
+        count = struct.unpack_from(self.endian + "H", self.buf, position)[0]
+        if count > MAX_IFD_ENTRIES or position + 2 + 12 * count > len(self.buf):
+            raise ExifError("IFD out of range")
+
+        entries = {}
+        for index in range(count):
+            start = position + 2 + 12 * index
+            tag, field_type, values = struct.unpack_from(self.endian + "HHI", self.buf, start)
+            size = TYPE_SIZES.get(field_type)
+            if size is None:
+                continue
+            if size * values <= 4:
+                value_offset = start + 8
+            else:
+                value_offset = self.base + struct.unpack_from(self.endian + "I", self.buf, start + 8)[0]
+                if value_offset + size * values > len(self.buf):
+                    continue
+            entries[tag] = (field_type, values, value_offset)
+
+        next_position = position + 2 + 12 * count
+        next_ifd = 0
+        if next_position + 4 <= len(self.buf):
+            next_ifd = struct.unpack_from(self.endian + "I", self.buf, next_position)[0]
+        return entries, next_ifd
+
+    def values(self, entry: Entry) -> list:
+        """All values of an entry: ints, floats or Fractions for rationals"""
+        field_type, count, offset = entry
+        code = TYPE_FORMATS.get(field_type)
+        if code is None:
+            return list(bytes(self.buf[offset:offset + count]))
+        raw = struct.unpack_from(f"{self.endian}{count * len(code)}{code[0]}", self.buf, offset)
+        if field_type in (5, 10):
+            return [Fraction(n, d) if d else None for n, d in zip(raw[::2], raw[1::2])]
+        return list(raw)
+
+    def value(self, entry: Optional[Entry]):
+        """First value of an entry, or None"""
+        if entry is None or entry[1] == 0:
+            return None
+        values = self.values((entry[0], 1, entry[2]))
+        return values[0] if values else None
+
+    def text(self, entry: Optional[Entry]) -> Optional[str]:
+        """ASCII value of an entry, trimmed of NULs and spaces"""
+        if entry is None:
+            return None
+        _, count, offset = entry
+        text = bytes(self.buf[offset:offset + count]).split(b"\x00", 1)[0]
+        return text.decode("latin-1").strip() or None
+
+
+def read_metadata(path: Union[str, Path]) -> dict:
+    """
+    Camera metadata of an image file: the ``METADATA_FIELDS`` plus
+    ``previews``, the embedded JPEG previews as ``{"offset", "length"}``
+    in the file, largest first. Files without readable metadata give the
+    fields as None and no previews.
+    """
+    with open(path, "rb") as handle:
+        try:
+            buf = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            return _empty()
+        try:
+            return read_metadata_buffer(buf)
+        finally:
+            buf.close()
+
+
+def read_metadata_buffer(buf) -> dict:
+    """``read_metadata`` for a file already in memory (bytes, bytearray or mmap)"""
+    result = _empty()
+    try:
+        if buf[:2] == b"\xff\xd8":
+            _read_jpeg(buf, 0, len(buf), result)
+        elif buf[:16] == b"FUJIFILMCCD-RAW ":
+            _read_raf(buf, result)
+        else:
+            _read_tiff(TiffReader(buf), result)
+    except (ExifError, struct.error, ZeroDivisionError, OverflowError) as e:
+        logger.debug("Stopped reading metadata early: %s", e)
+    result["previews"].sort(key=lambda preview: preview["length"], reverse=True)
+    return result
+
+
+def read_metadata_bulk(paths: Iterable[Union[str, Path]], workers: int = 4) -> Iterator[Tuple[str, dict]]:
+    """
+    Yield ``(path, metadata)`` for many files, in input order. Reads
+    overlap on ``workers`` threads, which hides disk latency; the parsing
+    itself is a few IFD lookups per file. Unreadable files yield an error
+    entry instead of raising.
+    """
+    def read(path):
+        try:
+            return str(path), read_metadata(path)
+        except OSError as e:
+            return str(path), {**_empty(), "error": str(e)}
+
+    if workers <= 1:
+        yield from map(read, paths)
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="darkroom-exif") as executor:
+        yield from executor.map(read, paths)
+
+
+def preview_bytes(path: Union[str, Path], preview: dict) -> bytes:
+    """The bytes of one entry of ``read_metadata(path)["previews"]``"""
+    with open(path, "rb") as handle:
+        handle.seek(preview["offset"])
+        return handle.read(preview["length"])
+
+
+# ------------------------------------------------------------------- containers
+
+def _empty() -> dict:
+    result = dict.fromkeys(METADATA_FIELDS)
+    result["previews"] = []
+    return result
+
+
+def _read_jpeg(buf, start: int, end: int, result: dict) -> None:
+    """Walk JPEG segments up to the scan data and read the first Exif APP1"""
+    position = start + 2
+    while position + 4 <= end:
+        if buf[position] != 0xFF:
+            return
+        marker = buf[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker in (0xD9, 0xDA):
+            return
+        length = struct.unpack_from(">H", buf, position + 2)[0]
+        if marker == 0xE1 and buf[position + 4:position + 10] == b"Exif\x00\x00":
+            _read_tiff(TiffReader(buf, position + 10), result)
+            return
+        position += 2 + length
+
+
+def _read_raf(buf, result: dict) -> None:
+    """Fujifilm RAF: a big-endian header pointing at a JPEG preview that carries the EXIF"""
+    offset, length = struct.unpack_from(">II", buf, 84)
+    if offset + length > len(buf):
+        raise ExifError("RAF preview out of range")
+    _add_preview(buf, offset, length, result)
+    _read_jpeg(buf, offset, offset + length, result)
+
+
+def _read_tiff(reader: TiffReader, result: dict) -> None:
+    make = None
+    rw2 = _is_rw2(reader)
+    queue = [reader.first_ifd]
+    visited = set()
+    sub_ifds = []
+    while queue and len(visited) < MAX_IFDS:
+        offset = queue.pop(0)
+        if not offset or offset in visited:
+            continue
+        visited.add(offset)
+        try:
+            entries, next_ifd = reader.read_ifd(offset)
+        except ExifError:
+            continue
+        queue.append(next_ifd)
+
+        make = make or reader.text(entries.get(TAG_MAKE))
+        _set(result, "make", make)
+        _set(result, "model", reader.text(entries.get(TAG_MODEL)))
+        _set(result, "orientation", reader.value(entries.get(TAG_ORIENTATION)))
+        _collect_previews(reader, entries, result)
+
+        if rw2:
+            _set(result, "iso", reader.value(entries.get(TAG_RW2_ISO)))
+        if rw2 and TAG_RW2_JPEG_FROM_RAW in entries:
+            _, length, start = entries[TAG_RW2_JPEG_FROM_RAW]
+            _add_preview(reader.buf, start, length, result)
+            # The embedded JPEG carries the exposure settings RW2 does not store in its own IFDs
+            _read_jpeg(reader.buf, start, start + length, result)
+        if TAG_SUB_IFDS in entries:
+            sub_ifds.extend(reader.values(entries[TAG_SUB_IFDS]))
+        if TAG_EXIF_IFD in entries:
+            try:
+                _read_exif_ifd(reader, reader.value(entries[TAG_EXIF_IFD]), make, result, visited)
+            except ExifError as e:
+                logger.debug("Skipping Exif IFD: %s", e)
+
+    for offset in sub_ifds[:MAX_IFDS]:
+        if offset in visited:
+            continue
+        visited.add(offset)
+        try:
+            entries, _ = reader.read_ifd(offset)
+        except ExifError:
+            continue
+        _collect_previews(reader, entries, result)
+
+
+def _read_exif_ifd(reader: TiffReader, offset: int, make: Optional[str], result: dict, visited: set) -> None:
+    if not offset or offset in visited:
+        return
+    visited.add(offset)
+    entries, _ = reader.read_ifd(offset)
+
+    exposure = reader.value(entries.get(TAG_EXPOSURE_TIME))
+    if exposure and result["exposure_time"] is None:
+        result["exposure_time"] = float(exposure)
+        result["shutter_speed"] = _format_shutter(exposure)
+    f_number = reader.value(entries.get(TAG_F_NUMBER))
+    _set(result, "aperture", round(float(f_number), 1) if f_number else None)
+    _set(result, "iso", reader.value(entries.get(TAG_ISO)) or None)
+    focal = reader.value(entries.get(TAG_FOCAL_LENGTH))
+    _set(result, "focal_length", round(float(focal), 1) if focal else None)
+    _set(result, "focal_length_35mm", reader.value(entries.get(TAG_FOCAL_LENGTH_35MM)) or None)
+    _set(result, "lens_model", reader.text(entries.get(TAG_LENS_MODEL)))
+    _set(result, "captured_at", _parse_datetime(reader.text(entries.get(TAG_DATETIME_ORIGINAL))))
+
+    if TAG_MAKER_NOTE in entries and make:
+        try:
+            _read_maker_note(reader, entries[TAG_MAKER_NOTE], make.upper(), result)
+        except (ExifError, struct.error) as e:
+            logger.debug("Skipping %s maker note: %s", make, e)
+
+
+def _read_maker_note(reader: TiffReader, entry: Entry, make: str, result: dict) -> None:
+    """Follow maker-note structures that locate the camera's preview JPEG"""
+    _, length, start = entry
+    buf = reader.buf
+    if make.startswith("NIKON") and buf[start:start + 6] == b"Nikon\x00":
+        # Type 3 maker note: a complete TIFF structure 10 bytes in; offsets are relative to it
+        note = TiffReader(buf, start + 10)
+        entries, _ = note.read_ifd(note.first_ifd)
+        preview_ifd = note.value(entries.get(TAG_NIKON_PREVIEW_IFD))
+        if preview_ifd:
+            preview, _ = note.read_ifd(preview_ifd)
+            offset, size = note.value(preview.get(TAG_JPEG_OFFSET)), note.value(preview.get(TAG_JPEG_LENGTH))
+            if offset and size:
+                _add_preview(buf, note.base + offset, size, result)
+    elif make.startswith("OLYMPUS") and buf[start:start + 8] == b"OLYMPUS\x00":
+        # New-style maker note: its own byte order marker 8 bytes in; offsets are relative to the note
+        note = TiffReader.headerless(buf, start, "<" if buf[start + 8:start + 10] == b"II" else ">")
+        entries, _ = note.read_ifd(12)
+        settings_ifd = note.value(entries.get(TAG_OLYMPUS_CAMERA_SETTINGS))
+        if settings_ifd:
+            settings, _ = note.read_ifd(settings_ifd)
+            offset = note.value(settings.get(TAG_OLYMPUS_PREVIEW_START))
+            size = note.value(settings.get(TAG_OLYMPUS_PREVIEW_LENGTH))
+            if offset and size:
+                _add_preview(buf, note.base + offset, size, result)
+    elif make.startswith("SONY"):
+        # Plain IFD at the maker note (after an optional 12-byte header); offsets are relative to the file's TIFF header
+        header = 12 if buf[start:start + 9] == b"SONY DSC " else 0
+        entries, _ = reader.read_ifd(start + header - reader.base)
+        if TAG_SONY_PREVIEW_IMAGE in entries:
+            _, size, offset = entries[TAG_SONY_PREVIEW_IMAGE]
+            _add_preview(buf, offset, size, result)
+
+
+# --------------------------------------------------------------------- helpers
+
+def _is_rw2(reader: TiffReader) -> bool:
+    return struct.unpack_from(reader.endian + "H", reader.buf, reader.base + 2)[0] == 0x55
+
+
+def _collect_previews(reader: TiffReader, entries: Dict[int, Entry], result: dict) -> None:
+    """JPEG images an IFD points at: JPEGInterchangeFormat, or single-strip JPEG-compressed images"""
+    offset = reader.value(entries.get(TAG_JPEG_OFFSET))
+    length = reader.value(entries.get(TAG_JPEG_LENGTH))
+    if offset and length:
+        _add_preview(reader.buf, reader.base + offset, length, result)
+
+    compression = reader.value(entries.get(TAG_COMPRESSION))
+    photometric = reader.value(entries.get(TAG_PHOTOMETRIC))
+    if compression in JPEG_COMPRESSIONS and photometric not in RAW_PHOTOMETRICS:
+        strips = reader.values(entries[TAG_STRIP_OFFSETS]) if TAG_STRIP_OFFSETS in entries else []
+        counts = reader.values(entries[TAG_STRIP_BYTE_COUNTS]) if TAG_STRIP_BYTE_COUNTS in entries else []
+        if len(strips) == 1 and len(counts) == 1:
+            _add_preview(reader.buf, reader.base + strips[0], counts[0], result)
+
+
+def _add_preview(buf, offset: int, length: int, result: dict) -> None:
+    if length < 4 or offset + length > len(buf) or buf[offset:offset + 2] != b"\xff\xd8":
+        return
+    if _jpeg_frame_marker(buf, offset, offset + length) not in JPEG_PREVIEW_FRAMES:
+        # Lossless JPEG holds raw sensor data (CR2, DNG), not a viewable preview
+        return
+    if any(preview["offset"] == offset for preview in result["previews"]):
+        return
+    result["previews"].append({"offset": offset, "length": length})
+
+
+def _jpeg_frame_marker(buf, start: int, end: int) -> Optional[int]:
+    """SOF marker of the JPEG stream at ``start``, or None if there is none before the scan"""
+    position = start + 2
+    while position + 4 <= end:
+        if buf[position] != 0xFF:
+            return None
+        marker = buf[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return marker
+        if marker in (0xD9, 0xDA):
+            return None
+        position += 2 + struct.unpack_from(">H", buf, position + 2)[0]
+    return None
+
+
+def _set(result: dict, field: str, value) -> None:
+    """Keep the first value found for a field (IFD0 before sub-IFDs and embedded JPEGs)"""
+    if value is not None and result[field] is None:
+        result[field] = value
+
+
+def _format_shutter(exposure: Fraction) -> str:
+    """Exposure time as photographers write it: 1/250, 0.5, 30"""
+    if exposure < 1:
+        return f"1/{round(1 / exposure)}"
+    return f"{float(exposure):g}"
+
+
+def _parse_datetime(text: Optional[str]) -> Optional[datetime]:
+    if not text:
+        return None
+    try:
+        return datetime.strptime(text[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
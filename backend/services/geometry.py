@@ -0,0 +1,183 @@
+"""
+Geometry Service
+Fuses consecutive geometric operations into a single resampling pass
+"""
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple
+
+from backend.services.image_processor import ImageProcessor
+from backend.services.tiling import map_tiles, plan_tiles
+
+
+class AffineChain:
+    """
+    Composes crops, rotations, flips and scales into one affine transform.
+
+    Each operation is expressed on pixel coordinates of the current
+    intermediate image and folded into a 3x3 matrix that maps source
+    pixels to output pixels, while the output size is tracked alongside.
+    ``apply`` then resamples once with ``cv2.warpAffine`` over the output
+    region only, instead of resampling per rotate and copying per crop.
+
+    Chains made only of crops, quarter turns and flips map pixels exactly
+    onto pixels; those take a lossless fast path built from NumPy views
+    (slices, ``rot90``, reversed strides) and a single final copy.
+
+    Crops made before the first resampling step are applied by slicing the
+    source, so pixels they removed stay black in a later rotation. A crop
+    made after resampling only narrows the output window, which is why
+    another resampling step cannot follow it in the same chain: check
+    ``can_resample`` and start a new chain when it is False.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.matrix = np.eye(3, dtype=np.float64)
+        self._steps: List[Tuple[str, tuple]] = []
+        self._source_rect: Optional[Tuple[int, int, int, int]] = None
+        self._cropped_after_resample = False
+        self.lossless = True
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Output (width, height)"""
+        return self.width, self.height
+
+    @property
+    def can_resample(self) -> bool:
+        """False once a crop follows a resampling step (see class docstring)"""
+        return not self._cropped_after_resample
+
+    def _compose(self, step: np.ndarray) -> None:
+        self.matrix = step @ self.matrix
+
+    def _begin_resample(self) -> None:
+        if not self.can_resample:
+            raise ValueError("Cannot resample after cropping a resampled image; start a new chain")
+        if self.lossless:
+            # Until now the chain is an exact pixel permutation, so the current
+            # window maps back onto an axis-aligned rectangle of the source
+            inverse = np.linalg.inv(self.matrix)
+            corners = inverse @ np.array(
+                [[0, self.width - 1], [0, self.height - 1], [1, 1]], dtype=np.float64
+            )
+            x0, y0 = np.rint(corners[:2].min(axis=1)).astype(int)
+            x1, y1 = np.rint(corners[:2].max(axis=1)).astype(int) + 1
+            self._source_rect = (x0, y0, x1, y1)
+        self.lossless = False
+
+    def crop(self, x: int, y: int, width: int, height: int) -> "AffineChain":
+        """Crop to a rectangle of the current image (clamped like ``ImageProcessor.crop_image``)"""
+        x, y, width, height = ImageProcessor.clamp_crop(self.width, self.height, x, y, width, height)
+        if not self.lossless:
+            self._cropped_after_resample = True
+        self._compose(np.array([[1, 0, -x], [0, 1, -y], [0, 0, 1]], dtype=np.float64))
+        self._steps.append(("crop", (x, y, width, height)))
+        self.width, self.height = width, height
+        return self
+
+    def rotate(self, angle: float) -> "AffineChain":
+        """Rotate clockwise by ``angle`` degrees, expanding the canvas like ``ImageProcessor.rotate_image``"""
+        if angle % 90 == 0:
+            return self.rotate90(int(angle // 90))
+
+        self._begin_resample()
+        center = (self.width / 2, self.height / 2)
+        new_width, new_height = ImageProcessor.rotated_size(self.width, self.height, angle)
+        rotation = cv2.getRotationMatrix2D(center, -angle, 1.0)
+        rotation[0, 2] += new_width / 2 - center[0]
+        rotation[1, 2] += new_height / 2 - center[1]
+        self._compose(np.vstack([rotation, [0, 0, 1]]))
+        self._steps.append(("rotate", (angle,)))
+        self.width, self.height = new_width, new_height
+        return self
+
+    def rotate90(self, turns: int) -> "AffineChain":
+        """Rotate clockwise by ``turns`` quarter turns, mapping pixels exactly"""
+        turns %= 4
+        for _ in range(turns):
+            # (x, y) -> (h - 1 - y, x)
+            self._compose(np.array([[0, -1, self.height - 1], [1, 0, 0], [0, 0, 1]], dtype=np.float64))
+            self.width, self.height = self.height, self.width
+        if turns:
+            self._steps.append(("rot90", (turns,)))
+        return self
+
+    def flip(self, horizontal: bool = True) -> "AffineChain":
+        """Mirror left-right (``horizontal``) or top-bottom"""
+        if horizontal:
+            step = [[-1, 0, self.width - 1], [0, 1, 0], [0, 0, 1]]
+        else:
+            step = [[1, 0, 0], [0, -1, self.height - 1], [0, 0, 1]]
+        self._compose(np.array(step, dtype=np.float64))
+        self._steps.append(("flip", (horizontal,)))
+        return self
+
+    def scale(self, factor_x: float, factor_y: float) -> "AffineChain":
+        """Resize by the given factors, using the pixel-centre convention of ``cv2.resize``"""
+        if factor_x == 1 and factor_y == 1:
+            return self
+        self._begin_resample()
+        new_width = max(1, round(self.width * factor_x))
+        new_height = max(1, round(self.height * factor_y))
+        fx, fy = new_width / self.width, new_height / self.height
+        self._compose(np.array(
+            [[fx, 0, 0.5 * fx - 0.5], [0, fy, 0.5 * fy - 0.5], [0, 0, 1]],
+            dtype=np.float64
+        ))
+        self._steps.append(("scale", (fx, fy)))
+        self.width, self.height = new_width, new_height
+        return self
+
+    def apply(
+        self,
+        img: np.ndarray,
+        interpolation: int = cv2.INTER_LINEAR,
+        threads: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Produce the output image in a single pass. Resampling chains warp
+        each output tile separately on ``threads`` workers.
+        """
+        if self.lossless:
+            return self._apply_lossless(img)
+        # Sample only from the window left by the crops before the first resampling step
+        x0, y0, x1, y1 = self._source_rect
+        shift = np.array([[1, 0, x0], [0, 1, y0], [0, 0, 1]], dtype=np.float64)
+        source = img[y0:y1, x0:x1]
+        matrix = self.matrix @ shift
+
+        out = np.empty((self.height, self.width) + img.shape[2:], dtype=img.dtype)
+
+        def warp(tile) -> None:
+            rows, cols = tile.inner
+            # Output tile (0, 0) is output pixel (cols.start, rows.start)
+            offset = np.array([[1, 0, -cols.start], [0, 1, -rows.start], [0, 0, 1]], dtype=np.float64)
+            out[tile.inner] = cv2.warpAffine(
+                source,
+                (offset @ matrix)[:2],
+                (cols.stop - cols.start, rows.stop - rows.start),
+                flags=interpolation,
+                borderMode=cv2.BORDER_CONSTANT,
+                borderValue=(0, 0, 0)
+            ).reshape(out[tile.inner].shape)
+
+        map_tiles(warp, plan_tiles(out.shape), threads)
+        return out
+
+    def _apply_lossless(self, img: np.ndarray) -> np.ndarray:
+        view = img
+        for kind, args in self._steps:
+            if kind == "crop":
+                x, y, width, height = args
+                view = view[y:y+height, x:x+width]
+            elif kind == "rot90":
+                view = np.rot90(view, -args[0])
+            elif kind == "flip":
+                view = view[:, ::-1] if args[0] else view[::-1]
+        return np.ascontiguousarray(view)
@@ -0,0 +1,157 @@
+"""
+Decoded Image Cache
+Process-wide LRU cache of decoded images shared by all endpoints
+
+Configuration:
+- DARKROOM_IMAGE_CACHE_MB: byte budget for decoded pixels in MiB (default: 512, 0 disables caching)
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Byte budget for decoded pixels (overridable via env var)
+IMAGE_CACHE_BYTES = int(float(os.environ.get("DARKROOM_IMAGE_CACHE_MB", "512")) * 1024 * 1024)
+
+CacheKey = Tuple[str, int, int, int]
+
+
+class ByteBudgetLRU:
+    """
+    Thread-safe LRU mapping of arbitrary keys to images, bounded by the total
+    ``nbytes`` of the stored arrays. Stored arrays are made read-only
+    because they are shared between callers.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key: Hashable) -> Optional[np.ndarray]:
+        """Return the cached image for ``key`` (counting a hit or miss), or None"""
+        with self._lock:
+            img = self._entries.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: Hashable, img: np.ndarray) -> np.ndarray:
+        """Store ``img`` under ``key`` if it fits the budget and return it read-only"""
+        img.setflags(write=False)
+        if img.nbytes > self.max_bytes:
+            return img
+        with self._lock:
+            self._insert(key, img)
+        return img
+
+    def _insert(self, key: Hashable, img: np.ndarray) -> None:
+        if key in self._entries:
+            return
+        self._entries[key] = img
+        self.current_bytes += img.nbytes
+        while self.current_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        img = self._entries.pop(key, None)
+        if img is not None:
+            self.current_bytes -= img.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class DecodedImageCache(ByteBudgetLRU):
+    """
+    LRU cache of decoded images with a byte budget.
+
+    Entries are keyed on (resolved path, imread flags, mtime_ns, size), so a
+    file that is rewritten in place is decoded again instead of served
+    stale, and the superseded entry is dropped. Cached arrays are returned
+    read-only because they are shared between callers; copy before drawing
+    on them in place.
+    """
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_BYTES):
+        super().__init__(max_bytes)
+        self._by_path: Dict[Tuple[str, int], CacheKey] = {}
+
+    @staticmethod
+    def file_key(file_path: str, flags: int = cv2.IMREAD_COLOR) -> CacheKey:
+        """Cache key of the current version of ``file_path``"""
+        path = Path(file_path)
+        stat = path.stat()
+        return (str(path.resolve()), flags, stat.st_mtime_ns, stat.st_size)
+
+    def get(self, file_path: str, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+        """Return the decoded image for ``file_path``, decoding it on a miss"""
+        try:
+            key = self.file_key(file_path, flags)
+        except OSError:
+            raise ValueError(f"Could not load image from {file_path}")
+
+        img = self.lookup(key)
+        if img is not None:
+            return img
+
+        # Decode outside the lock so concurrent misses on different files overlap
+        img = cv2.imread(file_path, flags)
+        if img is None:
+            raise ValueError(f"Could not load image from {file_path}")
+        return self.put(key, img)
+
+    def _insert(self, key: CacheKey, img: np.ndarray) -> None:
+        stale = self._by_path.get(key[:2])
+        if stale is not None and stale != key:
+            self._remove(stale)
+        self._by_path[key[:2]] = key
+        super()._insert(key, img)
+
+    def _remove(self, key: CacheKey) -> None:
+        super()._remove(key)
+        if self._by_path.get(key[:2]) == key:
+            del self._by_path[key[:2]]
+
+    def invalidate(self, file_path: str) -> None:
+        """Drop every cached decode of ``file_path``"""
+        resolved = str(Path(file_path).resolve())
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == resolved]:
+                self._remove(key)
+
+
+# Shared instance used by ImageProcessor.load_image
+image_cache = DecodedImageCache()
@@ -6,27 +6,37 @@ import cv2
 import numpy as np
 from PIL import Image
 from typing import Tuple, Optional
+from functools import lru_cache
 import io
 
+from backend.services.brush import apply_strokes
+from backend.services.image_cache import image_cache
+from backend.services.tiling import map_tiles, plan_tiles, process_tiled
+
+
+# Gaussian sigma of the unsharp mask used by ``ImageProcessor.sharpen``
+SHARPEN_SIGMA = 1.0
+
+# Neighbourhood the unsharp mask reads beyond each output pixel, in pixels
+SHARPEN_HALO = int(np.ceil(4 * SHARPEN_SIGMA))
+
 
 class ImageProcessor:
     """Handles all image processing operations"""
     
     @staticmethod
     def load_image(file_path: str) -> np.ndarray:
-        """Load an image file and return as numpy array (BGR format)"""
-        img = cv2.imread(file_path)
-        if img is None:
-            raise ValueError(f"Could not load image from {file_path}")
-        return img
+        """
+        Load an image file and return as numpy array (BGR format)
+        Decodes are shared through the process-wide image cache, so the
+        returned array is read-only; copy it before modifying in place.
+        """
+        return image_cache.get(file_path)
     
     @staticmethod
     def load_image_rgb(file_path: str) -> np.ndarray:
         """Load an image file and return as numpy array (RGB format)"""
-        img = cv2.imread(file_path)
-        if img is None:
-            raise ValueError(f"Could not load image from {file_path}")
-        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(image_cache.get(file_path), cv2.COLOR_BGR2RGB)
     
     @staticmethod
     def save_image(img: np.ndarray, file_path: str, quality: int = 95) -> None:
@@ -45,14 +55,16 @@ class ImageProcessor:
         return cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
     
     @staticmethod
-    def adjust_contrast(img: np.ndarray, value: float) -> np.ndarray:
+    def adjust_contrast(img: np.ndarray, value: float, mean: Optional[float] = None) -> np.ndarray:
         """
-        Adjust contrast
+        Adjust contrast around the image mean
         value: -100 to 100 (0 = no change)
+        mean: pivot to use instead of the image mean (e.g. precomputed)
         """
         factor = (100 + value) / 100.0
         img_float = img.astype(np.float32)
-        mean = np.mean(img_float)
+        if mean is None:
+            mean = np.mean(img_float)
         result = (img_float - mean) * factor + mean
         return np.clip(result, 0, 255).astype(np.uint8)
     
@@ -77,6 +89,43 @@ class ImageProcessor:
         img_float = img.astype(np.float32) * factor
         return np.clip(img_float, 0, 255).astype(np.uint8)
     
+    @staticmethod
+    def adjust_highlights(img: np.ndarray, value: float) -> np.ndarray:
+        """
+        Adjust highlights (tones above mid-grey)
+        value: -100 to 100 (0 = no change)
+        Positive values push highlights towards white, negative values
+        recover them towards mid-grey.
+        """
+        img_float = img.astype(np.float32)
+        weight = np.clip((img_float - 128.0) / 127.0, 0, 1) ** 2
+        target = 255.0 if value > 0 else 128.0
+        result = img_float + weight * (target - img_float) * (abs(value) / 100.0)
+        return np.clip(result, 0, 255).astype(np.uint8)
+    
+    @staticmethod
+    def adjust_shadows(img: np.ndarray, value: float) -> np.ndarray:
+        """
+        Adjust shadows (tones below mid-grey)
+        value: -100 to 100 (0 = no change)
+        Positive values lift shadows towards mid-grey, negative values
+        crush them towards black.
+        """
+        img_float = img.astype(np.float32)
+        weight = np.clip((128.0 - img_float) / 128.0, 0, 1) ** 2
+        target = 128.0 if value > 0 else 0.0
+        result = img_float + weight * (target - img_float) * (abs(value) / 100.0)
+        return np.clip(result, 0, 255).astype(np.uint8)
+    
+    @staticmethod
+    def sharpen(img: np.ndarray, amount: float) -> np.ndarray:
+        """
+        Sharpen with an unsharp mask
+        amount: 1.0 = no change, > 1.0 sharpens, < 1.0 softens
+        """
+        blurred = cv2.GaussianBlur(img, (0, 0), SHARPEN_SIGMA)
+        return cv2.addWeighted(img, amount, blurred, 1.0 - amount, 0)
+    
     @staticmethod
     def crop_image(img: np.ndarray, x: int, y: int, width: int, height: int) -> np.ndarray:
         """
@@ -85,21 +134,48 @@ class ImageProcessor:
         width, height: crop dimensions
         """
         img_height, img_width = img.shape[:2]
+        x, y, width, height = ImageProcessor.clamp_crop(img_width, img_height, x, y, width, height)
         
-        # Ensure coordinates are within bounds
+        return img[y:y+height, x:x+width]
+    
+    @staticmethod
+    def clamp_crop(
+        img_width: int,
+        img_height: int,
+        x: int,
+        y: int,
+        width: int,
+        height: int
+    ) -> Tuple[int, int, int, int]:
+        """Clamp a crop rectangle to the image bounds, returning (x, y, width, height)"""
         x = max(0, min(x, img_width))
         y = max(0, min(y, img_height))
         width = min(width, img_width - x)
         height = min(height, img_height - y)
-        
-        return img[y:y+height, x:x+width]
+        return x, y, width, height
+    
+    @staticmethod
+    def rotated_size(width: int, height: int, angle: float) -> Tuple[int, int]:
+        """Bounding (width, height) of a width x height image rotated by angle degrees"""
+        rotation_matrix = cv2.getRotationMatrix2D((width / 2, height / 2), -angle, 1.0)
+        abs_cos = abs(rotation_matrix[0, 0])
+        abs_sin = abs(rotation_matrix[0, 1])
+        return int(height * abs_sin + width * abs_cos), int(height * abs_cos + width * abs_sin)
     
     @staticmethod
     def rotate_image(img: np.ndarray, angle: float) -> np.ndarray:
         """
         Rotate image by arbitrary angle
         angle: rotation angle in degrees (positive = clockwise)
+        Multiples of 90 degrees are lossless transposes without interpolation.
         """
+        if angle % 90 == 0:
+            turns = int(angle // 90) % 4
+            if turns == 0:
+                return img.copy()
+            codes = {1: cv2.ROTATE_90_CLOCKWISE, 2: cv2.ROTATE_180, 3: cv2.ROTATE_90_COUNTERCLOCKWISE}
+            return cv2.rotate(img, codes[turns])
+        
         height, width = img.shape[:2]
         center = (width / 2, height / 2)
         
@@ -107,10 +183,7 @@ class ImageProcessor:
         rotation_matrix = cv2.getRotationMatrix2D(center, -angle, 1.0)
         
         # Calculate new bounding dimensions
-        abs_cos = abs(rotation_matrix[0, 0])
-        abs_sin = abs(rotation_matrix[0, 1])
-        new_width = int(height * abs_sin + width * abs_cos)
-        new_height = int(height * abs_cos + width * abs_sin)
+        new_width, new_height = ImageProcessor.rotated_size(width, height, angle)
         
         # Adjust rotation matrix for new center
         rotation_matrix[0, 2] += new_width / 2 - center[0]
@@ -141,32 +214,60 @@ class ImageProcessor:
         color: hex color like "#FF0000"
         size: brush size in pixels
         opacity: 0.0 to 1.0
+
+        The stroke is rasterized into one coverage mask and blended once,
+        so overlapping segments do not compound the opacity.
         """
-        # Convert hex color to BGR
-        color = color.lstrip('#')
-        r, g, b = tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
-        bgr_color = (b, g, r)
-        
-        # Create a copy of the image
-        result = img.copy()
-        
-        # Convert points list to array of (x, y) tuples
-        point_pairs = [(int(points[i]), int(points[i+1])) for i in range(0, len(points)-1, 2)]
+        return apply_strokes(img, [{"points": points, "color": color, "size": size, "opacity": opacity}])
+
+    @staticmethod
+    def _load_font(font: str, font_size: int, bold: bool, italic: bool):
+        """Load a TrueType font by name, falling back to PIL's default font"""
+        from PIL import ImageFont
+        import os
         
-        # Draw lines between consecutive points
-        for i in range(len(point_pairs) - 1):
-            pt1 = point_pairs[i]
-            pt2 = point_pairs[i + 1]
+        try:
+            # Try common font paths
+            font_paths = [
+                f"/usr/share/fonts/truetype/dejavu/DejaVuSans{'-Bold' if bold else ''}{'-Oblique' if italic else ''}.ttf",
+                f"/System/Library/Fonts/{font}.ttf",
+                f"C:\\Windows\\Fonts\\{font.replace(' ', '')}.ttf",
+            ]
             
-            # Create overlay for alpha blending
-            overlay = result.copy()
-            cv2.line(overlay, pt1, pt2, bgr_color, size, cv2.LINE_AA)
+            for path in font_paths:
+                if os.path.exists(path):
+                    return ImageFont.truetype(path, font_size)
             
-            # Blend overlay with original based on opacity
-            cv2.addWeighted(overlay, opacity, result, 1 - opacity, 0, result)
+            return ImageFont.load_default()
+        except:
+            return ImageFont.load_default()
+    
+    @staticmethod
+    def draw_text(
+        img: np.ndarray,
+        text: str,
+        font: str = "Arial",
+        font_size: int = 24,
+        color: str = "#FFFFFF",
+        position: Tuple[int, int] = (50, 50),
+        bold: bool = False,
+        italic: bool = False
+    ) -> np.ndarray:
+        """
+        Draw text onto a BGR image using PIL.
+        Returns a new image; the input is not modified.
+        """
+        from PIL import ImageDraw
         
-        return result
-
+        pil_img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        draw = ImageDraw.Draw(pil_img)
+        pil_font = ImageProcessor._load_font(font, font_size, bold, italic)
+        
+        # Draw text
+        draw.text(position, text, fill=color, font=pil_font)
+        
+        return cv2.cvtColor(np.asarray(pil_img), cv2.COLOR_RGB2BGR)
+    
     @staticmethod
     def add_text_overlay(
         image_path: str,
@@ -179,59 +280,34 @@ class ImageProcessor:
         italic: bool = False
     ) -> str:
         """
-        Add text overlay to an image using PIL.
+        Add text overlay to an image file.
         Returns path to the new image.
         """
-        from PIL import Image, ImageDraw, ImageFont
         import os
         
-        # Load image with PIL
-        img = Image.open(image_path)
-        draw = ImageDraw.Draw(img)
-        
-        # Try to load font (fallback to default if not found)
-        try:
-            # Construct font path for system fonts
-            font_style = ""
-            if bold and italic:
-                font_style = "bi"
-            elif bold:
-                font_style = "b"
-            elif italic:
-                font_style = "i"
-            
-            # Try common font paths
-            font_paths = [
-                f"/usr/share/fonts/truetype/dejavu/DejaVuSans{'-Bold' if bold else ''}{'-Oblique' if italic else ''}.ttf",
-                f"/System/Library/Fonts/{font}.ttf",
-                f"C:\\Windows\\Fonts\\{font.replace(' ', '')}.ttf",
-            ]
-            
-            pil_font = None
-            for path in font_paths:
-                if os.path.exists(path):
-                    pil_font = ImageFont.truetype(path, font_size)
-                    break
-            
-            if pil_font is None:
-                pil_font = ImageFont.load_default()
-        except:
-            pil_font = ImageFont.load_default()
-        
-        # Draw text
-        draw.text(position, text, fill=color, font=pil_font)
+        img = ImageProcessor.draw_text(
+            ImageProcessor.load_image(image_path),
+            text, font, font_size, color, position, bold, italic
+        )
         
         # Save result
         base_name = os.path.basename(image_path)
         name, ext = os.path.splitext(base_name)
         result_path = os.path.join(os.path.dirname(image_path), f"{name}_text{ext}")
-        img.save(result_path)
+        cv2.imwrite(result_path, img)
         
         return result_path
     
     @staticmethod
-    def add_shape(
-        image_path: str,
+    def hex_to_bgr(hex_color: str) -> Tuple[int, int, int]:
+        """Convert a hex color like "#FF0000" to a BGR tuple"""
+        hex_color = hex_color.lstrip('#')
+        r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        return (b, g, r)
+    
+    @staticmethod
+    def draw_shape(
+        img: np.ndarray,
         shape_type: str,
         position: Tuple[int, int],
         width: int,
@@ -240,26 +316,15 @@ class ImageProcessor:
         stroke_color: str = "#FFFFFF",
         stroke_width: int = 2,
         rotation: float = 0.0
-    ) -> str:
+    ) -> np.ndarray:
         """
-        Add shape to an image using OpenCV.
-        Returns path to the new image.
+        Draw a shape onto an image using OpenCV.
+        Returns a new image; the input is not modified.
         """
-        import os
+        img = img.copy()
         
-        # Load image
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"Could not load image from {image_path}")
-        
-        # Convert colors from hex to BGR
-        def hex_to_bgr(hex_color):
-            hex_color = hex_color.lstrip('#')
-            r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-            return (b, g, r)
-        
-        stroke_bgr = hex_to_bgr(stroke_color)
-        fill_bgr = hex_to_bgr(fill_color) if fill_color else None
+        stroke_bgr = ImageProcessor.hex_to_bgr(stroke_color)
+        fill_bgr = ImageProcessor.hex_to_bgr(fill_color) if fill_color else None
         
         x, y = position
         
@@ -282,10 +347,318 @@ class ImageProcessor:
         elif shape_type == 'arrow':
             cv2.arrowedLine(img, (x, y), (x + width, y + height), stroke_bgr, stroke_width, cv2.LINE_AA, tipLength=0.3)
         
+        return img
+    
+    @staticmethod
+    def add_shape(
+        image_path: str,
+        shape_type: str,
+        position: Tuple[int, int],
+        width: int,
+        height: int,
+        fill_color: Optional[str] = None,
+        stroke_color: str = "#FFFFFF",
+        stroke_width: int = 2,
+        rotation: float = 0.0
+    ) -> str:
+        """
+        Add shape to an image file.
+        Returns path to the new image.
+        """
+        import os
+        
+        img = ImageProcessor.draw_shape(
+            ImageProcessor.load_image(image_path),
+            shape_type, position, width, height,
+            fill_color, stroke_color, stroke_width, rotation
+        )
+        
         # Save result
         base_name = os.path.basename(image_path)
         name, ext = os.path.splitext(base_name)
         result_path = os.path.join(os.path.dirname(image_path), f"{name}_shape{ext}")
         cv2.imwrite(result_path, img)
         
-        return result_path
\ No newline at end of file
+        return result_path
+
+
+# 0-255 ramp used to evaluate point-wise adjustments once per table entry
+_LUT_RAMP = np.arange(256, dtype=np.uint8).reshape(1, 256)
+
+
+@lru_cache(maxsize=256)
+def compile_point_lut(
+    exposure: float = 0.0,
+    contrast: float = 0.0,
+    highlights: float = 0.0,
+    shadows: float = 0.0,
+    contrast_mean: Optional[float] = None
+) -> np.ndarray:
+    """
+    Compile point-wise adjustments into a single 256-entry uint8 lookup table
+    for ``cv2.LUT``. Stages compose in pipeline order (contrast, exposure,
+    highlights, shadows) by running the ``ImageProcessor`` helpers over the
+    0-255 ramp, so the table is bit-exact with the sequential calls.
+
+    Contrast pivots on the image mean, so it is only a point operation once
+    that mean is known: pass it as ``contrast_mean`` (callers should round
+    it so the memoization key stays small). Tables are memoized on the full
+    parameter tuple and returned read-only.
+    """
+    table = _LUT_RAMP
+    if contrast != 0:
+        if contrast_mean is None:
+            raise ValueError("contrast_mean is required when contrast is set")
+        table = ImageProcessor.adjust_contrast(table, contrast, mean=contrast_mean)
+    if exposure != 0:
+        table = ImageProcessor.adjust_exposure(table, exposure)
+    if highlights != 0:
+        table = ImageProcessor.adjust_highlights(table, highlights)
+    if shadows != 0:
+        table = ImageProcessor.adjust_shadows(table, shadows)
+    table = np.ascontiguousarray(table.reshape(256), dtype=np.uint8)
+    table.setflags(write=False)
+    return table
+
+
+class AdjustmentPipeline:
+    """
+    Compiled, single-pass version of the sequential adjustment chain.
+
+    The sequential ``ImageProcessor.adjust_*`` calls each allocate a float32
+    copy of the frame, and brightness/saturation each round-trip through
+    8-bit HSV. The pipeline splits the chain in two:
+
+    - Cross-channel stages (brightness, saturation, and contrast when it
+      sits between them) run in place on one float32 buffer, using two
+      single-channel scratch planes for the per-pixel max/min. They are
+      evaluated directly in BGR, which is exact for OpenCV's HSV model:
+      scaling V by k scales every channel by min(k, 255 / V), and scaling S
+      by k moves every channel away from V by min(k, V / (V - min)).
+    - Point-wise stages (exposure, highlights, shadows, and contrast once
+      the mean is known) are compiled by ``compile_point_lut`` into one
+      uint8 table applied with ``cv2.LUT``. When there are no cross-channel
+      stages the image never leaves uint8.
+
+    Stages run in the same order as ``apply_adjustments``:
+    brightness, contrast, saturation, exposure, highlights, shadows, sharpness.
+
+    Tolerance: the sequential chain truncates to uint8 after every stage
+    and quantizes hue to 180 steps, while the pipeline rounds once after
+    the cross-channel stages. For any single stage the two differ by at
+    most ``TOLERANCE`` levels per channel (point-wise stages are exact up
+    to the rounding of the contrast mean). When stages are combined, later
+    gain stages (contrast, exposure) amplify the sequential chain's own
+    rounding, so only the mean absolute difference is bounded, by
+    ``MEAN_TOLERANCE``.
+    """
+
+    TOLERANCE = 6
+    MEAN_TOLERANCE = 3.0
+
+    def __init__(
+        self,
+        brightness: float = 0.0,
+        contrast: float = 0.0,
+        saturation: float = 0.0,
+        exposure: float = 0.0,
+        highlights: float = 0.0,
+        shadows: float = 0.0,
+        sharpness: float = 1.0
+    ):
+        self.brightness = float(brightness or 0.0)
+        self.contrast = float(contrast or 0.0)
+        self.saturation = float(saturation or 0.0)
+        self.exposure = float(exposure or 0.0)
+        self.highlights = float(highlights or 0.0)
+        self.shadows = float(shadows or 0.0)
+        self.sharpness = 1.0 if sharpness is None else float(sharpness)
+
+    @classmethod
+    def from_request(cls, request) -> "AdjustmentPipeline":
+        """Build a pipeline from an ``AdjustmentRequest`` (or any object with the same fields)"""
+        return cls(
+            brightness=getattr(request, "brightness", 0.0),
+            contrast=getattr(request, "contrast", 0.0),
+            saturation=getattr(request, "saturation", 0.0),
+            exposure=getattr(request, "exposure", 0.0),
+            highlights=getattr(request, "highlights", 0.0),
+            shadows=getattr(request, "shadows", 0.0),
+            sharpness=getattr(request, "sharpness", 1.0),
+        )
+
+    @classmethod
+    def from_dict(cls, adjustments: dict) -> "AdjustmentPipeline":
+        """Build a pipeline from a plain adjustments dict, ignoring unknown keys"""
+        known = ("brightness", "contrast", "saturation", "exposure", "highlights", "shadows", "sharpness")
+        return cls(**{key: adjustments[key] for key in known if key in adjustments})
+
+    @classmethod
+    def from_preset(cls, preset) -> "AdjustmentPipeline":
+        """
+        Build a pipeline from a ``Preset``.
+        Presets store sharpness as 0-100 (0 = no change), which maps to an
+        unsharp-mask amount of 1.0-2.0.
+        """
+        return cls(
+            brightness=preset.brightness,
+            contrast=preset.contrast,
+            saturation=preset.saturation,
+            exposure=preset.exposure,
+            highlights=preset.highlights,
+            shadows=preset.shadows,
+            sharpness=1.0 + (preset.sharpness or 0.0) / 100.0,
+        )
+
+    @property
+    def is_identity(self) -> bool:
+        """True when no stage would change the image"""
+        return (
+            self.brightness == 0 and self.contrast == 0 and self.saturation == 0
+            and self.exposure == 0 and self.highlights == 0 and self.shadows == 0
+            and self.sharpness == 1.0
+        )
+
+    @property
+    def has_cross_channel_stages(self) -> bool:
+        """True when brightness or saturation need the float32 path"""
+        return self.brightness != 0 or self.saturation != 0
+
+    def point_lut(self, contrast_mean: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Return the compiled table for the point-wise stages, or None if there
+        are none. Contrast is folded in only when ``contrast_mean`` is given.
+        """
+        contrast = self.contrast if contrast_mean is not None else 0.0
+        if contrast == 0 and self.exposure == 0 and self.highlights == 0 and self.shadows == 0:
+            return None
+        return compile_point_lut(
+            self.exposure,
+            contrast,
+            self.highlights,
+            self.shadows,
+            round(contrast_mean, 1) if contrast else None,
+        )
+
+    # Peak scratch bytes per pixel of a BGR region: the float32 buffer (12),
+    # two float32 planes (8) and uint8 intermediates for LUT/sharpen (12)
+    WORKING_BYTES_PER_PIXEL = 32
+
+    def apply(
+        self,
+        img: np.ndarray,
+        memory_budget: Optional[int] = None,
+        threads: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Apply every active stage to a BGR uint8 image and return a new uint8 image.
+
+        Frames larger than one tile are split into overlapping tiles that run
+        on ``threads`` workers (default: ``DARKROOM_TILE_THREADS``). Tiles
+        shrink further when their scratch memory would exceed
+        ``memory_budget`` (default: ``DARKROOM_TILE_MEMORY_MB``). The contrast
+        mean is then computed in a separate reduction pass first, and tiles
+        carry a ``SHARPEN_HALO`` border so sharpening matches the whole frame
+        result exactly. The tile grid does not depend on the thread count, so
+        neither does the output.
+        """
+        if self.is_identity:
+            return img.copy()
+
+        halo = SHARPEN_HALO if self.sharpness != 1.0 else 0
+        tiles = plan_tiles(img.shape, self.WORKING_BYTES_PER_PIXEL, halo, memory_budget)
+        if len(tiles) == 1:
+            return self._apply_region(img)
+
+        mean = self.contrast_mean(img, tiles, threads) if self.contrast != 0 else None
+        return process_tiled(img, lambda region: self._apply_region(region, mean), tiles, threads=threads)
+
+    def contrast_mean(self, img: np.ndarray, tiles=None, threads: Optional[int] = None) -> float:
+        """
+        Mean the contrast stage pivots on: the image mean after brightness.
+        With ``tiles`` the brightness stage is evaluated one tile at a time and
+        the per-tile sums are added in tile order.
+        """
+        if self.brightness == 0:
+            return self.image_mean(img)
+
+        def tile_sum(tile) -> float:
+            region = img[tile.inner]
+            buf = region.astype(np.float32)
+            planes = np.empty((2,) + region.shape[:2], dtype=np.float32)
+            self._apply_brightness(buf, planes[0], planes[1])
+            return float(buf.sum(dtype=np.float64))
+
+        tiles = tiles or plan_tiles(img.shape, self.WORKING_BYTES_PER_PIXEL)
+        return sum(map_tiles(tile_sum, tiles, threads)) / img.size
+
+    def _apply_region(self, img: np.ndarray, mean: Optional[float] = None) -> np.ndarray:
+        """Run the pipeline on one region; ``mean`` overrides the region's own contrast mean"""
+        if self.has_cross_channel_stages:
+            out = self._apply_cross_channel(img, mean)
+            lut = self.point_lut()
+        else:
+            out = img
+            if self.contrast != 0 and mean is None:
+                mean = self.image_mean(img)
+            lut = self.point_lut(contrast_mean=mean)
+
+        if lut is not None:
+            out = cv2.LUT(out, lut)
+
+        if self.sharpness != 1.0:
+            out = ImageProcessor.sharpen(out, self.sharpness)
+        return out
+
+    @staticmethod
+    def image_mean(img: np.ndarray) -> float:
+        """Mean over all pixels and channels, matching ``np.mean`` without a float copy"""
+        channels = 1 if img.ndim == 2 else img.shape[2]
+        return float(np.mean(cv2.mean(img)[:channels]))
+
+    def _apply_cross_channel(self, img: np.ndarray, mean: Optional[float] = None) -> np.ndarray:
+        buf = img.astype(np.float32)
+        plane_a = np.empty(img.shape[:2], dtype=np.float32)
+        plane_b = np.empty(img.shape[:2], dtype=np.float32)
+
+        if self.brightness != 0:
+            self._apply_brightness(buf, plane_a, plane_b)
+
+        if self.contrast != 0:
+            factor = (100 + self.contrast) / 100.0
+            if mean is None:
+                mean = float(buf.mean())
+            buf -= mean
+            buf *= factor
+            buf += mean
+            np.clip(buf, 0, 255, out=buf)
+
+        if self.saturation != 0:
+            self._apply_saturation(buf, plane_a, plane_b)
+
+        out = np.empty(img.shape, dtype=np.uint8)
+        np.rint(buf, out=buf)
+        np.copyto(out, buf, casting="unsafe")
+        return out
+
+    def _apply_brightness(self, buf: np.ndarray, value: np.ndarray, scale: np.ndarray) -> None:
+        factor = max(0.0, 1 + self.brightness / 100.0)
+        np.max(buf, axis=2, out=value)
+        # Per-pixel scale is min(factor, 255 / V); V == 0 pixels stay black
+        scale.fill(factor)
+        np.divide(255.0, value, out=scale, where=value * factor > 255.0)
+        buf *= scale[:, :, None]
+
+    def _apply_saturation(self, buf: np.ndarray, value: np.ndarray, mult: np.ndarray) -> None:
+        factor = max(0.0, 1 + self.saturation / 100.0)
+        np.max(buf, axis=2, out=value)
+        np.min(buf, axis=2, out=mult)
+        # mult <- V - min, then min(factor, V / (V - min)); grey pixels are untouched
+        np.subtract(value, mult, out=mult)
+        limited = mult * factor > value
+        np.divide(value, mult, out=mult, where=limited)
+        mult[~limited] = factor
+        buf -= value[:, :, None]
+        buf *= mult[:, :, None]
+        buf += value[:, :, None]
+        np.clip(buf, 0, 255, out=buf)
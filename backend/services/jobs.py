@@ -0,0 +1,422 @@
+"""
+Job Queue Service
+Durable background execution of batch operations
+
+Configuration:
+- DARKROOM_JOB_WORKERS: worker threads processing job items (default: CPU count)
+- DARKROOM_JOB_POLL_SECONDS: how often idle workers look for new items (default: 1.0)
+- DARKROOM_JOB_LOCK_RETRIES: attempts to record a finished item while the database is locked (default: 5)
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, exists, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from backend.db import SessionLocal
+from backend.models.jobs import BatchJob, BatchJobItem
+
+logger = logging.getLogger("darkroom.jobs")
+
+# Worker threads processing job items (overridable via env var)
+JOB_WORKERS = int(os.environ.get("DARKROOM_JOB_WORKERS", "0")) or os.cpu_count() or 1
+
+# Idle poll interval in seconds; submissions wake workers immediately (overridable via env var)
+JOB_POLL_SECONDS = float(os.environ.get("DARKROOM_JOB_POLL_SECONDS", "1.0"))
+
+# Attempts to record a finished item when the database stays locked (overridable via env var)
+JOB_LOCK_RETRIES = max(1, int(os.environ.get("DARKROOM_JOB_LOCK_RETRIES", "5")))
+
+# Delay before the first retry in seconds; doubles with every attempt
+JOB_LOCK_RETRY_DELAY = 0.1
+
+# Job statuses whose pending items may still be picked up
+ACTIVE_STATUSES = ("queued", "running")
+
+# Handlers by job kind. Per-item handlers take (db, layer_id, payload) and
+# return a JSON-serialisable result. Chunked handlers take (db, layer_ids,
+# payload) and return one result or Exception per layer.
+ItemHandler = Callable[[Session, Any, dict], Any]
+JOB_HANDLERS: Dict[str, ItemHandler] = {}
+
+# Items claimed per call for kinds with chunked handlers
+JOB_CHUNK_SIZES: Dict[str, int] = {}
+
+
+def register_handler(kind: str, chunk_size: Optional[int] = None) -> Callable[[ItemHandler], ItemHandler]:
+    """
+    Decorator registering the handler for a job kind. With ``chunk_size``
+    the handler receives up to that many of a job's layers at once, e.g. to
+    stream them through a pipeline.
+    """
+    def decorator(handler: ItemHandler) -> ItemHandler:
+        JOB_HANDLERS[kind] = handler
+        if chunk_size:
+            JOB_CHUNK_SIZES[kind] = chunk_size
+        else:
+            JOB_CHUNK_SIZES.pop(kind, None)
+        return handler
+    return decorator
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of batch jobs, processed one item (or chunk) at a time.
+
+    A job is one row in ``batch_jobs`` plus one ``batch_job_items`` row per
+    layer, so progress and results survive restarts. Workers claim single
+    items (or a small chunk for chunked kinds), not whole jobs: every worker
+    helps with the highest-priority job (oldest first on ties), which keeps
+    a large export running on every worker. Claiming is an ``UPDATE ... WHERE status = 'pending'`` whose row
+    count tells the worker whether it won the item, so concurrent workers
+    never process the same item twice.
+
+    Cancelling a job cancels its pending items; items already running
+    finish. Items left ``running`` by a crashed process are re-queued by
+    ``start``. If recording an item's outcome keeps failing on a locked
+    database, the claimed items that were not recorded go back to
+    ``pending`` so another pass runs them again.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    # ----------------------------------------------------------------- client API
+
+    def submit(
+        self,
+        db: Session,
+        kind: str,
+        layer_ids: Sequence[int],
+        payload: dict,
+        priority: int = 0
+    ) -> BatchJob:
+        """Persist a new job with one pending item per layer and wake the workers"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = BatchJob(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            status="queued" if layer_ids else "completed",
+            priority=priority,
+            payload=payload,
+            total=len(layer_ids),
+            completed=0,
+            failed=0,
+            item_seconds=0.0,
+            finished_at=None if layer_ids else datetime.utcnow(),
+        )
+        db.add(job)
+        db.add_all(
+            BatchJobItem(job_id=job.id, position=position, layer_id=layer_id, status="pending")
+            for position, layer_id in enumerate(layer_ids)
+        )
+        db.commit()
+        self._wake.set()
+        return job
+
+    def cancel(self, db: Session, job_id: str) -> Optional[BatchJob]:
+        """Cancel a queued or running job; returns None if it does not exist"""
+        job = db.get(BatchJob, job_id)
+        if job is None:
+            return None
+        if job.status in ACTIVE_STATUSES:
+            now = datetime.utcnow()
+            db.execute(
+                update(BatchJobItem)
+                .where(BatchJobItem.job_id == job_id, BatchJobItem.status == "pending")
+                .values(status="cancelled", finished_at=now)
+            )
+            job.status = "cancelled"
+            job.finished_at = now
+            db.commit()
+        return job
+
+    def set_priority(self, db: Session, job_id: str, priority: int) -> Optional[BatchJob]:
+        """Reorder a job; its remaining items run before those of lower-priority jobs"""
+        job = db.get(BatchJob, job_id)
+        if job is None:
+            return None
+        job.priority = priority
+        db.commit()
+        return job
+
+    def status(self, db: Session, job_id: str, include_items: bool = False) -> Optional[dict]:
+        """Progress, counts and ETA of a job; None if it does not exist"""
+        job = db.get(BatchJob, job_id)
+        if job is None:
+            return None
+        db.refresh(job)
+
+        counts = dict.fromkeys(("pending", "running", "completed", "failed", "cancelled"), 0)
+        rows = db.query(BatchJobItem.status).filter(BatchJobItem.job_id == job_id).all()
+        for (status,) in rows:
+            counts[status] = counts.get(status, 0) + 1
+
+        done = job.completed + job.failed
+        eta_seconds = None
+        if job.status == "running" and done and job.started_at:
+            # Wall-clock throughput so far, which accounts for every worker on the job
+            elapsed = (datetime.utcnow() - job.started_at).total_seconds()
+            remaining = counts["pending"] + counts["running"]
+            eta_seconds = round(elapsed / done * remaining, 1)
+
+        result = {
+            "batch_id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "priority": job.priority,
+            "total_files": job.total,
+            "completed": job.completed,
+            "failed": job.failed,
+            "pending": counts["pending"],
+            "running": counts["running"],
+            "cancelled": counts["cancelled"],
+            "progress": round(100.0 * done / job.total, 1) if job.total else 100.0,
+            "avg_item_seconds": round(job.item_seconds / done, 3) if done else None,
+            "eta_seconds": eta_seconds,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+        if include_items:
+            items = (
+                db.query(BatchJobItem)
+                .filter(BatchJobItem.job_id == job_id)
+                .order_by(BatchJobItem.position)
+                .all()
+            )
+            result["items"] = [
+                {
+                    "layer_id": item.layer_id,
+                    "status": item.status,
+                    "result": item.result,
+                    "error": item.error,
+                }
+                for item in items
+            ]
+        return result
+
+    # -------------------------------------------------------------------- workers
+
+    def start(self) -> None:
+        """Re-queue interrupted items and start the worker threads"""
+        if self._threads:
+            return
+        with self.session_factory() as db:
+            requeued = db.execute(
+                update(BatchJobItem)
+                .where(BatchJobItem.status == "running")
+                .values(status="pending", started_at=None)
+            ).rowcount
+            db.commit()
+        if requeued:
+            logger.info("Re-queued %d interrupted batch items", requeued)
+
+        self._stop.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"darkroom-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Ask the workers to exit after their current item and wait for them"""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.run_next():
+                    continue
+            except Exception:
+                logger.exception("Batch worker failed to process an item")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def run_pending(self) -> int:
+        """Process items in the calling thread until none are left; returns how many ran"""
+        processed = 0
+        while True:
+            count = self.run_next()
+            if not count:
+                return processed
+            processed += count
+
+    def run_next(self) -> int:
+        """Claim and process one item or chunk; returns how many items ran (0 if idle)"""
+        with self.session_factory() as db:
+            items = self._claim(db)
+            if not items:
+                return 0
+            job = db.get(BatchJob, items[0].job_id)
+
+            started = time.perf_counter()
+            outcomes = self._run_handler(db, job, [item.layer_id for item in items])
+            seconds = (time.perf_counter() - started) / len(items)
+            for index, (item, outcome) in enumerate(zip(items, outcomes)):
+                if isinstance(outcome, Exception):
+                    result, error = None, str(outcome)
+                else:
+                    result, error = outcome, None
+                try:
+                    self._with_lock_retries(
+                        db, lambda: self._finish(db, item.id, job.id, result, error, seconds)
+                    )
+                except OperationalError:
+                    self._release([unrecorded.id for unrecorded in items[index:]])
+                    raise
+        return len(items)
+
+    @staticmethod
+    def _with_lock_retries(db: Session, operation: Callable[[], Any]) -> Any:
+        """Run ``operation``, rolling back and retrying with backoff while it raises OperationalError"""
+        for attempt in range(JOB_LOCK_RETRIES):
+            try:
+                return operation()
+            except OperationalError:
+                db.rollback()
+                if attempt == JOB_LOCK_RETRIES - 1:
+                    raise
+                logger.warning("Database busy, retrying batch item update (attempt %d)", attempt + 1)
+                time.sleep(JOB_LOCK_RETRY_DELAY * 2 ** attempt)
+
+    def _release(self, item_ids: List[int]) -> None:
+        """Return claimed items whose outcome could not be recorded to ``pending``"""
+        try:
+            with self.session_factory() as db:
+                def reset():
+                    db.execute(
+                        update(BatchJobItem)
+                        .where(BatchJobItem.id.in_(item_ids), BatchJobItem.status == "running")
+                        .values(status="pending", started_at=None)
+                    )
+                    db.commit()
+                self._with_lock_retries(db, reset)
+        except OperationalError:
+            # Still ``running``; ``start`` re-queues them after a restart
+            logger.exception("Could not re-queue batch items %s", item_ids)
+        else:
+            logger.warning("Re-queued batch items %s after database lock errors", item_ids)
+            self._wake.set()
+
+    @staticmethod
+    def _run_handler(db: Session, job: BatchJob, layer_ids: List[int]) -> List[Any]:
+        """One result or Exception per layer"""
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            return [ValueError(f"No handler registered for job kind: {job.kind}")] * len(layer_ids)
+
+        if JOB_CHUNK_SIZES.get(job.kind):
+            try:
+                return list(handler(db, layer_ids, job.payload))
+            except Exception as e:
+                db.rollback()
+                return [e] * len(layer_ids)
+
+        outcomes = []
+        for layer_id in layer_ids:
+            try:
+                outcomes.append(handler(db, layer_id, job.payload))
+            except Exception as e:
+                db.rollback()
+                outcomes.append(e)
+        return outcomes
+
+    def _claim(self, db: Session) -> List[BatchJobItem]:
+        """Claim the next pending items (a chunk for chunked kinds) of the highest-priority job"""
+        while True:
+            top = db.execute(
+                select(BatchJobItem.job_id, BatchJob.kind)
+                .join(BatchJob, BatchJob.id == BatchJobItem.job_id)
+                .where(BatchJobItem.status == "pending", BatchJob.status.in_(ACTIVE_STATUSES))
+                .order_by(BatchJob.priority.desc(), BatchJob.created_at, BatchJobItem.position)
+                .limit(1)
+            ).first()
+            if top is None:
+                return []
+
+            candidates = db.execute(
+                select(BatchJobItem.id)
+                .where(BatchJobItem.job_id == top.job_id, BatchJobItem.status == "pending")
+                .order_by(BatchJobItem.position)
+                .limit(JOB_CHUNK_SIZES.get(top.kind) or 1)
+            ).scalars().all()
+
+            now = datetime.utcnow()
+            claimed = [
+                item_id for item_id in candidates
+                if db.execute(
+                    update(BatchJobItem)
+                    .where(BatchJobItem.id == item_id, BatchJobItem.status == "pending")
+                    .values(status="running", started_at=now)
+                ).rowcount
+            ]
+            if claimed:
+                db.execute(
+                    update(BatchJob)
+                    .where(BatchJob.id == top.job_id, BatchJob.status == "queued")
+                    .values(status="running", started_at=now)
+                )
+                db.commit()
+                return [db.get(BatchJobItem, item_id) for item_id in claimed]
+            # Other workers won these items; look again
+            db.rollback()
+
+    def _finish(
+        self,
+        db: Session,
+        item_id: int,
+        job_id: str,
+        result: Optional[dict],
+        error: Optional[str],
+        seconds: float
+    ) -> None:
+        now = datetime.utcnow()
+        status = "failed" if error else "completed"
+        db.execute(
+            update(BatchJobItem)
+            .where(BatchJobItem.id == item_id)
+            .values(status=status, result=result, error=error, finished_at=now)
+        )
+        counter = BatchJob.failed if error else BatchJob.completed
+        db.execute(
+            update(BatchJob)
+            .where(BatchJob.id == job_id)
+            .values({counter: counter + 1, BatchJob.item_seconds: BatchJob.item_seconds + seconds})
+        )
+        # The last item to finish closes the job
+        unfinished = exists().where(
+            and_(BatchJobItem.job_id == job_id, BatchJobItem.status.in_(("pending", "running")))
+        )
+        db.execute(
+            update(BatchJob)
+            .where(BatchJob.id == job_id, BatchJob.status == "running", ~unfinished)
+            .values(status="completed", finished_at=now)
+        )
+        db.commit()
+        if error:
+            logger.warning("Batch %s item %d failed: %s", job_id, item_id, error)
+
+
+# Shared queue started with the application
+job_queue = JobQueue()
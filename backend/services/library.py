@@ -0,0 +1,239 @@
+"""
+Library Service
+Indexed camera metadata on images, and filtered, sorted, paginated catalogue queries
+
+Metadata read by services/exif.py is copied onto the image row at import
+(``apply_metadata``) into indexed columns, so catalogue queries filter and
+sort inside the database instead of loading and parsing every row. Pages
+are addressed by keyset cursors (the last row's sort value and id), so a
+deep page costs the same index seek as the first one.
+"""
+import base64
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from backend.models.layers import Layer
+from backend.models.models import Image, OriginalBlob
+from backend.services.exif import read_metadata_bulk
+from backend.services.originals import release_original
+
+logger = logging.getLogger("darkroom.library")
+
+# EXIF fields (services/exif.py names) and the Image columns they are stored in
+METADATA_COLUMNS = {
+    "make": "camera_make",
+    "model": "camera_model",
+    "lens_model": "lens_model",
+    "iso": "iso",
+    "aperture": "aperture",
+    "exposure_time": "exposure_time",
+    "focal_length": "focal_length",
+    "captured_at": "captured_at",
+}
+
+# Columns that can be filtered by exact value
+EXACT_FILTERS = ("camera_make", "camera_model", "lens_model", "format")
+
+# Columns that can be filtered by range, as <column>_min / <column>_max (inclusive)
+RANGE_FILTERS = ("iso", "aperture", "exposure_time", "focal_length", "captured_at")
+
+# Columns results can be sorted by; ties are broken by id
+SORT_FIELDS = ("captured_at", "created_at", "iso", "aperture", "exposure_time", "focal_length", "filename", "id")
+
+# Columns whose cursor values are datetimes
+DATETIME_FIELDS = ("captured_at", "created_at")
+
+# Columns that have per-value counts (see ``facet_counts``)
+FACET_FIELDS = ("camera_make", "camera_model", "lens_model")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Images read per commit when backfilling metadata
+BACKFILL_CHUNK = 500
+
+
+class LibraryQueryError(ValueError):
+    """Raised for unknown filter or sort fields and malformed cursors"""
+
+
+class ImageInUseError(ValueError):
+    """Raised when deleting an image would remove an original that layers still show"""
+
+
+def apply_metadata(image: Image, metadata: dict) -> Image:
+    """Copy the indexed fields of a ``read_metadata`` result onto an image row"""
+    for field, column in METADATA_COLUMNS.items():
+        setattr(image, column, metadata.get(field))
+    return image
+
+
+def backfill_metadata(db: Session, workers: int = 4) -> int:
+    """
+    Read metadata for images imported before it was indexed (no make,
+    model or capture time yet) and store it. Returns the number of images
+    updated; files that are missing or carry no metadata are skipped.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        images = (
+            db.query(Image)
+            .filter(
+                Image.id > last_id,
+                Image.camera_make.is_(None),
+                Image.camera_model.is_(None),
+                Image.captured_at.is_(None),
+            )
+            .order_by(Image.id)
+            .limit(BACKFILL_CHUNK)
+            .all()
+        )
+        if not images:
+            return updated
+        last_id = images[-1].id
+
+        existing = [image for image in images if Path(image.filepath).exists()]
+        results = read_metadata_bulk((image.filepath for image in existing), workers=workers)
+        for image, (_, metadata) in zip(existing, results):
+            if any(metadata.get(field) is not None for field in METADATA_COLUMNS):
+                apply_metadata(image, metadata)
+                updated += 1
+        db.commit()
+
+
+def delete_image(db: Session, image: Image) -> bool:
+    """
+    Delete an image and drop its reference to its stored original. The
+    original file is removed once no image references it; that is refused
+    while a layer still shows the file. Returns whether the file was removed.
+    """
+    if image.content_hash:
+        blob = db.get(OriginalBlob, image.content_hash)
+        last_reference = blob is None or blob.ref_count <= 1
+        if last_reference and db.query(Layer.id).filter(Layer.content == image.filepath).first():
+            raise ImageInUseError(f"Image {image.id} is still used by a layer")
+        removed = release_original(db, image.content_hash)
+    else:
+        removed = None
+    db.delete(image)
+    db.commit()
+    if removed is not None:
+        removed.unlink(missing_ok=True)
+    return removed is not None
+
+
+def query_images(
+    db: Session,
+    filters: Optional[Dict[str, object]] = None,
+    sort: str = "captured_at",
+    descending: bool = True,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Image], Optional[str]]:
+    """
+    One page of images matching ``filters``, sorted by ``sort`` then id.
+    Returns the rows and the cursor of the next page (None on the last).
+
+    ``filters`` maps ``EXACT_FILTERS`` columns to a value and
+    ``<column>_min`` / ``<column>_max`` of ``RANGE_FILTERS`` columns to
+    inclusive bounds; None values are ignored. Images without a value for
+    the sort column sort as the lowest values: first ascending, last
+    descending.
+    """
+    if sort not in SORT_FIELDS:
+        raise LibraryQueryError(f"Cannot sort by {sort!r}; choose one of {', '.join(SORT_FIELDS)}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    column = getattr(Image, sort)
+
+    query = db.query(Image).filter(*_filter_clauses(filters or {}))
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, sort)
+        query = query.filter(_after(column, value, last_id, descending, sort == "id"))
+    if sort == "id":
+        query = query.order_by(Image.id.desc() if descending else Image.id)
+    elif descending:
+        query = query.order_by(column.desc().nulls_last(), Image.id.desc())
+    else:
+        query = query.order_by(column.asc().nulls_first(), Image.id)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], sort), rows[-1].id)
+
+
+def facet_counts(db: Session, field: str, filters: Optional[Dict[str, object]] = None) -> List[Tuple[object, int]]:
+    """(value, image count) for each distinct value of a ``FACET_FIELDS`` column, most common first"""
+    if field not in FACET_FIELDS:
+        raise LibraryQueryError(f"No facet for {field!r}; choose one of {', '.join(FACET_FIELDS)}")
+    column = getattr(Image, field)
+    count = func.count(Image.id)
+    rows = (
+        db.query(column, count)
+        .filter(column.isnot(None), *_filter_clauses(filters or {}))
+        .group_by(column)
+        .order_by(count.desc(), column)
+        .all()
+    )
+    return [(value, total) for value, total in rows]
+
+
+def encode_cursor(value, last_id: int) -> str:
+    """Opaque page cursor for the row after (value, id)"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, last_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[object, int]:
+    """(sort value, id) of an ``encode_cursor`` result"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, last_id = json.loads(raw)
+        if value is not None and sort in DATETIME_FIELDS:
+            value = datetime.fromisoformat(value)
+        return value, int(last_id)
+    except (ValueError, TypeError) as e:
+        raise LibraryQueryError("Malformed cursor") from e
+
+
+# --------------------------------------------------------------------- helpers
+
+def _filter_clauses(filters: Dict[str, object]) -> list:
+    clauses = []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name in EXACT_FILTERS:
+            clauses.append(getattr(Image, name) == value)
+        elif name.endswith("_min") and name[:-4] in RANGE_FILTERS:
+            clauses.append(getattr(Image, name[:-4]) >= value)
+        elif name.endswith("_max") and name[:-4] in RANGE_FILTERS:
+            clauses.append(getattr(Image, name[:-4]) <= value)
+        else:
+            raise LibraryQueryError(f"Unknown filter {name!r}")
+    return clauses
+
+
+def _after(column, value, last_id: int, descending: bool, is_id: bool):
+    """Rows after (value, last_id) in the query's order, written so the sort index can seek to them"""
+    if is_id:
+        return Image.id < last_id if descending else Image.id > last_id
+    if descending:
+        # Missing values come last
+        if value is None:
+            return and_(column.is_(None), Image.id < last_id)
+        return or_(and_(column <= value, or_(column < value, Image.id < last_id)), column.is_(None))
+    # Missing values come first
+    if value is None:
+        return or_(and_(column.is_(None), Image.id > last_id), column.isnot(None))
+    return and_(column >= value, or_(column > value, Image.id > last_id))
@@ -0,0 +1,150 @@
+"""
+Original Storage Service
+Content-addressed, deduplicated storage of imported original files
+
+Originals live under ``STORAGE_DIR/originals/<aa>/<sha256><ext>``, where
+``aa`` is the first two hex digits of the file's SHA-256. Importing the
+same bytes twice reuses the existing blob instead of writing a second
+copy, and each ``originals`` row counts the ``images`` rows referencing
+its blob so the file is removed only when the last one goes.
+
+Blobs never change once written, so anything derived from an original
+(pyramids, thumbnails, previews) can be cached under its content hash and
+shared by every image that references it.
+"""
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from backend.db import STORAGE_DIR
+from backend.models.models import OriginalBlob
+
+# Root of the content-addressed store
+ORIGINALS_DIR = Path(STORAGE_DIR) / "originals"
+
+# Bytes copied per read when streaming a file into the store
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def incoming_dir(root: Path = ORIGINALS_DIR) -> Path:
+    """Scratch directory for files still being received; on the same filesystem as the blobs"""
+    path = Path(root) / ".incoming"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def new_incoming_path(root: Path = ORIGINALS_DIR) -> Path:
+    """Unique scratch path for a file about to be received"""
+    return incoming_dir(root) / f"{uuid.uuid4()}.part"
+
+
+def find_original(sha256: str, root: Path = ORIGINALS_DIR) -> Optional[Path]:
+    """Stored blob with this content hash, whatever its extension, or None"""
+    shard = Path(root) / sha256[:2]
+    if not shard.is_dir():
+        return None
+    return next(shard.glob(f"{sha256}.*"), None) or next(shard.glob(sha256), None)
+
+
+def content_hash_of(path: Path, root: Path = ORIGINALS_DIR) -> Optional[str]:
+    """Content hash of a path inside the store, or None for files stored elsewhere"""
+    path = Path(path)
+    try:
+        path.resolve().relative_to(Path(root).resolve())
+    except ValueError:
+        return None
+    digest = path.name.split(".", 1)[0]
+    return digest if len(digest) == 64 and path.parent.name == digest[:2] else None
+
+
+def store_incoming(incoming: Path, sha256: str, suffix: str, root: Path = ORIGINALS_DIR) -> Tuple[Path, bool]:
+    """
+    Move a fully received file into the store under its content hash.
+
+    Returns the blob path and whether it was newly created. If the content
+    is already stored, the incoming copy is deleted and the existing blob
+    is returned. The blob is hard-linked into place, so two imports of the
+    same bytes racing each other both end up with the single winner.
+    """
+    existing = find_original(sha256, root)
+    if existing is not None:
+        incoming.unlink(missing_ok=True)
+        return existing, False
+
+    blob = Path(root) / sha256[:2] / f"{sha256}{suffix.lower()}"
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(incoming, blob)
+        created = True
+    except FileExistsError:
+        created = False
+    incoming.unlink(missing_ok=True)
+    return blob, created
+
+
+def save_original(source: BinaryIO, suffix: str, root: Path = ORIGINALS_DIR) -> Tuple[Path, str, int, bool]:
+    """
+    Stream a file object into the store, hashing it as it is copied.
+    Returns ``(path, sha256, size, created)``.
+    """
+    incoming = new_incoming_path(root)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with incoming.open("wb") as out:
+            while True:
+                chunk = source.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        incoming.unlink(missing_ok=True)
+        raise
+    sha256 = digest.hexdigest()
+    path, created = store_incoming(incoming, sha256, suffix, root)
+    return path, sha256, size, created
+
+
+def acquire_original(db: Session, sha256: str, path: Path, size: int) -> None:
+    """
+    Count one more image referencing a blob, registering the blob on first
+    use. Runs in the caller's transaction, next to the ``Image`` insert.
+    """
+    referenced = db.execute(
+        update(OriginalBlob)
+        .where(OriginalBlob.sha256 == sha256)
+        .values(ref_count=OriginalBlob.ref_count + 1)
+    ).rowcount
+    if not referenced:
+        db.add(OriginalBlob(sha256=sha256, path=str(Path(path).resolve()), size=size, ref_count=1))
+        # Flushed so a duplicate later in the same transaction finds the row
+        db.flush()
+
+
+def release_original(db: Session, sha256: str) -> Optional[Path]:
+    """
+    Drop one image's reference to a blob. When it was the last one the
+    row is deleted and the blob path is returned; the caller removes the
+    file once its transaction has committed.
+    """
+    blob = db.get(OriginalBlob, sha256)
+    if blob is None:
+        return None
+    blob.ref_count -= 1
+    if blob.ref_count > 0:
+        return None
+    db.delete(blob)
+    return Path(blob.path)
+
+
+def remove_unreferenced(db: Session, sha256: str, path: Optional[Path]) -> None:
+    """Delete a blob written by a failed import unless some image references it"""
+    if path is not None and db.get(OriginalBlob, sha256) is None:
+        Path(path).unlink(missing_ok=True)
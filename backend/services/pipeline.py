@@ -0,0 +1,141 @@
+"""
+Pipeline Service
+Streams items through concurrent stages connected by bounded queues
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# Marks the end of the stream on a stage's input queue
+_DONE = object()
+
+Stage = Tuple[str, Callable[[Any], Any]]
+
+
+class _Failed:
+    """An item that raised in an earlier stage; later stages pass it through"""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class StagedPipeline:
+    """
+    Runs each item through a fixed sequence of stages, one thread per stage.
+
+    Stages are connected by queues of at most ``queue_size`` items, so a
+    fast stage blocks (backpressure) instead of buffering the whole batch
+    in memory, while a slow stage always has its next input ready: the
+    reader can decode file N+1 while the encoder writes file N.
+
+    Per stage, ``stats`` reports how long it spent working (``busy_s``),
+    waiting for input (``starved_s``) and waiting for room downstream
+    (``blocked_s``). ``occupancy`` is busy time over wall time; the stage
+    closest to 1.0 is the one limiting throughput.
+    """
+
+    def __init__(self, stages: Sequence[Stage], queue_size: int = 2):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = list(stages)
+        self.queue_size = max(1, queue_size)
+
+    def run(self, items: Sequence[Any]) -> Tuple[List[Any], Dict[str, dict]]:
+        """
+        Stream ``items`` through every stage. Returns the outputs in input
+        order, with an item's exception in place of its output if any
+        stage raised, plus the per-stage stats.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        # The final queue is drained only after the run, so it must hold every item
+        queues[-1] = queue.Queue()
+        stats = {name: {"items": 0, "busy_s": 0.0, "starved_s": 0.0, "blocked_s": 0.0} for name, _ in self.stages}
+
+        threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(func, queues[index], queues[index + 1], stats[name]),
+                name=f"pipeline-{name}",
+                daemon=True,
+            )
+            for index, (name, func) in enumerate(self.stages)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for index, item in enumerate(items):
+            queues[0].put((index, item))
+        queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        outputs: List[Any] = [None] * len(items)
+        while True:
+            entry = queues[-1].get()
+            if entry is _DONE:
+                break
+            index, value = entry
+            outputs[index] = value.error if isinstance(value, _Failed) else value
+
+        for stage in stats.values():
+            stage["wall_s"] = wall
+            stage["occupancy"] = stage["busy_s"] / wall if wall else 0.0
+        return outputs, stats
+
+    @staticmethod
+    def _run_stage(func: Callable[[Any], Any], inbox: queue.Queue, outbox: queue.Queue, stats: dict) -> None:
+        while True:
+            waited = time.perf_counter()
+            entry = inbox.get()
+            stats["starved_s"] += time.perf_counter() - waited
+            if entry is _DONE:
+                outbox.put(_DONE)
+                return
+
+            index, value = entry
+            if not isinstance(value, _Failed):
+                began = time.perf_counter()
+                try:
+                    value = func(value)
+                except Exception as e:
+                    value = _Failed(e)
+                stats["busy_s"] += time.perf_counter() - began
+                stats["items"] += 1
+
+            waited = time.perf_counter()
+            outbox.put((index, value))
+            stats["blocked_s"] += time.perf_counter() - waited
+
+
+class PipelineStats:
+    """Thread-safe running totals of ``StagedPipeline.run`` stats across runs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, dict] = {}
+        self.runs = 0
+
+    def add(self, stats: Dict[str, dict]) -> None:
+        with self._lock:
+            self.runs += 1
+            for name, stage in stats.items():
+                totals = self._stages.setdefault(
+                    name, {"items": 0, "busy_s": 0.0, "starved_s": 0.0, "blocked_s": 0.0, "wall_s": 0.0}
+                )
+                for key in totals:
+                    totals[key] += stage[key]
+
+    def snapshot(self) -> dict:
+        """Totals per stage plus occupancy (busy time over wall time)"""
+        with self._lock:
+            stages = {}
+            for name, totals in self._stages.items():
+                stages[name] = {
+                    **{key: round(value, 4) if isinstance(value, float) else value for key, value in totals.items()},
+                    "occupancy": round(totals["busy_s"] / totals["wall_s"], 4) if totals["wall_s"] else 0.0,
+                }
+            return {"runs": self.runs, "stages": stages}
@@ -0,0 +1,76 @@
+"""
+Live Preview Service
+Coalesces rapid preview requests so only the newest parameters get rendered
+"""
+import asyncio
+import itertools
+import threading
+from typing import Dict, Hashable
+
+import cv2
+import numpy as np
+
+
+class PreviewCoalescer:
+    """
+    Tracks the newest preview request per key (usually a layer id).
+
+    Every request takes a ticket with ``begin``. Renders for the same key are
+    serialized through ``lock``, and a request whose ticket is no longer the
+    newest when its turn comes is dropped before rendering; a finished
+    render is always delivered, since it is newer than what the client
+    shows. Under a slider drag this
+    means at most one render in flight per layer, plus the newest request
+    waiting behind it; everything in between is superseded for free.
+    Every request calls ``finish`` when done, so a key's state is dropped
+    once its newest request has finished and the tracking stays bounded by
+    the keys with requests in flight.
+    """
+
+    def __init__(self):
+        self._tickets = itertools.count(1)
+        self._latest: Dict[Hashable, int] = {}
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._mutex = threading.Lock()
+        self.superseded = 0
+
+    def begin(self, key: Hashable) -> int:
+        """Register a new request for ``key`` and return its ticket"""
+        with self._mutex:
+            ticket = next(self._tickets)
+            self._latest[key] = ticket
+            return ticket
+
+    def is_current(self, key: Hashable, ticket: int) -> bool:
+        """True if no newer request for ``key`` has arrived since ``ticket``"""
+        with self._mutex:
+            current = self._latest.get(key) == ticket
+            if not current:
+                self.superseded += 1
+            return current
+
+    def lock(self, key: Hashable) -> asyncio.Lock:
+        """Per-key lock that serializes renders for the same layer"""
+        with self._mutex:
+            if key not in self._locks:
+                self._locks[key] = asyncio.Lock()
+            return self._locks[key]
+
+    def finish(self, key: Hashable, ticket: int) -> None:
+        """Mark a request done; forgets ``key`` if it was the newest and nothing holds its lock"""
+        with self._mutex:
+            if self._latest.get(key) != ticket:
+                return  # A newer request is waiting and will clean up
+            lock = self._locks.get(key)
+            if lock is None or not lock.locked():
+                self._latest.pop(key, None)
+                self._locks.pop(key, None)
+
+
+def encode_image(img: np.ndarray, fmt: str = ".jpg", quality: int = 85) -> bytes:
+    """Encode an image in memory and return the raw bytes"""
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if fmt in (".jpg", ".jpeg") else []
+    ok, encoded = cv2.imencode(fmt, img, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return encoded.tobytes()
@@ -0,0 +1,258 @@
+"""
+Image Probe Service
+Reads format, dimensions and EXIF orientation from file headers without decoding pixels
+
+Only the structures that describe the frame are read: the PNG IHDR chunk,
+the JPEG SOF segment (plus the EXIF APP1 segment for orientation), the
+first TIFF IFD, the WebP VP8/VP8L/VP8X header, and the GIF and BMP
+headers. Segments that do not matter are skipped with ``seek``, so even a
+JPEG with a large embedded ICC profile costs a few small reads.
+"""
+import io
+import struct
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Optional, Tuple, Union
+
+# Leading bytes that identify the image formats we accept
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+    (b"BM", "BMP"),
+)
+
+# Bytes needed to recognise any accepted format
+SNIFF_BYTES = 12
+
+# Bytes read up front; enough for every fixed-position header below
+HEAD_BYTES = 32
+
+# JPEG start-of-frame markers (SOF0-SOF15 minus DHT, JPG and DAC)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# JPEG markers without a length field
+JPEG_STANDALONE_MARKERS = frozenset(range(0xD0, 0xD8)) | {0x01, 0xD8}
+
+# TIFF tags read from the first IFD
+TIFF_IMAGE_WIDTH = 256
+TIFF_IMAGE_LENGTH = 257
+TIFF_ORIENTATION = 274
+
+# IFDs claiming more entries than this are treated as corrupt
+MAX_IFD_ENTRIES = 4096
+
+# EXIF orientations that rotate the image by 90 degrees
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class ProbeError(ValueError):
+    """Raised internally when a header is truncated or malformed"""
+
+
+class ImageProbe:
+    """
+    What an image header says about a file. ``width`` and ``height`` are
+    the stored pixel dimensions; ``display_size`` applies the EXIF
+    ``orientation`` (1-8, 1 meaning upright).
+    """
+
+    __slots__ = ("format", "width", "height", "orientation")
+
+    def __init__(self, format: str, width: int, height: int, orientation: int = 1):
+        self.format = format
+        self.width = width
+        self.height = height
+        self.orientation = orientation if 1 <= orientation <= 8 else 1
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """(width, height) as displayed once the orientation is applied"""
+        if self.orientation in TRANSPOSED_ORIENTATIONS:
+            return self.height, self.width
+        return self.width, self.height
+
+    def __repr__(self) -> str:
+        return f"ImageProbe({self.format} {self.width}x{self.height}, orientation={self.orientation})"
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """Image format named by a file's leading bytes, or None if it is not a supported image"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, fmt in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return fmt
+    return None
+
+
+def probe_stream(stream: BinaryIO) -> Optional[ImageProbe]:
+    """Probe a seekable binary stream positioned anywhere; None if it is not a readable image"""
+    stream.seek(0)
+    head = stream.read(HEAD_BYTES)
+    parser = _PARSERS.get(sniff_image_format(head))
+    if parser is None:
+        return None
+    try:
+        probe = parser(stream, head)
+    except (ProbeError, struct.error, IndexError):
+        return None
+    if probe.width <= 0 or probe.height <= 0:
+        return None
+    return probe
+
+
+def probe_file(path: Union[str, Path]) -> Optional[ImageProbe]:
+    """Probe an image file on disk"""
+    with open(path, "rb") as stream:
+        return probe_stream(stream)
+
+
+def probe_bytes(data: bytes) -> Optional[ImageProbe]:
+    """Probe the leading bytes of an image; None if they are not enough or not an image"""
+    return probe_stream(io.BytesIO(data))
+
+
+# --------------------------------------------------------------------- parsers
+
+def _read(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise ProbeError("Unexpected end of header")
+    return data
+
+
+def _probe_png(stream: BinaryIO, head: bytes) -> ImageProbe:
+    if head[12:16] != b"IHDR":
+        raise ProbeError("PNG does not start with IHDR")
+    width, height = struct.unpack(">II", head[16:24])
+    return ImageProbe("PNG", width, height)
+
+
+def _probe_jpeg(stream: BinaryIO, head: bytes) -> ImageProbe:
+    orientation = 1
+    stream.seek(2)
+    while True:
+        if _read(stream, 1) != b"\xff":
+            raise ProbeError("Malformed JPEG marker")
+        marker = _read(stream, 1)[0]
+        while marker == 0xFF:  # Fill bytes
+            marker = _read(stream, 1)[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise ProbeError("JPEG has no frame header before its scan data")
+
+        length = struct.unpack(">H", _read(stream, 2))[0] - 2
+        if length < 0:
+            raise ProbeError("Malformed JPEG segment length")
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">xHH", _read(stream, 5))
+            return ImageProbe("JPEG", width, height, orientation)
+        if marker == 0xE1 and orientation == 1:
+            segment = _read(stream, length)
+            if segment.startswith(b"Exif\x00\x00"):
+                tags = _tiff_ifd0(io.BytesIO(segment[6:]), (TIFF_ORIENTATION,))
+                orientation = tags.get(TIFF_ORIENTATION, 1)
+        else:
+            stream.seek(length, io.SEEK_CUR)
+
+
+def _probe_tiff(stream: BinaryIO, head: bytes) -> ImageProbe:
+    tags = _tiff_ifd0(stream, (TIFF_IMAGE_WIDTH, TIFF_IMAGE_LENGTH, TIFF_ORIENTATION))
+    if TIFF_IMAGE_WIDTH not in tags or TIFF_IMAGE_LENGTH not in tags:
+        raise ProbeError("TIFF IFD0 has no image size")
+    return ImageProbe("TIFF", tags[TIFF_IMAGE_WIDTH], tags[TIFF_IMAGE_LENGTH], tags.get(TIFF_ORIENTATION, 1))
+
+
+def _probe_webp(stream: BinaryIO, head: bytes) -> ImageProbe:
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        if head[23:26] != b"\x9d\x01\x2a":
+            raise ProbeError("Missing VP8 start code")
+        width, height = struct.unpack("<HH", head[26:30])
+        return ImageProbe("WEBP", width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L":
+        if head[20] != 0x2F:
+            raise ProbeError("Missing VP8L signature")
+        bits = struct.unpack("<I", head[21:25])[0]
+        return ImageProbe("WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b"VP8X":
+        flags = head[20]
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        orientation = _webp_orientation(stream) if flags & 0x08 else 1
+        return ImageProbe("WEBP", width, height, orientation)
+    raise ProbeError("Unknown WebP chunk")
+
+
+def _webp_orientation(stream: BinaryIO) -> int:
+    # Walk the RIFF chunks after VP8X looking for EXIF
+    stream.seek(30)
+    while True:
+        header = stream.read(8)
+        if len(header) < 8:
+            return 1
+        fourcc, size = header[:4], struct.unpack("<I", header[4:])[0]
+        if fourcc == b"EXIF":
+            exif = _read(stream, size)
+            if exif.startswith(b"Exif\x00\x00"):
+                exif = exif[6:]
+            return _tiff_ifd0(io.BytesIO(exif), (TIFF_ORIENTATION,)).get(TIFF_ORIENTATION, 1)
+        stream.seek(size + (size & 1), io.SEEK_CUR)
+
+
+def _probe_gif(stream: BinaryIO, head: bytes) -> ImageProbe:
+    width, height = struct.unpack("<HH", head[6:10])
+    return ImageProbe("GIF", width, height)
+
+
+def _probe_bmp(stream: BinaryIO, head: bytes) -> ImageProbe:
+    header_size = struct.unpack("<I", head[14:18])[0]
+    if header_size == 12:  # BITMAPCOREHEADER
+        width, height = struct.unpack("<HH", head[18:22])
+    else:
+        width, height = struct.unpack("<ii", head[18:26])
+    # Negative heights mark top-down bitmaps
+    return ImageProbe("BMP", width, abs(height))
+
+
+def _tiff_ifd0(stream: BinaryIO, wanted: Tuple[int, ...]) -> Dict[int, int]:
+    """Single-valued SHORT/LONG tags from the first IFD of a TIFF structure starting at offset 0"""
+    stream.seek(0)
+    order = _read(stream, 2)
+    if order not in (b"II", b"MM"):
+        raise ProbeError("Bad TIFF byte order")
+    endian = "<" if order == b"II" else ">"
+    magic, offset = struct.unpack(endian + "HI", _read(stream, 6))
+    if magic != 42:
+        raise ProbeError("Bad TIFF magic number")
+
+    stream.seek(offset)
+    count = struct.unpack(endian + "H", _read(stream, 2))[0]
+    if count > MAX_IFD_ENTRIES:
+        raise ProbeError("TIFF IFD too large")
+    entries = _read(stream, 12 * count)
+
+    tags = {}
+    for start in range(0, len(entries), 12):
+        tag, field_type, values = struct.unpack(endian + "HHI", entries[start:start + 8])
+        if tag not in wanted or values != 1:
+            continue
+        if field_type == 3:  # SHORT
+            tags[tag] = struct.unpack(endian + "H", entries[start + 8:start + 10])[0]
+        elif field_type == 4:  # LONG
+            tags[tag] = struct.unpack(endian + "I", entries[start + 8:start + 12])[0]
+    return tags
+
+
+_PARSERS: Dict[Optional[str], Callable[[BinaryIO, bytes], ImageProbe]] = {
+    "JPEG": _probe_jpeg,
+    "PNG": _probe_png,
+    "TIFF": _probe_tiff,
+    "WEBP": _probe_webp,
+    "GIF": _probe_gif,
+    "BMP": _probe_bmp,
+}
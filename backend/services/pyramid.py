@@ -0,0 +1,158 @@
+"""
+Preview Pyramid Service
+Multi-resolution proxies of layer images for screen-sized previews
+"""
+import cv2
+import numpy as np
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple
+
+from backend.db import STORAGE_DIR
+from backend.services.image_processor import ImageProcessor
+from backend.services.originals import content_hash_of
+
+# Where pyramid levels are cached, one directory per source file version
+PYRAMID_DIR = Path(STORAGE_DIR) / "pyramids"
+
+# Downscale factors of the proxy levels (1/2, 1/4, 1/8)
+LEVEL_FACTORS = (2, 4, 8)
+
+# Longest side of the thumbnail level, in pixels
+THUMBNAIL_SIZE = 256
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Concurrent builders of one pyramid each write a private scratch file, and readers never see a partial one
+    scratch = path.with_name(f".{uuid.uuid4()}.tmp")
+    scratch.write_bytes(data)
+    os.replace(scratch, path)
+
+
+class PreviewPyramid:
+    """
+    Cached multi-resolution pyramid for one source image.
+
+    Levels are built from the previous level with ``INTER_AREA`` so the full
+    resolution image is decoded only once, and stored as lossless PNGs next
+    to a ``manifest.json`` describing their sizes. Originals in the
+    content-addressed store never change, so their cache directory is keyed
+    on the content hash and shared by every image with the same bytes.
+    Other files are keyed on path plus mtime and size, so editing or
+    replacing them invalidates the cache automatically.
+    """
+
+    def __init__(self, source_path: str):
+        self.source_path = Path(source_path)
+        self.cache_dir = PYRAMID_DIR / self._cache_key()
+
+    def _cache_key(self) -> str:
+        content_hash = content_hash_of(self.source_path)
+        if content_hash is not None:
+            return content_hash
+        stat = self.source_path.stat()
+        raw = f"{self.source_path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.cache_dir / "manifest.json"
+
+    def is_built(self) -> bool:
+        return self.manifest_path.exists()
+
+    def build(self, img: Optional[np.ndarray] = None) -> dict:
+        """
+        Build the pyramid if it is missing and return its manifest.
+        An already decoded full resolution ``img`` can be passed to skip the decode.
+        """
+        if self.is_built():
+            return self.manifest()
+
+        if img is None:
+            img = ImageProcessor.load_image(str(self.source_path))
+        height, width = img.shape[:2]
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        levels = []
+        current = img
+        for factor in LEVEL_FACTORS:
+            size = (max(1, width // factor), max(1, height // factor))
+            if max(size) < THUMBNAIL_SIZE:
+                break
+            current = cv2.resize(current, size, interpolation=cv2.INTER_AREA)
+            levels.append(self._write_level(f"level_{factor}.png", current, width))
+
+        if max(width, height) > THUMBNAIL_SIZE:
+            ratio = THUMBNAIL_SIZE / max(width, height)
+            size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+            thumbnail = cv2.resize(current, size, interpolation=cv2.INTER_AREA)
+            levels.append(self._write_level("thumbnail.png", thumbnail, width))
+
+        manifest = {
+            "source": str(self.source_path),
+            "width": width,
+            "height": height,
+            "levels": sorted(levels, key=lambda level: level["scale"]),
+        }
+        # Write the manifest last so readers never see a partial pyramid
+        _write_atomic(self.manifest_path, json.dumps(manifest).encode("utf-8"))
+        return manifest
+
+    def _write_level(self, filename: str, img: np.ndarray, full_width: int) -> dict:
+        ok, encoded = cv2.imencode(".png", img, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise ValueError(f"Could not encode pyramid level {filename}")
+        _write_atomic(self.cache_dir / filename, encoded.tobytes())
+        return {
+            "file": filename,
+            "width": img.shape[1],
+            "height": img.shape[0],
+            "scale": img.shape[1] / full_width,
+        }
+
+    def manifest(self) -> dict:
+        """Return the manifest, building the pyramid on first use"""
+        if not self.is_built():
+            return self.build()
+        return json.loads(self.manifest_path.read_text())
+
+    def level_for_scale(self, min_scale: float) -> Tuple[Path, float]:
+        """
+        Return (path, scale) of the smallest level whose scale (level width /
+        full width) is at least ``min_scale``, falling back to the original.
+        """
+        manifest = self.manifest()
+        for level in manifest["levels"]:
+            if level["scale"] >= min_scale:
+                return self.cache_dir / level["file"], level["scale"]
+        return self.source_path, 1.0
+
+    def load_for_scale(self, min_scale: float) -> Tuple[np.ndarray, float]:
+        """
+        Load the smallest level whose scale is at least ``min_scale``.
+        Returns (image, scale).
+        """
+        path, scale = self.level_for_scale(min_scale)
+        return ImageProcessor.load_image(str(path)), scale
+
+    def load_for_size(self, target_size: int) -> Tuple[np.ndarray, float]:
+        """
+        Load the smallest level whose longest side is at least ``target_size``
+        pixels. Returns (image, scale).
+        """
+        manifest = self.manifest()
+        return self.load_for_scale(target_size / max(manifest["width"], manifest["height"]))
+
+
+def fit_to_size(img: np.ndarray, target_size: int) -> np.ndarray:
+    """Downscale an image so its longest side is at most ``target_size`` pixels"""
+    height, width = img.shape[:2]
+    if max(height, width) <= target_size:
+        return img
+    ratio = target_size / max(height, width)
+    size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
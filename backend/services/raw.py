@@ -0,0 +1,199 @@
+"""
+RAW Development Service
+Embedded-preview extraction and cached demosaicing of camera RAW files
+
+Demosaicing needs the optional ``rawpy`` package (LibRaw). Embedded JPEG
+previews are located by the native EXIF reader first, so most RAW files
+get a preview even without it; otherwise development raises
+``RawUnavailable``.
+"""
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from backend.db import STORAGE_DIR
+from backend.services.exif import preview_bytes, read_metadata
+from backend.services.originals import content_hash_of
+
+try:
+    import rawpy
+except ImportError:  # RAW decoding is optional; imports still work without it
+    rawpy = None
+
+# Embedded camera previews, extracted once per original
+RAW_PREVIEW_DIR = Path(STORAGE_DIR) / "raw_previews"
+
+# Developed (demosaiced) results, keyed by original and settings
+DEVELOPED_DIR = Path(STORAGE_DIR) / "developed"
+
+# Settings that change the developed result, with their defaults
+DEVELOP_DEFAULTS = {
+    "auto_white_balance": False,
+    "exposure_compensation": 0.0,
+    "highlight_recovery": True,
+    "shadow_recovery": True,
+}
+
+# LibRaw accepts linear exposure shifts between 0.25 (-2 EV) and 8.0 (+3 EV)
+EXPOSURE_SHIFT_RANGE = (0.25, 8.0)
+
+# Strength of the shadow lift applied by ``shadow_recovery``
+SHADOW_LIFT = 0.8
+
+
+class RawUnavailable(Exception):
+    """Raised when a RAW file cannot be decoded (rawpy missing or no usable data)"""
+
+
+def _require_rawpy() -> None:
+    if rawpy is None:
+        raise RawUnavailable("RAW decoding requires the rawpy package")
+
+
+def _file_key(path: Path) -> str:
+    """Content hash for stored originals, otherwise a hash of path, mtime and size"""
+    content_hash = content_hash_of(path)
+    if content_hash is not None:
+        return content_hash
+    stat = path.stat()
+    raw = f"{path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    scratch = path.with_name(f".{uuid.uuid4()}.tmp")
+    scratch.write_bytes(data)
+    os.replace(scratch, path)
+
+
+# ------------------------------------------------------------ embedded previews
+
+def embedded_preview_path(path: Path) -> Path:
+    """Cache path of a RAW file's embedded preview"""
+    key = _file_key(Path(path))
+    return RAW_PREVIEW_DIR / key[:2] / f"{key}.jpg"
+
+
+def extract_embedded_preview(path: Path) -> Optional[Path]:
+    """
+    Write the camera's embedded JPEG preview to the preview cache and
+    return its path, or None if the file has no JPEG preview. The JPEG
+    bytes are copied as they are, without decoding or re-encoding.
+
+    The largest preview found by walking the file's IFDs is used when
+    there is one; LibRaw is only opened for files the reader cannot place.
+    """
+    path = Path(path)
+    target = embedded_preview_path(path)
+    if target.exists():
+        return target
+
+    previews = read_metadata(path)["previews"]
+    if previews:
+        _write_atomic(target, preview_bytes(path, previews[0]))
+        return target
+
+    _require_rawpy()
+    with rawpy.imread(str(path)) as raw:
+        try:
+            thumb = raw.extract_thumb()
+        except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+            return None
+        if thumb.format == rawpy.ThumbFormat.JPEG:
+            data = bytes(thumb.data)
+        else:
+            # Uncompressed (bitmap) previews are stored as JPEG too
+            ok, encoded = cv2.imencode(".jpg", cv2.cvtColor(thumb.data, cv2.COLOR_RGB2BGR))
+            if not ok:
+                return None
+            data = encoded.tobytes()
+    _write_atomic(target, data)
+    return target
+
+
+def load_preview(path: Path) -> np.ndarray:
+    """
+    Fastest displayable image of a RAW file: the embedded preview when it
+    has one, otherwise a half-size development with default settings.
+    """
+    preview = extract_embedded_preview(path)
+    if preview is not None:
+        img = cv2.imread(str(preview), cv2.IMREAD_COLOR)
+        if img is not None:
+            return img
+    return develop(path, half_size=True)
+
+
+# ------------------------------------------------------------------ development
+
+def develop_settings(settings: Optional[dict] = None) -> dict:
+    """The settings that affect development, with defaults filled in"""
+    settings = settings or {}
+    return {name: settings.get(name, default) for name, default in DEVELOP_DEFAULTS.items()}
+
+
+def developed_path(path: Path, settings: Optional[dict] = None, half_size: bool = False) -> Path:
+    """Cache path of a RAW file developed with ``settings``"""
+    key = _file_key(Path(path))
+    settings_key = hashlib.sha1(
+        json.dumps([develop_settings(settings), half_size], sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+    return DEVELOPED_DIR / key[:2] / f"{key}_{settings_key}{'_half' if half_size else ''}.tiff"
+
+
+def develop(path: Path, settings: Optional[dict] = None, half_size: bool = False) -> np.ndarray:
+    """
+    Demosaic a RAW file with ``settings`` (see ``DEVELOP_DEFAULTS``) and
+    return a BGR image. ``half_size`` skips interpolation by binning each
+    2x2 Bayer quad into one pixel, about 4x faster, for previews.
+
+    Results are cached on disk by file content and settings, so developing
+    the same file with the same settings again only reads the cached file.
+    """
+    target = developed_path(path, settings, half_size)
+    if target.exists():
+        img = cv2.imread(str(target), cv2.IMREAD_COLOR)
+        if img is not None:
+            return img
+
+    img = _postprocess(Path(path), develop_settings(settings), half_size)
+    if develop_settings(settings)["shadow_recovery"]:
+        img = lift_shadows(img)
+
+    # Uncompressed TIFF: fast to write and to read back, and loadable as a layer source
+    ok, encoded = cv2.imencode(".tiff", img, [cv2.IMWRITE_TIFF_COMPRESSION, 1])
+    if ok:
+        _write_atomic(target, encoded.tobytes())
+    return img
+
+
+def _postprocess(path: Path, settings: dict, half_size: bool) -> np.ndarray:
+    _require_rawpy()
+    low, high = EXPOSURE_SHIFT_RANGE
+    exposure = float(np.clip(2.0 ** settings["exposure_compensation"], low, high))
+    with rawpy.imread(str(path)) as raw:
+        rgb = raw.postprocess(
+            half_size=half_size,
+            use_camera_wb=not settings["auto_white_balance"],
+            use_auto_wb=settings["auto_white_balance"],
+            exp_shift=exposure,
+            exp_preserve_highlights=0.8 if settings["highlight_recovery"] else 0.0,
+            highlight_mode=rawpy.HighlightMode.Blend if settings["highlight_recovery"] else rawpy.HighlightMode.Clip,
+            output_bps=8,
+        )
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+
+def lift_shadows(img: np.ndarray, strength: float = SHADOW_LIFT) -> np.ndarray:
+    """Brighten dark tones while leaving black, midtones and highlights nearly untouched"""
+    x = np.arange(256, dtype=np.float32) / 255.0
+    curve = x + strength * x * (1.0 - x) ** 3
+    lut = np.clip(curve * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    return cv2.LUT(img, lut)
@@ -0,0 +1,165 @@
+"""
+Thumbnail Service
+Fixed-size thumbnails and screen previews of originals, generated at import
+
+Configuration:
+- DARKROOM_THUMBNAIL_SIZE: longest side of thumbnails in pixels (default: 256)
+- DARKROOM_PREVIEW_SIZE: longest side of screen previews in pixels (default: 2048)
+"""
+import hashlib
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend.db import STORAGE_DIR
+from backend.services.probe import probe_file
+from backend.services.pyramid import fit_to_size
+
+logger = logging.getLogger("darkroom.thumbnails")
+
+# Longest side of each rendition (overridable via env vars)
+THUMBNAIL_SIZE = int(os.environ.get("DARKROOM_THUMBNAIL_SIZE", "256"))
+PREVIEW_SIZE = int(os.environ.get("DARKROOM_PREVIEW_SIZE", "2048"))
+RENDITION_SIZES = {
+    "thumbnail": THUMBNAIL_SIZE,
+    "preview": PREVIEW_SIZE,
+}
+
+# Where renditions are cached, sharded by the first two hex digits of their key
+RENDITION_DIR = Path(STORAGE_DIR) / "renditions"
+
+# JPEG quality of stored renditions
+RENDITION_QUALITY = 85
+
+# libjpeg can decode at 1/2, 1/4 or 1/8 scale by skipping DCT coefficients
+JPEG_REDUCED_DECODES = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Decoders for sources OpenCV cannot read, by lowercase file suffix. Each
+# takes (path, min_long_side) and returns a BGR image, ideally no larger
+# than needed for a rendition of that size.
+Decoder = Callable[[Path, int], np.ndarray]
+RENDITION_DECODERS: Dict[str, Decoder] = {}
+
+
+def register_decoder(*suffixes: str) -> Callable[[Decoder], Decoder]:
+    """Decorator registering a rendition decoder for file suffixes such as ``".nef"``"""
+    def decorator(decoder: Decoder) -> Decoder:
+        for suffix in suffixes:
+            RENDITION_DECODERS[suffix.lower()] = decoder
+        return decoder
+    return decorator
+
+
+def rendition_key(filepath: str, content_hash: Optional[str] = None) -> str:
+    """
+    Cache key of an original's renditions: its content hash, so duplicates
+    share them, or for files imported before content addressing, a hash of
+    the path plus mtime and size.
+    """
+    if content_hash:
+        return content_hash
+    stat = Path(filepath).stat()
+    raw = f"{Path(filepath).resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def rendition_version(key: str, kind: str) -> str:
+    """Short token that changes whenever a rendition's bytes may change (new original or new size)"""
+    raw = f"{key}|{kind}|{RENDITION_SIZES[kind]}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def rendition_url(image_id: int, kind: str, filepath: str, content_hash: Optional[str] = None) -> str:
+    """
+    URL of an image's rendition, versioned with ``?v=`` so it may be cached
+    forever; unversioned (revalidated on every use) if the original is missing
+    """
+    url = f"/api/images/{image_id}/{kind}"
+    try:
+        return f"{url}?v={rendition_version(rendition_key(filepath, content_hash), kind)}"
+    except FileNotFoundError:
+        return url
+
+
+def rendition_path(key: str, kind: str) -> Path:
+    """Cache path of one rendition; the target size is part of the name, so resized renditions are never stale"""
+    return RENDITION_DIR / key[:2] / f"{key}_{kind}_{RENDITION_SIZES[kind]}.jpg"
+
+
+def decode_reduced(path: Path, min_long_side: int) -> np.ndarray:
+    """
+    Decode ``path`` at the smallest scale whose longest side is still at
+    least ``min_long_side``. JPEGs are decoded at 1/2, 1/4 or 1/8 scale
+    straight from the DCT data, so a full-size frame is never built.
+    """
+    path = Path(path)
+    decoder = RENDITION_DECODERS.get(path.suffix.lower())
+    if decoder is not None:
+        return decoder(path, min_long_side)
+
+    probe = probe_file(path)
+    if probe is not None and probe.format == "JPEG":
+        long_side = max(probe.width, probe.height)
+        for factor, flag in JPEG_REDUCED_DECODES:
+            if long_side // factor >= min_long_side:
+                img = cv2.imread(str(path), flag)
+                if img is not None:
+                    return img
+                break
+
+    img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Could not load image: {path}")
+    return img
+
+
+def generate_renditions(source_path: str, key: str) -> Dict[str, Path]:
+    """
+    Write any missing renditions of an original and return every
+    rendition's path. The source is decoded once, at the reduced scale the
+    largest missing rendition needs, and each smaller rendition is scaled
+    down from the previous one.
+    """
+    paths = {kind: rendition_path(key, kind) for kind in RENDITION_SIZES}
+    missing = sorted(
+        (kind for kind, path in paths.items() if not path.exists()),
+        key=RENDITION_SIZES.get,
+        reverse=True,
+    )
+    if not missing:
+        return paths
+
+    img = decode_reduced(Path(source_path), RENDITION_SIZES[missing[0]])
+    for kind in missing:
+        img = fit_to_size(img, RENDITION_SIZES[kind])
+        _write_atomic(paths[kind], img)
+    return paths
+
+
+def generate_renditions_quietly(sources: Iterable[Tuple[str, str]]) -> None:
+    """Background-task wrapper over ``generate_renditions`` for (source_path, key) pairs; failures are logged"""
+    for source_path, key in sources:
+        try:
+            generate_renditions(source_path, key)
+        except Exception:
+            logger.exception("Failed to generate renditions for %s", source_path)
+
+
+def _write_atomic(path: Path, img: np.ndarray) -> None:
+    # Readers never see a partially written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, RENDITION_QUALITY])
+    if not ok:
+        raise ValueError(f"Could not encode rendition {path.name}")
+    scratch = path.with_name(f".{uuid.uuid4()}.tmp")
+    scratch.write_bytes(encoded.tobytes())
+    os.replace(scratch, path)
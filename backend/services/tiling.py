@@ -0,0 +1,143 @@
+"""
+Tiling Service
+Memory-bounded, multi-threaded processing of large images in overlapping tiles
+
+Configuration:
+- DARKROOM_TILE_MEMORY_MB: working-memory budget per image operation in MiB (default: 256, 0 disables the bound)
+- DARKROOM_TILE_THREADS: worker threads for tile processing (default: CPU count, 1 runs tiles inline)
+"""
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+# Peak scratch memory an operation may use besides its input and output (overridable via env var)
+TILE_MEMORY_BYTES = int(float(os.environ.get("DARKROOM_TILE_MEMORY_MB", "256")) * 1024 * 1024)
+
+# Worker threads for tile processing (overridable via env var)
+TILE_THREADS = int(os.environ.get("DARKROOM_TILE_THREADS", "0")) or os.cpu_count() or 1
+
+# Tiles are never smaller than this, however tight the budget
+MIN_TILE_SIZE = 64
+
+# Tiles are never larger than this, so a frame always splits into enough
+# work items to keep every thread busy. The grid depends only on the frame
+# and the budget, never on the thread count, which keeps results identical
+# for any number of workers.
+MAX_TILE_SIZE = 512
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class Tile:
+    """
+    One tile of an image: the ``inner`` region it is responsible for, and
+    the ``outer`` region (inner plus halo, clipped to the image) that is
+    read to compute it. ``local`` locates the inner region inside outer.
+    """
+
+    __slots__ = ("inner", "outer", "local")
+
+    def __init__(self, x0: int, y0: int, x1: int, y1: int, halo: int, width: int, height: int):
+        ox0, oy0 = max(0, x0 - halo), max(0, y0 - halo)
+        ox1, oy1 = min(width, x1 + halo), min(height, y1 + halo)
+        self.inner = (slice(y0, y1), slice(x0, x1))
+        self.outer = (slice(oy0, oy1), slice(ox0, ox1))
+        self.local = (slice(y0 - oy0, y1 - oy0), slice(x0 - ox0, x1 - ox0))
+
+    def __repr__(self) -> str:
+        (y, x) = self.inner
+        return f"Tile(x={x.start}:{x.stop}, y={y.start}:{y.stop})"
+
+
+def needs_tiling(shape: Tuple[int, ...], bytes_per_pixel: int, budget: Optional[int] = None) -> bool:
+    """True when processing a whole frame of ``shape`` would exceed the budget"""
+    budget = TILE_MEMORY_BYTES if budget is None else budget
+    return budget > 0 and shape[0] * shape[1] * bytes_per_pixel > budget
+
+
+def tile_size_for_budget(bytes_per_pixel: int, halo: int = 0, budget: Optional[int] = None) -> int:
+    """Side of the largest square tile whose haloed region fits the budget"""
+    budget = TILE_MEMORY_BYTES if budget is None else budget
+    side = int(math.sqrt(budget / bytes_per_pixel)) - 2 * halo
+    return max(MIN_TILE_SIZE, side)
+
+
+def iter_tiles(width: int, height: int, tile_size: int, halo: int = 0) -> Iterator[Tile]:
+    """Yield row-major tiles covering a ``width`` x ``height`` image"""
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            yield Tile(x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height), halo, width, height)
+
+
+def plan_tiles(
+    shape: Tuple[int, ...],
+    bytes_per_pixel: int = 0,
+    halo: int = 0,
+    budget: Optional[int] = None
+) -> List[Tile]:
+    """
+    Tiles for an image of ``shape``: at most ``MAX_TILE_SIZE`` square, and
+    smaller if ``bytes_per_pixel`` of scratch per haloed tile would exceed
+    the budget. A frame that fits in one tile is returned whole.
+    """
+    height, width = shape[:2]
+    tile_size = MAX_TILE_SIZE
+    if bytes_per_pixel and needs_tiling(shape, bytes_per_pixel, budget):
+        tile_size = min(tile_size, tile_size_for_budget(bytes_per_pixel, halo, budget))
+    if width <= tile_size and height <= tile_size:
+        return [Tile(0, 0, width, height, 0, width, height)]
+    return list(iter_tiles(width, height, tile_size, halo))
+
+
+def get_tile_executor() -> ThreadPoolExecutor:
+    """Shared thread pool for tile work, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TILE_THREADS, thread_name_prefix="darkroom-tile")
+        return _executor
+
+
+def map_tiles(func: Callable[[Tile], T], tiles: List[Tile], threads: Optional[int] = None) -> List[T]:
+    """
+    Call ``func`` on every tile and return the results in tile order.
+    cv2 and NumPy release the GIL, so tiles run concurrently on the shared
+    pool (or a private one when ``threads`` differs from ``TILE_THREADS``).
+    """
+    threads = TILE_THREADS if threads is None else threads
+    if threads <= 1 or len(tiles) <= 1:
+        return [func(tile) for tile in tiles]
+    if threads == TILE_THREADS:
+        return list(get_tile_executor().map(func, tiles))
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(func, tiles))
+
+
+def process_tiled(
+    img: np.ndarray,
+    func: Callable[[np.ndarray], np.ndarray],
+    tiles: List[Tile],
+    out: Optional[np.ndarray] = None,
+    threads: Optional[int] = None
+) -> np.ndarray:
+    """
+    Run ``func`` on every tile's haloed region and write its inner part into
+    ``out`` (allocated like ``img`` by default). ``func`` must return an
+    array of the same height and width as its input. Tiles write disjoint
+    regions, so they can run in parallel without locking.
+    """
+    if out is None:
+        out = np.empty_like(img)
+
+    def run(tile: Tile) -> None:
+        out[tile.inner] = func(img[tile.outer])[tile.local]
+
+    map_tiles(run, tiles, threads)
+    return out
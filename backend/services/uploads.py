@@ -0,0 +1,220 @@
+"""
+Upload Service
+Streams multipart file uploads straight to disk, hashing and validating as they arrive
+
+Configuration:
+- DARKROOM_IMPORT_MAX_MB: largest accepted file in MiB (default: 1024)
+- DARKROOM_IMPORT_COMMIT_CHUNK: image rows inserted per transaction by batch import (default: 0, one transaction)
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from backend.services.originals import ORIGINALS_DIR, new_incoming_path, store_incoming
+from backend.services.exif import read_metadata
+from backend.services.probe import SNIFF_BYTES, probe_file, sniff_image_format
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Largest accepted file (overridable via env var)
+IMPORT_MAX_BYTES = int(float(os.environ.get("DARKROOM_IMPORT_MAX_MB", "1024")) * 1024 * 1024)
+
+# Rows per commit for batch imports; 0 inserts everything in one transaction (overridable via env var)
+IMPORT_COMMIT_CHUNK = int(os.environ.get("DARKROOM_IMPORT_COMMIT_CHUNK", "0"))
+
+
+class UploadedFile:
+    """One file part of a streamed upload"""
+
+    def __init__(self, filename: str, content_type: str):
+        self.filename = filename
+        self.content_type = content_type
+        self.path: Optional[Path] = None
+        self.created = False  # True when this upload added a new blob to the store
+        self.size = 0
+        self.sha256: Optional[str] = None
+        self.format: Optional[str] = None
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self.orientation = 1
+        self.metadata: dict = {}  # Camera EXIF fields, see services/exif.py
+        self.error: Optional[str] = None
+
+
+class StreamingMultipartImporter:
+    """
+    Incremental ``multipart/form-data`` parser that writes file parts into
+    the originals store at ``dest_dir`` while the request body is still
+    arriving.
+
+    Feed it body chunks with ``write`` and call ``finish`` at the end. Each
+    file part goes to a ``.part`` temp file and is hashed (SHA-256) chunk
+    by chunk, so memory use is bounded by the chunk size, not the upload.
+    A part is rejected as soon as its declared content type or its first
+    ``SNIFF_BYTES`` bytes show it is not a supported image, or it exceeds
+    ``max_bytes``; the rest of that part is skipped. Accepted parts are
+    probed for size and orientation from their headers and have their EXIF
+    read (no pixel decode), and are then moved to their
+    content-addressed blob, or dropped in favour of an identical one.
+    Form fields without a filename are collected in ``fields``.
+    """
+
+    def __init__(self, content_type: str, dest_dir: Path = ORIGINALS_DIR, max_bytes: int = IMPORT_MAX_BYTES):
+        mime, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if mime != b"multipart/form-data" or not boundary:
+            raise ValueError("Expected a multipart/form-data body with a boundary")
+
+        self.dest_dir = Path(dest_dir)
+        self.max_bytes = max_bytes
+        self.files: List[UploadedFile] = []
+        self.fields: dict = {}
+
+        self._headers: dict = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._current: Optional[UploadedFile] = None
+        self._field_name: Optional[str] = None
+        self._field_value = b""
+        self._handle = None
+        self._hash = None
+        self._head = b""
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def write(self, chunk: bytes) -> None:
+        """Parse the next chunk of the request body"""
+        self._parser.write(chunk)
+
+    def finish(self) -> List[UploadedFile]:
+        """Finish parsing and return every file part, accepted or rejected"""
+        self._parser.finalize()
+        if self._current is not None:
+            # Body ended mid-part
+            self._reject("Upload ended before the file was complete")
+            self._current = None
+        return self.files
+
+    def discard(self) -> None:
+        """Delete the files this upload wrote (e.g. when the request is aborted); shared blobs are kept"""
+        self._close_handle()
+        for uploaded in self.files:
+            if uploaded.path is not None and (uploaded.created or uploaded.path.suffix == ".part"):
+                uploaded.path.unlink(missing_ok=True)
+                uploaded.path = None
+
+    # ------------------------------------------------------------ parser callbacks
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, disposition = parse_options_header(self._headers.get(b"content-disposition"))
+        name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        filename = disposition.get(b"filename")
+        if filename is None:
+            self._field_name, self._field_value = name, b""
+            return
+
+        content_type = self._headers.get(b"content-type", b"").decode("latin-1")
+        uploaded = UploadedFile(Path(filename.decode("utf-8", "replace")).name, content_type)
+        self.files.append(uploaded)
+        self._current = uploaded
+        if not content_type.startswith("image/"):
+            uploaded.error = "Invalid file type. Must be an image."
+            return
+
+        uploaded.path = new_incoming_path(self.dest_dir)
+        self._handle = uploaded.path.open("wb")
+        self._hash = hashlib.sha256()
+        self._head = b""
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        uploaded = self._current
+        if uploaded is None:
+            self._field_value += data[start:end]
+            return
+        if uploaded.error:
+            return
+
+        chunk = data[start:end]
+        uploaded.size += len(chunk)
+        if uploaded.size > self.max_bytes:
+            self._reject(f"File exceeds the {self.max_bytes // (1024 * 1024)} MiB upload limit")
+            return
+        if uploaded.format is None and len(self._head) < SNIFF_BYTES:
+            self._head += chunk[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES and not self._sniff():
+                return
+        self._hash.update(chunk)
+        self._handle.write(chunk)
+
+    def _on_part_end(self) -> None:
+        uploaded = self._current
+        if uploaded is None:
+            if self._field_name:
+                self.fields[self._field_name] = self._field_value.decode("utf-8", "replace")
+            self._field_name = None
+            return
+        try:
+            if not uploaded.error and (uploaded.format is not None or self._sniff()):
+                self._store(uploaded)
+        finally:
+            self._current = None
+
+    # --------------------------------------------------------------------- helpers
+
+    def _store(self, uploaded: UploadedFile) -> None:
+        self._close_handle()
+        probe = probe_file(uploaded.path)
+        if probe is None:
+            self._reject("Uploaded file is not a valid image")
+            return
+        uploaded.width, uploaded.height, uploaded.orientation = probe.width, probe.height, probe.orientation
+        uploaded.metadata = read_metadata(uploaded.path)
+
+        uploaded.sha256 = self._hash.hexdigest()
+        suffix = Path(uploaded.filename).suffix or f".{uploaded.format.lower()}"
+        uploaded.path, uploaded.created = store_incoming(uploaded.path, uploaded.sha256, suffix, self.dest_dir)
+
+    def _sniff(self) -> bool:
+        self._current.format = sniff_image_format(self._head)
+        if self._current.format is None:
+            self._reject("File content is not a supported image format")
+            return False
+        return True
+
+    def _reject(self, message: str) -> None:
+        uploaded = self._current
+        uploaded.error = message
+        self._close_handle()
+        if uploaded.path is not None:
+            uploaded.path.unlink(missing_ok=True)
+            uploaded.path = None
+
+    def _close_handle(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from backend.services.image_processor import ImageProcessor, AdjustmentPipeline, compile_point_lut
+
+
+def _sample_image():
+    rng = np.random.default_rng(42)
+    noise = rng.integers(0, 256, (64, 96, 3), dtype=np.uint8)
+    gradient = np.linspace(0, 255, 96, dtype=np.float32)[None, :, None]
+    smooth = np.broadcast_to(gradient, (64, 96, 3)).astype(np.uint8)
+    return np.concatenate([noise, smooth], axis=0)
+
+
+def _sequential(img, pipeline):
+    if pipeline.brightness:
+        img = ImageProcessor.adjust_brightness(img, pipeline.brightness)
+    if pipeline.contrast:
+        img = ImageProcessor.adjust_contrast(img, pipeline.contrast)
+    if pipeline.saturation:
+        img = ImageProcessor.adjust_saturation(img, pipeline.saturation)
+    if pipeline.exposure:
+        img = ImageProcessor.adjust_exposure(img, pipeline.exposure)
+    if pipeline.highlights:
+        img = ImageProcessor.adjust_highlights(img, pipeline.highlights)
+    if pipeline.shadows:
+        img = ImageProcessor.adjust_shadows(img, pipeline.shadows)
+    if pipeline.sharpness != 1.0:
+        img = ImageProcessor.sharpen(img, pipeline.sharpness)
+    return img
+
+
+@pytest.mark.parametrize("settings", [
+    {"brightness": 40},
+    {"brightness": -60},
+    {"contrast": 35},
+    {"saturation": 80},
+    {"saturation": -100},
+    {"exposure": 0.7},
+    {"highlights": -50},
+    {"shadows": 60},
+    {"sharpness": 1.8},
+])
+def test_single_stage_matches_sequential(settings):
+    img = _sample_image()
+    pipeline = AdjustmentPipeline(**settings)
+    diff = np.abs(_sequential(img, pipeline).astype(int) - pipeline.apply(img).astype(int))
+    assert diff.max() <= AdjustmentPipeline.TOLERANCE
+
+
+def test_combined_stages_match_sequential_on_average():
+    img = _sample_image()
+    pipeline = AdjustmentPipeline(
+        brightness=20, contrast=30, saturation=50, exposure=0.5,
+        highlights=-40, shadows=30, sharpness=1.3
+    )
+    diff = np.abs(_sequential(img, pipeline).astype(int) - pipeline.apply(img).astype(int))
+    assert diff.mean() <= AdjustmentPipeline.MEAN_TOLERANCE
+
+
+def test_identity_pipeline_returns_copy():
+    img = _sample_image()
+    result = AdjustmentPipeline().apply(img)
+    assert result is not img
+    assert np.array_equal(result, img)
+
+
+def test_from_dict_ignores_unknown_keys():
+    pipeline = AdjustmentPipeline.from_dict({"brightness": 10, "vignette": 5})
+    assert pipeline.brightness == 10
+    assert pipeline.sharpness == 1.0
+
+
+def test_point_stages_are_exact_via_lut():
+    img = _sample_image()
+    pipeline = AdjustmentPipeline(contrast=-25, exposure=0.4, highlights=30, shadows=-20)
+    assert np.array_equal(pipeline.apply(img), _sequential(img, pipeline))
+
+
+def test_compiled_lut_is_memoized_and_read_only():
+    first = compile_point_lut(0.5, 0.0, 10.0, 0.0, None)
+    hits = compile_point_lut.cache_info().hits
+    second = compile_point_lut(0.5, 0.0, 10.0, 0.0, None)
+    assert second is first
+    assert compile_point_lut.cache_info().hits == hits + 1
+    assert not first.flags.writeable
+
+
+def test_contrast_lut_requires_mean():
+    with pytest.raises(ValueError):
+        compile_point_lut(0.0, 20.0, 0.0, 0.0, None)
@@ -0,0 +1,59 @@
+import json
+
+import cv2
+import numpy as np
+
+from backend.services import batch
+from backend.services.edit_stack import EditStackRenderer
+from backend.services.image_cache import ByteBudgetLRU
+from backend.services.image_processor import AdjustmentPipeline
+
+
+def _write_source(tmp_path):
+    img = np.random.default_rng(4).integers(0, 256, (240, 320, 3), dtype=np.uint8)
+    source = tmp_path / "source.png"
+    cv2.imwrite(str(source), img)
+    return str(source), img
+
+
+def test_pool_workers_stream_a_chunk_from_paths(tmp_path, monkeypatch):
+    source, _ = _write_source(tmp_path)
+    edits = [("crop", {"x": 20, "y": 10, "width": 200, "height": 150}), ("rotate", {"angle": 90})]
+    adjustments = {"brightness": 20, "contrast": 15, "sharpness": 1.3}
+    tasks = [
+        {
+            "source_path": source,
+            "edits": edits,
+            "output_path": str(tmp_path / f"out_{index}.png"),
+            "quality": 95,
+            "adjustments_json": json.dumps(adjustments, sort_keys=True),
+        }
+        for index in range(4)
+    ]
+    tasks.append(dict(tasks[0], source_path=str(tmp_path / "missing.png"), output_path=str(tmp_path / "bad.png")))
+
+    monkeypatch.setattr(batch, "BATCH_PROCESSES", 2)
+    try:
+        errors, stats = batch.run_in_batch_pool(batch.render_chunk, tasks)
+    finally:
+        batch.shutdown_batch_pool()
+
+    assert errors[:4] == [None] * 4
+    assert "missing.png" in errors[4]
+    assert [stats[stage]["items"] for stage in ("read", "process", "encode")] == [5, 4, 4]
+
+    rendered = EditStackRenderer(ByteBudgetLRU(0)).render(source, edits)
+    expected = AdjustmentPipeline.from_dict(adjustments).apply(rendered)
+    for task in tasks[:4]:
+        assert np.array_equal(cv2.imread(task["output_path"]), expected)
+
+
+def test_pool_can_be_disabled(tmp_path, monkeypatch):
+    source, img = _write_source(tmp_path)
+    task = {"source_path": source, "edits": [("flip", {"horizontal": True})], "output_path": str(tmp_path / "out.png"), "quality": 95}
+
+    monkeypatch.setattr(batch, "BATCH_PROCESSES", 0)
+    errors, _ = batch.run_in_batch_pool(batch.render_chunk, [task])
+    assert errors == [None]
+    assert batch._pool is None
+    assert np.array_equal(cv2.imread(task["output_path"]), img[:, ::-1])
@@ -0,0 +1,220 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.api import brush as brush_api
+from backend.db import Base, get_db
+from backend.models.edits import LayerEdit
+from backend.models.layers import Layer
+from backend.services import brush
+from backend.services.brush import (
+    BrushStats,
+    apply_strokes,
+    pack_points,
+    pack_stroke,
+    parse_color,
+    prepare_points,
+    rasterize,
+    resample,
+    simplify,
+    stroke_bounds,
+    stroke_points,
+    unpack_stroke,
+)
+from backend.services.edit_stack import EditStackRenderer
+from backend.services.image_cache import ByteBudgetLRU
+from backend.services.image_processor import ImageProcessor
+
+
+def _stroke(points, color="#FF0000", size=8, opacity=1.0):
+    return {"points": points, "color": color, "size": size, "opacity": opacity}
+
+
+def test_parse_color_is_bgr():
+    assert parse_color("#FF8800") == (0, 136, 255)
+    assert parse_color("00ff00") == (0, 255, 0)
+
+
+def test_stroke_bounds_clip_to_image():
+    points = stroke_points([10, 10, 50, 20])
+    x0, y0, x1, y1 = stroke_bounds(points, 8, 40, 100)
+    assert x0 <= 6 and y0 <= 6 and x1 == 40 and y1 >= 24
+    assert stroke_bounds(stroke_points([-100, -100]), 8, 40, 40) is None
+
+
+def test_overlapping_segments_do_not_compound_opacity():
+    img = np.zeros((40, 80, 3), np.uint8)
+    # Back and forth over the same line: the old per-segment blend darkened the overlap each pass
+    result = ImageProcessor.apply_brush_stroke(img, [10, 20, 70, 20, 10, 20, 70, 20], "#FFFFFF", 6, 0.5)
+    assert result[20, 40].tolist() == [128, 128, 128]
+    assert result[2, 40].tolist() == [0, 0, 0]
+    assert img.max() == 0
+
+
+def test_pixels_outside_the_stroke_are_untouched():
+    rng = np.random.default_rng(3)
+    img = rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)
+    result = apply_strokes(img, [_stroke([20, 20, 30, 30])])
+    x0, y0, x1, y1 = stroke_bounds(stroke_points([20, 20, 30, 30]), 8, 64, 64)
+    outside = np.ones((64, 64), bool)
+    outside[y0:y1, x0:x1] = False
+    assert np.array_equal(result[outside], img[outside])
+    assert result[25, 25].tolist() == [0, 0, 255]
+
+
+def test_single_point_draws_a_dot():
+    img = np.zeros((20, 20, 3), np.uint8)
+    result = apply_strokes(img, [_stroke([10, 10], color="#00FF00", size=6)])
+    assert result[10, 10].tolist() == [0, 255, 0]
+    assert result[0, 0].tolist() == [0, 0, 0]
+
+
+def test_scale_maps_strokes_onto_a_proxy():
+    full = apply_strokes(np.zeros((100, 100, 3), np.uint8), [_stroke([20, 50, 80, 50], size=10)])
+    proxy = apply_strokes(np.zeros((50, 50, 3), np.uint8), [_stroke([20, 50, 80, 50], size=10)], scale=0.5)
+    assert full[50, 50, 2] == 255 and proxy[25, 25, 2] == 255
+    assert proxy[25, 5, 2] == 0 and proxy[10, 25, 2] == 0
+
+
+def test_strokes_keep_their_order_and_alpha_becomes_opaque():
+    img = np.zeros((30, 30, 4), np.uint8)
+    strokes = [_stroke([5, 15, 25, 15], "#FF0000"), _stroke([15, 5, 15, 25], "#0000FF")]
+    result = apply_strokes(img, strokes)
+    assert result[15, 15].tolist() == [255, 0, 0, 255]
+    assert result[15, 6].tolist() == [0, 0, 255, 255]
+
+
+def test_rasterize_is_the_union_of_paths():
+    a = stroke_points([2, 5, 18, 5])
+    mask = rasterize([(a, 3), (a, 3)], (0, 0, 20, 10))
+    assert mask.max() == 255
+    assert np.array_equal(mask, rasterize([(a, 3)], (0, 0, 20, 10)))
+
+
+def test_packed_points_round_trip_and_shrink():
+    points = [float(v) + 0.25 for v in range(2000)]
+    stroke = pack_stroke(_stroke(points))
+    assert isinstance(stroke["points"], str)
+    assert unpack_stroke(stroke) == _stroke(points)
+    # Pointer coordinates arrive as full-precision doubles
+    pointer = [v / 3 for v in range(2000)]
+    assert len(pack_points(pointer)) * 2.5 < len(json.dumps(pointer))
+    assert pack_stroke(stroke) == stroke
+    assert stroke_points(pack_points([1, 2, 3, 4, 5])).tolist() == [[1, 2], [3, 4]]
+
+
+def test_packed_and_list_strokes_render_identically(tmp_path):
+    img = np.random.default_rng(5).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+    path = tmp_path / "source.png"
+    cv2.imwrite(str(path), img)
+    strokes = [_stroke([5.5, 5, 40, 30.25, 70, 10], size=5, opacity=0.7)]
+    renderer = EditStackRenderer(ByteBudgetLRU(16 * 1024 * 1024))
+
+    packed = renderer.render(str(path), [("brush", {"strokes": [pack_stroke(s) for s in strokes]})])
+    assert np.array_equal(packed, apply_strokes(img, strokes))
+
+
+def _pointer_stream(count=6000):
+    """A dense, jittery pointer stream with repeated samples, like a real pointer"""
+    t = np.linspace(0, 4 * np.pi, count)
+    points = np.stack([200 + 150 * np.cos(t) + 4 * np.sin(9 * t), 200 + 120 * np.sin(1.3 * t)], axis=1)
+    points = np.repeat(points, 2, axis=0) + np.random.default_rng(1).normal(0, 0.02, (2 * count, 2))
+    return points.astype(np.float32)
+
+
+def _distance_to_polyline(points, polyline):
+    return np.min(
+        [brush._segment_distances(points, a, b) for a, b in zip(polyline[:-1], polyline[1:])],
+        axis=0,
+    )
+
+
+def test_simplification_cuts_points_within_tolerance():
+    points = _pointer_stream()
+    prepared = prepare_points(points, 0.25)
+    assert len(prepared) * 10 < len(points)
+    assert np.array_equal(prepared[[0, -1]], points[[0, -1]])
+    assert _distance_to_polyline(points, prepared).max() <= 0.5
+
+
+def test_collinear_points_collapse_to_the_endpoints():
+    xs = np.linspace(10, 190, 1000, dtype=np.float32)
+    line = np.stack([xs, np.full_like(xs, 50.5)], axis=1)
+    assert simplify(resample(line, 0.25), 0.25).tolist() == [[10, 50.5], [190, 50.5]]
+
+
+def test_reversals_survive_simplification():
+    there_and_back = np.array([[10, 20], [40, 20], [70, 20], [40, 20], [10, 20]], np.float32)
+    assert simplify(there_and_back, 0.25).tolist() == [[10, 20], [70, 20], [10, 20]]
+
+
+def test_short_strokes_and_zero_tolerance_are_unchanged():
+    dot = np.array([[5, 5]], np.float32)
+    assert resample(dot, 0.25) is dot and simplify(dot, 0.25) is dot
+    points = _pointer_stream(100)
+    assert simplify(resample(points, 0), 0) is points
+
+
+def test_brush_stats_count_points_in_and_out(monkeypatch):
+    stats = BrushStats()
+    monkeypatch.setattr(brush, "brush_stats", stats)
+    apply_strokes(np.zeros((400, 400, 3), np.uint8), [_stroke(_pointer_stream().ravel().tolist())])
+    counters = stats.stats()
+    assert counters["strokes"] == 1 and counters["points_in"] == 12000
+    assert 0 < counters["points_out"] * 10 < counters["points_in"]
+
+
+@pytest.fixture
+def brush_client(tmp_path):
+    source = tmp_path / "photo.png"
+    cv2.imwrite(str(source), np.zeros((40, 60, 3), np.uint8))
+    engine = create_engine(f"sqlite:///{tmp_path / 'brush.sqlite'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    with Session() as session:
+        session.add(Layer(id=1, project_id=0, type="image", content=str(source), width=60, height=40))
+        session.commit()
+
+    def get_test_db():
+        with Session() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(brush_api.router)
+    app.dependency_overrides[get_db] = get_test_db
+    return TestClient(app), Session
+
+
+@pytest.mark.parametrize("bad", [
+    {"color": "red"},
+    {"color": "#fff"},
+    {"points": [1, 2, 3]},
+    {"points": [1, float("nan"), 3, 4]},
+    {"size": 0},
+])
+def test_unrenderable_strokes_are_rejected_without_storing_an_edit(brush_client, bad):
+    client, Session = brush_client
+    stroke = {**_stroke([5, 5, 30, 20]), **bad}
+    response = client.post(
+        "/api/brush/save",
+        content=json.dumps({"layer_id": 1, "strokes": [stroke]}),
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.status_code == 422
+    with Session() as session:
+        assert session.query(LayerEdit).count() == 0
+
+
+def test_valid_strokes_are_stored_packed(brush_client):
+    client, Session = brush_client
+    response = client.post("/api/brush/save", json={"layer_id": 1, "strokes": [_stroke([5, 5, 30, 20])]})
+    assert response.status_code == 200
+    with Session() as session:
+        params = session.query(LayerEdit).one().params
+    assert unpack_stroke(params["strokes"][0]) == _stroke([5.0, 5.0, 30.0, 20.0])
@@ -0,0 +1,189 @@
+import cv2
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.db import Base
+from backend.models.layers import Layer
+from backend.models.projects import Project
+from backend.services import pyramid
+from backend.services.edit_stack import append_edit
+from backend.services.compositor import (
+    BLEND_MODES,
+    CompositeCache,
+    CompositeLayer,
+    composite,
+    composite_project,
+    flatten,
+    visible_layers,
+)
+
+
+def _solid(width, height, bgr, alpha=None):
+    img = np.empty((height, width, 3 if alpha is None else 4), np.uint8)
+    img[..., :3] = bgr
+    if alpha is not None:
+        img[..., 3] = alpha
+    return img
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'compositor.sqlite'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)() as session:
+        session.add(Project(id=1, name="collage"))
+        session.commit()
+        yield session
+
+
+def test_opacity_and_blend_modes_match_the_formulas():
+    backdrop = CompositeLayer(_solid(4, 4, (200, 100, 50)), (0, 0, 4, 4))
+    b = np.array([200, 100, 50]) / 255.0
+    s = np.array([100, 150, 250]) / 255.0
+    expected = {
+        "normal": s,
+        "multiply": b * s,
+        "screen": b + s - b * s,
+        "darken": np.minimum(b, s),
+        "difference": np.abs(b - s),
+        "overlay": np.where(b <= 0.5, 2 * b * s, 1 - 2 * (1 - b) * (1 - s)),
+    }
+    for mode, mixed in expected.items():
+        top = CompositeLayer(_solid(4, 4, (100, 150, 250)), (0, 0, 4, 4), opacity=0.5, blend_mode=mode)
+        out = composite([backdrop, top], 4, 4)
+        want = np.round((0.5 * mixed + 0.5 * b) * 255)
+        assert np.abs(out[0, 0, :3].astype(int) - want).max() <= 1, mode
+        assert out[0, 0, 3] == 255
+    assert {"soft_light", "color_dodge", "color_burn", "hard_light", "exclusion", "add", "subtract"} <= set(BLEND_MODES)
+
+
+def test_layers_are_clipped_to_the_canvas_and_blended_only_where_they_overlap():
+    base = CompositeLayer(_solid(10, 10, (10, 20, 30)), (0, 0, 10, 10))
+    # Hangs off the bottom-right corner; only its 4x4 overlap may change
+    corner = CompositeLayer(_solid(8, 8, (250, 250, 250)), (6, 6, 14, 14), blend_mode="multiply")
+    out = composite([base, corner], 10, 10)
+
+    expected = np.full((10, 10, 3), (10, 20, 30))
+    expected[6:, 6:] = np.round(np.array([10, 20, 30]) * 250 / 255)
+    assert np.abs(out[..., :3].astype(int) - expected).max() <= 1
+    assert out.shape == (10, 10, 4)
+
+    region = composite([base, corner], 10, 10, region=(4, 4, 10, 10))
+    assert np.array_equal(region, out[4:, 4:])
+
+
+def test_transparency_is_kept_and_stretched_layers_are_resampled():
+    half = CompositeLayer(_solid(2, 2, (0, 0, 255), alpha=128), (0, 0, 6, 4))
+    out = composite([half], 8, 4)
+    assert out[:, :6, 3].min() == 128 and out[:, 6:, 3].max() == 0
+    assert tuple(out[0, 0, :3]) == (0, 0, 255)
+    assert tuple(flatten(out)[0, 7]) == (255, 255, 255)
+
+
+def test_composite_project_skips_hidden_and_transparent_layers(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(pyramid, "PYRAMID_DIR", tmp_path / "pyramids")
+    red, blue = tmp_path / "red.png", tmp_path / "blue.png"
+    cv2.imwrite(str(red), _solid(20, 10, (0, 0, 255)))
+    cv2.imwrite(str(blue), _solid(10, 10, (255, 0, 0)))
+    common = dict(project_id=1, type="image", width=None, height=None)
+    db.add_all([
+        Layer(id=1, content=str(red), z_index=0, x=0, y=0, opacity=100, visible=True, **common),
+        Layer(id=2, content=str(blue), z_index=1, x=10, y=0, opacity=50, visible=True, **common),
+        Layer(id=3, content=str(blue), z_index=2, x=0, y=0, opacity=100, visible=False, **common),
+        Layer(id=4, content=str(blue), z_index=3, x=0, y=0, opacity=0, visible=True, **common),
+        Layer(id=5, content="hello", z_index=4, x=0, y=0, opacity=100, visible=True, project_id=1, type="text"),
+    ])
+    db.commit()
+    for layer in db.query(Layer).filter(Layer.type == "image"):
+        layer.width, layer.height = (20, 10) if layer.id == 1 else (10, 10)
+    db.commit()
+
+    assert [layer.id for layer in visible_layers(db, 1)] == [1, 2]
+    out = composite_project(db, 1)
+    assert out.shape == (10, 20, 4)
+    assert tuple(out[5, 5]) == (0, 0, 255, 255)
+    assert tuple(out[5, 15]) == (128, 0, 128, 255)
+
+    small = composite_project(db, 1, scale=0.5)
+    assert small.shape == (5, 10, 4)
+
+
+def _stack(db, tmp_path, top_mode="normal"):
+    rng = np.random.default_rng(7)
+    paths = []
+    for name, size in (("base", (120, 80)), ("middle", (60, 40)), ("small", (10, 10)), ("top", (50, 50))):
+        path = tmp_path / f"{name}.png"
+        cv2.imwrite(str(path), rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+        paths.append((path, size))
+    placements = [(0, 0, 100, "normal"), (20, 10, 80, "multiply"), (5, 5, 70, "normal"), (60, 20, 60, top_mode)]
+    for index, ((path, (width, height)), (x, y, opacity, mode)) in enumerate(zip(paths, placements), start=1):
+        db.add(Layer(
+            id=index, project_id=1, type="image", content=str(path), z_index=index, x=x, y=y,
+            width=width, height=height, opacity=opacity, visible=True, blend_mode=mode,
+        ))
+    db.commit()
+
+
+def _close(a, b):
+    return a.shape == b.shape and np.abs(a.astype(int) - b.astype(int)).max() <= 1
+
+
+@pytest.mark.parametrize("top_mode", ["normal", "screen"])
+def test_cached_composite_rerenders_only_the_changed_area(db, tmp_path, top_mode):
+    _stack(db, tmp_path, top_mode)
+    cache = CompositeCache()
+    assert np.array_equal(cache.render(db, 1, size=(120, 80)), composite_project(db, 1, size=(120, 80)))
+    assert cache.render(db, 1, size=(120, 80)) is not None and cache.stats()["unchanged_renders"] == 1
+
+    small = db.get(Layer, 3)
+    for step, (x, opacity) in enumerate([(15, 70), (30, 70), (30, 40), (100, 40)]):
+        before = cache.stats()["pixels_composited"]
+        small.x, small.opacity = x, opacity
+        db.commit()
+        out = cache.render(db, 1, size=(120, 80))
+        # From the second change on, the cached stacks below and above the layer are used
+        assert _close(out, composite_project(db, 1, size=(120, 80))), step
+        # The old and new 10x10 placements, never the 120x80 canvas
+        assert cache.stats()["pixels_composited"] - before <= 2 * 100
+
+    stats = cache.stats()
+    assert (stats["full_renders"], stats["incremental_renders"]) == (1, 4)
+
+    # Changing another layer, hiding one and deleting one stay exact
+    db.get(Layer, 2).blend_mode = "overlay"
+    db.commit()
+    assert np.array_equal(cache.render(db, 1, size=(120, 80)), composite_project(db, 1, size=(120, 80)))
+    db.get(Layer, 4).visible = False
+    db.delete(db.get(Layer, 3))
+    db.commit()
+    assert np.array_equal(cache.render(db, 1, size=(120, 80)), composite_project(db, 1, size=(120, 80)))
+
+
+def test_cache_notices_edit_stack_changes_and_respects_its_budget(db, tmp_path):
+    _stack(db, tmp_path)
+    cache = CompositeCache(max_bytes=120 * 80 * 4)
+    first = cache.render(db, 1, size=(120, 80))
+    append_edit(db, db.get(Layer, 3), "flip", {"horizontal": True})
+    db.commit()
+
+    out = cache.render(db, 1, size=(120, 80))
+    assert np.array_equal(out, composite_project(db, 1, size=(120, 80)))
+    assert not np.array_equal(out, first)
+    assert cache.stats()["incremental_renders"] == 1
+    assert cache.stats()["bytes"] <= 120 * 80 * 4
+
+
+def test_cache_keeps_render_locks_only_for_cached_entries(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(pyramid, "PYRAMID_DIR", tmp_path / "pyramids")
+    _stack(db, tmp_path)
+    # Room for one preview canvas at a time
+    cache = CompositeCache(max_bytes=60 * 40 * 4)
+    for scale in (0.25, 0.3, 0.35, 0.4, 0.45):
+        cache.render(db, 1, scale=scale)
+    assert len(cache._key_locks) == cache.stats()["entries"] == 1
+    assert cache.stats()["full_renders"] == 5
+
+    cache.invalidate(1)
+    assert not cache._key_locks
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.compute import ComputeExecutor, ComputeQueueFull
+
+
+def test_jobs_run_off_the_event_loop_thread():
+    executor = ComputeExecutor(workers=2, max_queue=4)
+
+    async def main():
+        return await executor.run("adjustments", threading.get_ident), threading.get_ident()
+
+    worker, loop = asyncio.run(main())
+    assert worker != loop
+    stats = executor.stats()
+    assert stats["endpoints"]["adjustments"]["completed"] == 1
+    assert stats["queue_depth"] == 0 and stats["running"] == 0
+
+
+def test_endpoint_limit_caps_concurrency():
+    executor = ComputeExecutor(workers=4, max_queue=16, limits={"export": 1})
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def job():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    async def main():
+        await asyncio.gather(*(executor.run("export", job) for _ in range(4)))
+
+    asyncio.run(main())
+    stats = executor.stats()["endpoints"]["export"]
+    assert peak[0] == 1
+    assert stats["completed"] == 4 and stats["limit"] == 1
+    assert stats["wait_ms_max"] > 0
+
+
+def test_full_queue_rejects_new_jobs():
+    executor = ComputeExecutor(workers=1, max_queue=1)
+
+    async def main():
+        # One job occupies the only worker, the next one waits in the queue
+        running = asyncio.ensure_future(executor.run("batch", time.sleep, 0.1))
+        await asyncio.sleep(0.02)
+        waiting = asyncio.ensure_future(executor.run("batch", time.sleep, 0))
+        await asyncio.sleep(0.02)
+        assert executor.stats()["queue_depth"] == 1
+        with pytest.raises(ComputeQueueFull):
+            await executor.run("batch", time.sleep, 0)
+        await asyncio.gather(running, waiting)
+
+    asyncio.run(main())
+    stats = executor.stats()["endpoints"]["batch"]
+    assert stats["rejected"] == 1 and stats["completed"] == 2
+
+
+def test_failed_jobs_propagate_and_are_counted():
+    executor = ComputeExecutor(workers=1, max_queue=4)
+
+    def boom():
+        raise ValueError("bad image")
+
+    with pytest.raises(ValueError):
+        asyncio.run(executor.run("crop", boom))
+    assert executor.stats()["endpoints"]["crop"]["failed"] == 1
@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+
+from backend.services import edit_stack
+from backend.services.edit_stack import EditStackRenderer
+from backend.services.image_cache import ByteBudgetLRU
+from backend.services.image_processor import ImageProcessor
+
+
+def _write_source(tmp_path):
+    img = np.random.default_rng(3).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    path = tmp_path / "source.png"
+    cv2.imwrite(str(path), img)
+    return str(path), img
+
+
+def test_render_matches_direct_operations(tmp_path):
+    path, img = _write_source(tmp_path)
+    renderer = EditStackRenderer(ByteBudgetLRU(64 * 1024 * 1024))
+    edits = [
+        ("crop", {"x": 10, "y": 20, "width": 100, "height": 80}),
+        ("rotate", {"angle": 90}),
+    ]
+
+    expected = ImageProcessor.rotate_image(ImageProcessor.crop_image(img, 10, 20, 100, 80), 90)
+    assert np.array_equal(renderer.render(path, edits), expected)
+
+
+def test_appending_an_edit_only_computes_the_last_step(tmp_path, monkeypatch):
+    path, _ = _write_source(tmp_path)
+    renderer = EditStackRenderer(ByteBudgetLRU(64 * 1024 * 1024))
+    calls = []
+
+    def counting_text(img, params, scale):
+        calls.append(params["text"])
+        return img.copy()
+
+    monkeypatch.setitem(edit_stack.OPERATIONS, "text", counting_text)
+    edits = [("text", {"text": "a"}), ("text", {"text": "b"})]
+    renderer.render(path, edits)
+    renderer.render(path, edits + [("text", {"text": "c"})])
+
+    assert calls == ["a", "b", "c"]
+
+
+def test_consecutive_geometric_edits_are_fused(tmp_path):
+    path, img = _write_source(tmp_path)
+    renderer = EditStackRenderer(ByteBudgetLRU(64 * 1024 * 1024))
+    edits = [
+        ("crop", {"x": 10, "y": 10, "width": 120, "height": 90}),
+        ("rotate", {"angle": 25}),
+        ("crop", {"x": 20, "y": 20, "width": 60, "height": 50}),
+        ("flip", {"horizontal": True}),
+    ]
+
+    expected = ImageProcessor.crop_image(
+        ImageProcessor.rotate_image(ImageProcessor.crop_image(img, 10, 10, 120, 90), 25),
+        20, 20, 60, 50
+    )[:, ::-1]
+    result = renderer.render(path, edits)
+
+    assert result.shape == expected.shape
+    assert np.abs(result.astype(int) - expected.astype(int)).max() <= 1
+    # Only the end of the fused run is cached
+    assert renderer.cache.stats()["entries"] == 1
+
+
+def test_rendered_images_are_read_only(tmp_path):
+    path, _ = _write_source(tmp_path)
+    renderer = EditStackRenderer(ByteBudgetLRU(64 * 1024 * 1024))
+    result = renderer.render(path, [("crop", {"x": 0, "y": 0, "width": 50, "height": 50})])
+    assert not result.flags.writeable
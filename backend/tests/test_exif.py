@@ -0,0 +1,140 @@
+import io
+import struct
+from datetime import datetime
+
+import numpy as np
+import cv2
+from PIL import Image as PILImage
+
+from backend.services.exif import preview_bytes, read_metadata, read_metadata_buffer, read_metadata_bulk
+
+
+def _jpeg(width=64, height=48):
+    img = np.full((height, width, 3), 128, np.uint8)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+class TiffBuilder:
+    """Little-endian TIFF writer: IFDs are lists of (tag, type, values); blobs are appended after them"""
+
+    def __init__(self, magic=42):
+        self.data = bytearray(struct.pack("<2sHI", b"II", magic, 8))
+
+    def blob(self, payload):
+        offset = len(self.data)
+        self.data += payload + b"\x00" * (len(payload) & 1)
+        return offset
+
+    def ifd(self, entries, next_ifd=0):
+        offset = len(self.data)
+        out = bytearray(struct.pack("<H", len(entries)))
+        tail = bytearray()
+        tail_start = offset + 2 + 12 * len(entries) + 4
+        for tag, field_type, value in sorted(entries):
+            if field_type == 2:
+                raw, count = value.encode() + b"\x00", len(value) + 1
+            elif field_type == 5:
+                raw, count = b"".join(struct.pack("<II", *pair) for pair in value), len(value)
+            elif field_type == 7:
+                raw, count = value, len(value)
+            else:
+                code = {3: "H", 4: "I"}[field_type]
+                raw, count = struct.pack(f"<{len(value)}{code}", *value), len(value)
+            if len(raw) <= 4:
+                out += struct.pack("<HHI", tag, field_type, count) + raw.ljust(4, b"\x00")
+            else:
+                out += struct.pack("<HHII", tag, field_type, count, tail_start + len(tail))
+                tail += raw + b"\x00" * (len(raw) & 1)
+        out += struct.pack("<I", next_ifd)
+        self.data += out + tail
+        return offset
+
+    def patch_long(self, position, value):
+        struct.pack_into("<I", self.data, position, value)
+
+
+def _nef(tmp_path):
+    builder = TiffBuilder()
+    preview = _jpeg(160, 120)
+    preview_offset = builder.blob(preview)
+    small = _jpeg(32, 24)
+
+    # Nikon type 3 maker note: "Nikon\0" + version, then a TIFF structure its offsets are relative to
+    note = TiffBuilder()
+    small_offset = note.blob(small)
+    note_preview_ifd = note.ifd([(0x0201, 4, [small_offset]), (0x0202, 4, [len(small)])])
+    note.patch_long(4, note.ifd([(0x0011, 4, [note_preview_ifd])]))
+    maker_note = b"Nikon\x00\x02\x10\x00\x00" + bytes(note.data)
+
+    exif = builder.ifd([
+        (0x829A, 5, [(1, 250)]),
+        (0x829D, 5, [(28, 10)]),
+        (0x8827, 3, [800]),
+        (0x9003, 2, "2024:05:01 10:20:30"),
+        (0x920A, 5, [(500, 10)]),
+        (0xA434, 2, "NIKKOR Z 50mm f/1.8 S"),
+        (0x927C, 7, maker_note),
+    ])
+    sub_ifd = builder.ifd([(0x0201, 4, [preview_offset]), (0x0202, 4, [len(preview)])])
+    root = builder.ifd([
+        (0x010F, 2, "NIKON CORPORATION"),
+        (0x0110, 2, "NIKON Z 6"),
+        (0x0112, 3, [8]),
+        (0x014A, 4, [sub_ifd]),
+        (0x8769, 4, [exif]),
+    ])
+    builder.patch_long(4, root)
+    path = tmp_path / "shot.nef"
+    path.write_bytes(bytes(builder.data))
+    return path, preview, small
+
+
+def test_reads_tiff_raw_metadata_and_previews(tmp_path):
+    path, preview, small = _nef(tmp_path)
+    meta = read_metadata(path)
+
+    assert meta["make"] == "NIKON CORPORATION" and meta["model"] == "NIKON Z 6"
+    assert meta["lens_model"] == "NIKKOR Z 50mm f/1.8 S"
+    assert (meta["orientation"], meta["iso"], meta["aperture"], meta["focal_length"]) == (8, 800, 2.8, 50.0)
+    assert (meta["shutter_speed"], meta["exposure_time"]) == ("1/250", 0.004)
+    assert meta["captured_at"] == datetime(2024, 5, 1, 10, 20, 30)
+    # The SubIFD preview and the smaller one found through the maker note, largest first
+    assert [preview_bytes(path, p) for p in meta["previews"]] == [preview, small]
+
+
+def test_reads_exif_from_jpeg():
+    exif = PILImage.Exif()
+    exif[0x010F] = "Canon"
+    exif[0x0110] = "EOS R5"
+    exif[0x0112] = 6
+    exif.get_ifd(0x8769).update({0x8827: 100, 0x829A: 2.0, 0x829D: 5.6})
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (40, 30)).save(buffer, "JPEG", exif=exif)
+
+    meta = read_metadata_buffer(buffer.getvalue())
+    assert (meta["make"], meta["model"], meta["orientation"], meta["iso"]) == ("Canon", "EOS R5", 6, 100)
+    assert (meta["shutter_speed"], meta["aperture"]) == ("2", 5.6)
+
+
+def test_reads_panasonic_rw2():
+    builder = TiffBuilder(magic=0x55)
+    embedded = _jpeg()
+    jpeg_offset = builder.blob(embedded)
+    root = builder.ifd([(0x010F, 2, "Panasonic"), (0x0017, 3, [400]), (0x002E, 7, embedded)])
+    builder.patch_long(4, root)
+
+    meta = read_metadata_buffer(bytes(builder.data))
+    assert (meta["make"], meta["iso"]) == ("Panasonic", 400)
+    assert [p["length"] for p in meta["previews"]] == [len(embedded)]
+
+
+def test_unreadable_files_give_empty_metadata(tmp_path):
+    garbage = tmp_path / "garbage.cr2"
+    garbage.write_bytes(b"II*\x00\xff\xff\xff\x00" + b"\x00" * 32)
+    empty = tmp_path / "empty.nef"
+    empty.write_bytes(b"")
+
+    results = dict(read_metadata_bulk([garbage, empty, tmp_path / "missing.arw"], workers=2))
+    assert results[str(garbage)]["make"] is None and results[str(garbage)]["previews"] == []
+    assert results[str(empty)]["make"] is None
+    assert "error" in results[str(tmp_path / "missing.arw")]
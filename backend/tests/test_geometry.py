@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+
+from backend.services.geometry import AffineChain
+from backend.services.image_processor import ImageProcessor
+
+
+def _image():
+    return np.random.default_rng(5).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+
+def test_quarter_turns_and_flips_are_lossless():
+    img = _image()
+    chain = AffineChain(160, 120).crop(10, 5, 100, 80).rotate(90).flip(True).crop(3, 4, 50, 60)
+
+    expected = np.rot90(img[5:85, 10:110], -1)[:, ::-1][4:64, 3:53]
+    assert chain.lossless
+    assert np.array_equal(chain.apply(img), expected)
+    # The composed matrix describes the same pixel mapping
+    warped = cv2.warpAffine(img, chain.matrix[:2], chain.size, flags=cv2.INTER_NEAREST)
+    assert np.array_equal(warped, expected)
+
+
+def test_rotate_matches_image_processor():
+    img = _image()
+    chain = AffineChain(160, 120).rotate(30)
+    assert np.array_equal(chain.apply(img), ImageProcessor.rotate_image(img, 30))
+
+
+def test_crop_before_rotate_keeps_removed_pixels_black():
+    img = _image()
+    expected = ImageProcessor.rotate_image(ImageProcessor.crop_image(img, 10, 10, 120, 90), 25)
+    result = AffineChain(160, 120).crop(10, 10, 120, 90).rotate(25).apply(img)
+    assert result.shape == expected.shape
+    assert np.abs(result.astype(int) - expected.astype(int)).max() <= 1
+
+
+def test_resampling_after_crop_of_resampled_image_needs_new_chain():
+    chain = AffineChain(160, 120).rotate(10).crop(0, 0, 50, 50)
+    assert not chain.can_resample
+
+
+def test_tiled_warp_matches_single_warp():
+    img = np.random.default_rng(6).integers(0, 256, (700, 1100, 3), dtype=np.uint8)
+    expected = ImageProcessor.rotate_image(img, 17)
+    serial = AffineChain(1100, 700).rotate(17).apply(img, threads=1)
+    threaded = AffineChain(1100, 700).rotate(17).apply(img, threads=4)
+
+    assert np.array_equal(serial, threaded)
+    assert np.abs(serial.astype(int) - expected.astype(int)).max() <= 1
@@ -0,0 +1,60 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.services.image_cache import DecodedImageCache
+
+
+def _write(path, value, size=(32, 48)):
+    img = np.full((size[0], size[1], 3), value, dtype=np.uint8)
+    cv2.imwrite(str(path), img)
+    return str(path)
+
+
+def test_repeated_loads_hit_the_cache(tmp_path):
+    cache = DecodedImageCache(max_bytes=1024 * 1024)
+    path = _write(tmp_path / "a.png", 10)
+
+    first = cache.get(path)
+    second = cache.get(path)
+
+    assert second is first
+    assert not first.flags.writeable
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_rewritten_file_is_decoded_again(tmp_path):
+    cache = DecodedImageCache(max_bytes=1024 * 1024)
+    path = _write(tmp_path / "a.png", 10)
+    cache.get(path)
+
+    _write(tmp_path / "a.png", 200, size=(40, 48))
+    os.utime(path, ns=(0, 10 ** 18))
+
+    assert cache.get(path)[0, 0, 0] == 200
+    assert cache.stats()["entries"] == 1
+
+
+def test_byte_budget_evicts_least_recently_used(tmp_path):
+    one_image = 32 * 48 * 3
+    cache = DecodedImageCache(max_bytes=2 * one_image)
+    a = _write(tmp_path / "a.png", 1)
+    b = _write(tmp_path / "b.png", 2)
+    c = _write(tmp_path / "c.png", 3)
+
+    cache.get(a)
+    cache.get(b)
+    cache.get(a)
+    cache.get(c)
+
+    assert cache.evictions == 1
+    assert cache.stats()["bytes"] == 2 * one_image
+    cache.get(a)
+    assert cache.hits == 2
+
+
+def test_missing_file_raises_value_error(tmp_path):
+    with pytest.raises(ValueError):
+        DecodedImageCache().get(str(tmp_path / "missing.png"))
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend.db import Base, create_db_engine
+from backend.models.jobs import BatchJobItem
+from backend.services import jobs
+from backend.services.jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'jobs.sqlite'}")
+    Base.metadata.create_all(engine)
+    calls = []
+
+    def echo(db, layer_id, payload):
+        calls.append(layer_id)
+        if layer_id in payload.get("fail", []):
+            raise ValueError(f"cannot process {layer_id}")
+        return {"layer": layer_id * payload.get("factor", 1)}
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, "echo", echo)
+    queue = JobQueue(sessionmaker(bind=engine, expire_on_commit=False), workers=3, poll_interval=0.05)
+    queue.calls = calls
+    yield queue
+    queue.stop(timeout=5)
+
+
+def test_job_runs_every_item_and_reports_progress(queue):
+    with queue.session_factory() as db:
+        job = queue.submit(db, "echo", [1, 2, 3, 4], {"factor": 10, "fail": [3]})
+        assert queue.status(db, job.id)["status"] == "queued"
+
+    assert queue.run_pending() == 4
+
+    with queue.session_factory() as db:
+        status = queue.status(db, job.id, include_items=True)
+    assert status["status"] == "completed"
+    assert (status["completed"], status["failed"], status["progress"]) == (3, 1, 100.0)
+    assert [item["result"] for item in status["items"]] == [{"layer": 10}, {"layer": 20}, None, {"layer": 40}]
+    assert status["items"][2]["error"] == "cannot process 3"
+
+
+def test_higher_priority_jobs_run_first(queue):
+    with queue.session_factory() as db:
+        queue.submit(db, "echo", [1, 2], {})
+        urgent = queue.submit(db, "echo", [100, 200], {})
+        queue.set_priority(db, urgent.id, 5)
+
+    queue.run_pending()
+    assert queue.calls == [100, 200, 1, 2]
+
+
+def test_cancel_skips_pending_items(queue):
+    with queue.session_factory() as db:
+        job = queue.submit(db, "echo", [1, 2, 3], {})
+    assert queue.run_next()
+
+    with queue.session_factory() as db:
+        queue.cancel(db, job.id)
+    assert queue.run_pending() == 0
+
+    with queue.session_factory() as db:
+        status = queue.status(db, job.id)
+    assert status["status"] == "cancelled"
+    assert (status["completed"], status["cancelled"]) == (1, 2)
+
+
+def test_workers_resume_items_interrupted_by_a_restart(queue):
+    with queue.session_factory() as db:
+        job = queue.submit(db, "echo", list(range(20)), {})
+        # Simulate a crash while an item was being processed
+        item = db.query(BatchJobItem).filter(BatchJobItem.job_id == job.id).first()
+        item.status = "running"
+        db.commit()
+
+    queue.start()
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        with queue.session_factory() as db:
+            status = queue.status(db, job.id)
+        if status["status"] == "completed":
+            break
+        time.sleep(0.05)
+
+    assert status["status"] == "completed"
+    assert status["completed"] == 20
+    assert sorted(queue.calls) == list(range(20))
+
+
+def test_sqlite_engine_uses_wal_and_waits_for_locks(queue):
+    with queue.session_factory() as db:
+        assert db.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert db.execute(text("PRAGMA busy_timeout")).scalar() > 0
+
+
+def _locked_finish(queue, monkeypatch, failures):
+    finish = queue._finish
+
+    def flaky(*args):
+        if failures:
+            failures.pop()
+            raise OperationalError("UPDATE batch_jobs", {}, Exception("database is locked"))
+        return finish(*args)
+
+    monkeypatch.setattr(jobs, "JOB_LOCK_RETRY_DELAY", 0)
+    monkeypatch.setattr(queue, "_finish", flaky)
+
+
+def test_finishing_an_item_is_retried_while_the_database_is_locked(queue, monkeypatch):
+    _locked_finish(queue, monkeypatch, [1] * (jobs.JOB_LOCK_RETRIES - 1))
+    with queue.session_factory() as db:
+        job = queue.submit(db, "echo", [1, 2], {})
+
+    assert queue.run_pending() == 2
+    with queue.session_factory() as db:
+        assert queue.status(db, job.id)["status"] == "completed"
+
+
+def test_items_are_requeued_when_the_database_stays_locked(queue, monkeypatch):
+    _locked_finish(queue, monkeypatch, [1] * jobs.JOB_LOCK_RETRIES)
+    with queue.session_factory() as db:
+        job = queue.submit(db, "echo", [1, 2], {})
+
+    with pytest.raises(OperationalError):
+        queue.run_next()
+    with queue.session_factory() as db:
+        status = queue.status(db, job.id)
+    assert (status["status"], status["pending"], status["running"]) == ("running", 2, 0)
+
+    # Once the lock clears the item runs again and the job closes
+    assert queue.run_pending() == 2
+    with queue.session_factory() as db:
+        status = queue.status(db, job.id)
+    assert (status["status"], status["completed"]) == ("completed", 2)
+    assert queue.calls == [1, 1, 2]
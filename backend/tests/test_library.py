@@ -0,0 +1,126 @@
+import io
+from datetime import datetime
+
+import pytest
+from PIL import Image as PILImage
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.db import Base
+from backend.models.models import Image
+from backend.services.library import SORT_FIELDS, LibraryQueryError, backfill_metadata, facet_counts, query_images
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.sqlite'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)() as session:
+        yield session
+
+
+@pytest.fixture
+def catalogue(db):
+    cameras = [("Canon", "EOS R5"), ("NIKON", "Z 6"), ("NIKON", "Z 8")]
+    for i in range(30):
+        make, model = cameras[i % 3]
+        db.add(Image(
+            filename=f"IMG_{i:04d}.jpg",
+            filepath=f"/photos/{i}.jpg",
+            camera_make=make,
+            camera_model=model,
+            iso=100 * (1 + i % 4),
+            aperture=2.8 if i % 2 else 5.6,
+            # Every fifth image has no capture time; a few share one
+            captured_at=None if i % 5 == 0 else datetime(2024, 1, 1 + i // 3),
+        ))
+    db.commit()
+    return db
+
+
+def _all_pages(db, **kwargs):
+    ids, cursor, pages = [], None, 0
+    while True:
+        images, cursor = query_images(db, cursor=cursor, **kwargs)
+        ids.extend(image.id for image in images)
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+
+def _expected(db, key, descending):
+    images = db.query(Image).all()
+    present = sorted((i for i in images if key(i) is not None), key=lambda i: (key(i), i.id), reverse=descending)
+    missing = sorted((i for i in images if key(i) is None), key=lambda i: i.id, reverse=descending)
+    ordered = present + missing if descending else missing + present
+    return [image.id for image in ordered]
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_cursor_pages_cover_every_image_once_in_order(catalogue, descending):
+    ids, pages = _all_pages(catalogue, sort="captured_at", descending=descending, limit=4)
+    assert ids == _expected(catalogue, lambda i: i.captured_at, descending)
+    assert pages == 8
+
+    ids, _ = _all_pages(catalogue, sort="iso", descending=descending, limit=7)
+    assert ids == _expected(catalogue, lambda i: i.iso, descending)
+
+
+def test_filters_combine(catalogue):
+    images, cursor = query_images(catalogue, {"camera_make": "NIKON", "iso_min": 200, "iso_max": 300, "aperture_max": 4.0})
+    assert cursor is None
+    assert images and all(
+        i.camera_make == "NIKON" and 200 <= i.iso <= 300 and i.aperture == 2.8 for i in images
+    )
+    expected = catalogue.query(Image).filter(
+        Image.camera_make == "NIKON", Image.iso.between(200, 300), Image.aperture <= 4.0
+    ).count()
+    assert len(images) == expected
+
+    january = {"captured_at_min": datetime(2024, 1, 3), "captured_at_max": datetime(2024, 1, 4)}
+    assert {i.captured_at.day for i in query_images(catalogue, january)[0]} == {3, 4}
+
+
+def test_bad_queries_are_rejected(catalogue):
+    with pytest.raises(LibraryQueryError):
+        query_images(catalogue, sort="metadata")
+    with pytest.raises(LibraryQueryError):
+        query_images(catalogue, {"filepath": "/photos/1.jpg"})
+    with pytest.raises(LibraryQueryError):
+        query_images(catalogue, cursor="not a cursor")
+
+
+def test_facet_counts(catalogue):
+    assert facet_counts(catalogue, "camera_make") == [("NIKON", 20), ("Canon", 10)]
+    assert facet_counts(catalogue, "camera_model", {"camera_make": "NIKON"}) == [("Z 6", 10), ("Z 8", 10)]
+
+
+def test_backfill_reads_metadata_of_existing_images(db, tmp_path):
+    exif = PILImage.Exif()
+    exif[0x010F] = "FUJIFILM"
+    exif[0x0110] = "X-T5"
+    exif.get_ifd(0x8769).update({0x8827: 640, 0x9003: "2023:07:14 18:30:00"})
+    path = tmp_path / "old.jpg"
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (16, 16)).save(buffer, "JPEG", exif=exif)
+    path.write_bytes(buffer.getvalue())
+
+    db.add_all([
+        Image(filename="old.jpg", filepath=str(path)),
+        Image(filename="gone.jpg", filepath=str(tmp_path / "gone.jpg")),
+    ])
+    db.commit()
+
+    assert backfill_metadata(db, workers=1) == 1
+    image = db.query(Image).filter(Image.filename == "old.jpg").one()
+    assert (image.camera_make, image.camera_model, image.iso) == ("FUJIFILM", "X-T5", 640)
+    assert image.captured_at == datetime(2023, 7, 14, 18, 30)
+    assert backfill_metadata(db, workers=1) == 0
+
+
+@pytest.mark.parametrize("sort", SORT_FIELDS)
+def test_every_sort_reads_an_index(db, sort):
+    query = db.query(Image.id).order_by(getattr(Image, sort).desc(), Image.id.desc()).limit(10)
+    sql = str(query.statement.compile(compile_kwargs={"literal_binds": True}))
+    plan = " ".join(str(row[-1]) for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
@@ -0,0 +1,90 @@
+import hashlib
+import io
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.db import Base
+from backend.models.layers import Layer
+from backend.models.models import Image, OriginalBlob
+from backend.services.library import ImageInUseError, delete_image
+from backend.services.originals import (
+    acquire_original,
+    content_hash_of,
+    release_original,
+    remove_unreferenced,
+    save_original,
+)
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'originals.sqlite'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)() as session:
+        yield session
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    data = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+    first = save_original(io.BytesIO(data), ".PNG", root=tmp_path)
+    second = save_original(io.BytesIO(data), ".png", root=tmp_path)
+    other = save_original(io.BytesIO(data + b"x"), ".png", root=tmp_path)
+
+    digest = hashlib.sha256(data).hexdigest()
+    assert first == (tmp_path / digest[:2] / f"{digest}.png", digest, len(data), True)
+    assert second == (first[0], digest, len(data), False)
+    assert other[0] != first[0] and other[3]
+    assert sorted(p.name for p in tmp_path.rglob("*") if p.is_file()) == sorted([first[0].name, other[0].name])
+    assert content_hash_of(first[0], root=tmp_path) == digest
+    assert content_hash_of(tmp_path / "elsewhere.png", root=tmp_path) is None
+
+
+def test_blobs_are_reference_counted_by_images(tmp_path, db):
+    path, digest, size, _ = save_original(io.BytesIO(b"original bytes"), ".jpg", root=tmp_path)
+    for name in ("a.jpg", "b.jpg"):
+        db.add(Image(filename=name, filepath=str(path), content_hash=digest))
+        acquire_original(db, digest, path, size)
+    db.commit()
+    assert db.get(OriginalBlob, digest).ref_count == 2
+
+    assert release_original(db, digest) is None
+    db.commit()
+    assert release_original(db, digest) == path.resolve()
+    db.commit()
+    assert db.get(OriginalBlob, digest) is None
+
+
+def test_failed_import_keeps_referenced_blobs(tmp_path, db):
+    path, digest, size, _ = save_original(io.BytesIO(b"shared"), ".jpg", root=tmp_path)
+    acquire_original(db, digest, path, size)
+    db.commit()
+    remove_unreferenced(db, digest, path)
+    assert path.exists()
+
+    orphan, orphan_digest, _, _ = save_original(io.BytesIO(b"orphan"), ".jpg", root=tmp_path)
+    remove_unreferenced(db, orphan_digest, orphan)
+    assert not orphan.exists()
+
+
+def test_deleting_images_releases_the_original(tmp_path, db):
+    path, digest, size, _ = save_original(io.BytesIO(b"deleted bytes"), ".jpg", root=tmp_path)
+    images = [Image(filename=name, filepath=str(path.resolve()), content_hash=digest) for name in ("a.jpg", "b.jpg")]
+    for image in images:
+        db.add(image)
+        acquire_original(db, digest, path, size)
+    layer = Layer(project_id=0, type="image", content=str(path.resolve()))
+    db.add(layer)
+    db.commit()
+
+    assert delete_image(db, images[0]) is False
+    assert path.exists() and db.get(OriginalBlob, digest).ref_count == 1
+    with pytest.raises(ImageInUseError):
+        delete_image(db, images[1])
+
+    db.delete(layer)
+    db.commit()
+    assert delete_image(db, images[1]) is True
+    assert not path.exists() and db.get(OriginalBlob, digest) is None
+    assert db.query(Image).count() == 0
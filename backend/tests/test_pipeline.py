@@ -0,0 +1,60 @@
+import threading
+import time
+
+from backend.services.pipeline import PipelineStats, StagedPipeline
+
+
+def test_outputs_keep_input_order_and_errors_skip_later_stages():
+    seen = []
+
+    def parse(value):
+        if value == "x":
+            raise ValueError("not a number")
+        return int(value)
+
+    def record(value):
+        seen.append(value)
+        return value * 2
+
+    pipeline = StagedPipeline([("parse", parse), ("double", record)])
+    outputs, stats = pipeline.run(["1", "x", "3"])
+
+    assert outputs[0] == 2 and outputs[2] == 6
+    assert isinstance(outputs[1], ValueError)
+    assert seen == [1, 3]
+    assert stats["parse"]["items"] == 3 and stats["double"]["items"] == 2
+
+
+def test_stages_overlap_and_queues_bound_work_in_flight():
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def read(value):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        return value
+
+    def encode(value):
+        time.sleep(0.03)
+        with lock:
+            in_flight[0] -= 1
+        return value
+
+    pipeline = StagedPipeline([("read", read), ("encode", encode)], queue_size=1)
+    started = time.perf_counter()
+    outputs, stats = pipeline.run(list(range(10)))
+    elapsed = time.perf_counter() - started
+
+    assert outputs == list(range(10))
+    # Reads hide behind encodes, and the reader never gets far ahead
+    assert elapsed < 10 * (0.01 + 0.03)
+    assert peak[0] <= 3
+    assert stats["encode"]["occupancy"] > stats["read"]["occupancy"]
+    assert stats["read"]["blocked_s"] > 0
+
+    totals = PipelineStats()
+    totals.add(stats)
+    totals.add(stats)
+    assert totals.snapshot()["stages"]["read"]["items"] == 20
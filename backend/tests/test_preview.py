@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.api import adjustments
+from backend.db import Base, get_db
+from backend.models.layers import Layer
+from backend.services.preview import PreviewCoalescer
+
+
+def test_coalescer_forgets_keys_once_their_newest_request_finishes():
+    coalescer = PreviewCoalescer()
+
+    async def request(key, rendered):
+        ticket = coalescer.begin(key)
+        try:
+            async with coalescer.lock(key):
+                if not coalescer.is_current(key, ticket):
+                    return
+                await asyncio.sleep(0)
+                rendered.append(ticket)
+        finally:
+            coalescer.finish(key, ticket)
+
+    async def drag():
+        rendered = []
+        await asyncio.gather(*(request(layer_id, rendered) for layer_id in range(50) for _ in range(3)))
+        return rendered
+
+    rendered = asyncio.run(drag())
+    # Per layer: the first request renders, the middle one is superseded by the newest
+    assert len(rendered) == 100
+    assert coalescer.superseded == 50
+    assert not coalescer._latest and not coalescer._locks
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'preview.sqlite'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    with Session() as session:
+        session.add(Layer(id=1, project_id=0, type="image", content=str(tmp_path / "photo.jpg")))
+        session.commit()
+
+    def get_test_db():
+        with Session() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(adjustments.router)
+    app.dependency_overrides[get_db] = get_test_db
+    monkeypatch.setattr(adjustments, "preview_coalescer", PreviewCoalescer())
+    return TestClient(app)
+
+
+def test_started_previews_are_returned_even_when_superseded(client, monkeypatch):
+    async def render(endpoint, fn, layer, request):
+        # A newer slider position arrives while this frame is rendering
+        adjustments.preview_coalescer.begin(layer.id)
+        return b"frame"
+
+    monkeypatch.setattr(adjustments.compute_executor, "run", render)
+    response = client.post("/api/adjustments/preview", json={"layer_id": 1, "brightness": 10})
+    assert response.status_code == 200 and response.content == b"frame"
+
+
+@pytest.mark.parametrize("body", [
+    {"preview_size": None},
+    {"preview_size": 0},
+    {"quality": 0},
+    {"quality": 101},
+])
+def test_invalid_preview_parameters_are_rejected(client, body):
+    assert client.post("/api/adjustments/preview", json={"layer_id": 1, **body}).status_code == 422
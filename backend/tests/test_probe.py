@@ -0,0 +1,65 @@
+import io
+
+import pytest
+from PIL import Image as PILImage
+
+from backend.services.probe import probe_bytes, probe_file, sniff_image_format
+
+
+def _encode(fmt, size=(37, 23), orientation=None, **options):
+    img = PILImage.new("RGB", size, (200, 40, 90))
+    if orientation is not None:
+        exif = PILImage.Exif()
+        exif[274] = orientation
+        options["exif"] = exif
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def test_sniff_image_format():
+    assert sniff_image_format(b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01") == "JPEG"
+    assert sniff_image_format(b"RIFF\x24\x00\x00\x00WEBP") == "WEBP"
+    assert sniff_image_format(b"II*\x00\x08\x00\x00\x00\x00\x00\x00\x00") == "TIFF"
+    assert sniff_image_format(b"<html><body>") is None
+
+
+@pytest.mark.parametrize("fmt, options", [
+    ("JPEG", {}),
+    ("JPEG", {"progressive": True}),
+    ("PNG", {}),
+    ("TIFF", {}),
+    ("GIF", {}),
+    ("BMP", {}),
+    ("WEBP", {"lossless": False}),
+    ("WEBP", {"lossless": True}),
+])
+def test_probe_matches_pil(fmt, options):
+    data = _encode(fmt, **options)
+    probe = probe_bytes(data)
+    with PILImage.open(io.BytesIO(data)) as img:
+        assert (probe.format, probe.width, probe.height) == (img.format, *img.size)
+    assert probe.orientation == 1
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "TIFF", "WEBP"])
+def test_probe_reads_exif_orientation(fmt):
+    probe = probe_bytes(_encode(fmt, orientation=6))
+    assert (probe.width, probe.height, probe.orientation) == (37, 23, 6)
+    assert probe.display_size == (23, 37)
+
+
+def test_probe_needs_only_the_header(tmp_path):
+    data = _encode("JPEG", size=(640, 480), quality=95)
+    # Everything up to the frame header is enough; the scan data is never read
+    assert (probe_bytes(data[:1024]).width, probe_bytes(data[:1024]).height) == (640, 480)
+
+    path = tmp_path / "image.jpg"
+    path.write_bytes(data)
+    assert probe_file(path).format == "JPEG"
+
+
+def test_probe_rejects_truncated_and_foreign_data():
+    assert probe_bytes(b"\xff\xd8\xff\xe0\x00\x10JFIF") is None
+    assert probe_bytes(b"\x89PNG\r\n\x1a\n") is None
+    assert probe_bytes(b"plain text, not an image") is None
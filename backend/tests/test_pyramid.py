@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from backend.services import pyramid
+from backend.services.pyramid import PreviewPyramid, fit_to_size
+
+
+def _write_source(tmp_path, width=2000, height=1200):
+    rng = np.random.default_rng(7)
+    img = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    path = tmp_path / "source.png"
+    cv2.imwrite(str(path), img)
+    return path
+
+
+def test_build_creates_levels_and_thumbnail(tmp_path, monkeypatch):
+    monkeypatch.setattr(pyramid, "PYRAMID_DIR", tmp_path / "pyramids")
+    manifest = PreviewPyramid(str(_write_source(tmp_path))).build()
+
+    sizes = [(level["width"], level["height"]) for level in manifest["levels"]]
+    # The 1/8 level would be smaller than the thumbnail, so it is skipped
+    assert sizes == [(256, 154), (500, 300), (1000, 600)]
+    assert (manifest["width"], manifest["height"]) == (2000, 1200)
+
+
+def test_concurrent_builds_of_one_pyramid_both_succeed(tmp_path, monkeypatch):
+    monkeypatch.setattr(pyramid, "PYRAMID_DIR", tmp_path / "pyramids")
+    source = str(_write_source(tmp_path))
+    img = cv2.imread(source)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        manifests = list(pool.map(lambda _: PreviewPyramid(source).build(img), range(4)))
+
+    assert all(manifest == manifests[0] for manifest in manifests)
+    cache_dir = PreviewPyramid(source).cache_dir
+    assert not list(cache_dir.glob("*.tmp"))
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["level_2.png", "level_4.png", "manifest.json", "thumbnail.png"]
+
+
+def test_load_for_size_picks_smallest_sufficient_level(tmp_path, monkeypatch):
+    monkeypatch.setattr(pyramid, "PYRAMID_DIR", tmp_path / "pyramids")
+    proxy = PreviewPyramid(str(_write_source(tmp_path)))
+
+    img, scale = proxy.load_for_size(400)
+    assert img.shape[:2] == (300, 500)
+    assert scale == 0.25
+
+    img, scale = proxy.load_for_size(1500)
+    assert img.shape[:2] == (1200, 2000)
+    assert scale == 1.0
+
+
+def test_fit_to_size_keeps_aspect_ratio():
+    img = np.zeros((300, 600, 3), dtype=np.uint8)
+    assert fit_to_size(img, 200).shape[:2] == (100, 200)
+    assert fit_to_size(img, 1000) is img
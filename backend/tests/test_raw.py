@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+import pytest
+
+from backend.services import raw
+
+
+@pytest.fixture
+def raw_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(raw, "DEVELOPED_DIR", tmp_path / "developed")
+    monkeypatch.setattr(raw, "RAW_PREVIEW_DIR", tmp_path / "raw_previews")
+    path = tmp_path / "shot.nef"
+    path.write_bytes(b"not really a raw file")
+    return path
+
+
+def test_developed_path_depends_on_settings_and_size(raw_file):
+    default = raw.developed_path(raw_file)
+    assert raw.developed_path(raw_file, {"exposure_compensation": 0.0, "unrelated": 1}) == default
+    assert raw.developed_path(raw_file, {"exposure_compensation": 1.0}) != default
+    assert raw.developed_path(raw_file, half_size=True) != default
+
+
+def test_develop_is_cached_by_file_and_settings(raw_file, monkeypatch):
+    calls = []
+
+    def postprocess(path, settings, half_size):
+        calls.append((settings["exposure_compensation"], half_size))
+        return np.full((40, 60, 3), 100, np.uint8)
+
+    monkeypatch.setattr(raw, "_postprocess", postprocess)
+    first = raw.develop(raw_file, {"exposure_compensation": 1.0, "shadow_recovery": False})
+    again = raw.develop(raw_file, {"exposure_compensation": 1.0, "shadow_recovery": False})
+    raw.develop(raw_file, {"exposure_compensation": 1.0, "shadow_recovery": False}, half_size=True)
+
+    assert calls == [(1.0, False), (1.0, True)]
+    assert np.array_equal(first, again)
+    assert cv2.imread(str(raw.developed_path(raw_file, {"exposure_compensation": 1.0, "shadow_recovery": False}))).shape == (40, 60, 3)
+
+
+def test_lift_shadows_brightens_darks_only():
+    tones = np.arange(256, dtype=np.uint8).reshape(1, 256, 1).repeat(3, axis=2)
+    lifted = raw.lift_shadows(tones)[0, :, 0].astype(int)
+    assert lifted[0] == 0 and lifted[255] == 255
+    assert lifted[40] > 40 + 15
+    assert np.all(np.diff(lifted) >= 0)
+
+
+def test_decoding_without_rawpy_is_reported(raw_file, monkeypatch):
+    monkeypatch.setattr(raw, "rawpy", None)
+    with pytest.raises(raw.RawUnavailable):
+        raw.extract_embedded_preview(raw_file)
+    with pytest.raises(raw.RawUnavailable):
+        raw.develop(raw_file)
+
+
+def test_embedded_preview_is_found_without_rawpy(raw_file, monkeypatch):
+    monkeypatch.setattr(raw, "rawpy", None)
+    jpeg = cv2.imencode(".jpg", np.full((30, 40, 3), 90, np.uint8))[1].tobytes()
+    # Minimal TIFF whose IFD0 points at a JPEG right after it
+    ifd = b"\x02\x00" + b"\x01\x02\x04\x00\x01\x00\x00\x00" + (38).to_bytes(4, "little")
+    ifd += b"\x02\x02\x04\x00\x01\x00\x00\x00" + len(jpeg).to_bytes(4, "little") + b"\x00" * 4
+    raw_file.write_bytes(b"II*\x00\x08\x00\x00\x00" + ifd + jpeg)
+
+    preview = raw.extract_embedded_preview(raw_file)
+    assert preview.read_bytes() == jpeg
+    assert raw.load_preview(raw_file).shape == (30, 40, 3)
@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.api import thumbnails as thumbnails_api
+from backend.db import Base, get_db
+from backend.models.models import Image
+from backend.services import thumbnails
+from backend.services.thumbnails import decode_reduced, generate_renditions, rendition_key, rendition_url
+
+
+def _write_jpeg(path, width=1600, height=1200):
+    img = np.random.default_rng(3).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    cv2.imwrite(str(path), img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return path
+
+
+def test_jpeg_is_decoded_at_reduced_scale(tmp_path):
+    source = _write_jpeg(tmp_path / "photo.jpg")
+    assert decode_reduced(source, 256).shape[:2] == (300, 400)  # 1/4 still covers 256
+    assert decode_reduced(source, 700).shape[:2] == (600, 800)  # 1/2
+    assert decode_reduced(source, 1000).shape[:2] == (1200, 1600)  # needs the full frame
+
+
+def test_renditions_are_generated_once_per_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, "RENDITION_DIR", tmp_path / "renditions")
+    monkeypatch.setattr(thumbnails, "RENDITION_SIZES", {"thumbnail": 128, "preview": 512})
+    source = _write_jpeg(tmp_path / "photo.jpg")
+    key = "ab" * 32
+
+    paths = generate_renditions(str(source), key)
+    assert paths["thumbnail"] == tmp_path / "renditions" / "ab" / f"{key}_thumbnail_128.jpg"
+    assert cv2.imread(str(paths["thumbnail"])).shape[:2] == (96, 128)
+    assert cv2.imread(str(paths["preview"])).shape[:2] == (384, 512)
+
+    # Existing renditions are reused without touching the source
+    source.unlink()
+    assert generate_renditions(str(source), key) == paths
+
+    # A new target size is a new rendition, not the stale one
+    monkeypatch.setitem(thumbnails.RENDITION_SIZES, "thumbnail", 64)
+    assert thumbnails.rendition_path(key, "thumbnail") != paths["thumbnail"]
+
+
+def test_rendition_key_prefers_content_hash(tmp_path):
+    source = _write_jpeg(tmp_path / "photo.jpg", 64, 48)
+    assert rendition_key(str(source), "f" * 64) == "f" * 64
+    assert rendition_key(str(source)) == rendition_key(str(source))
+    assert len(rendition_key(str(source))) == 40
+
+
+def test_registered_decoders_handle_their_suffixes(tmp_path, monkeypatch):
+    calls = []
+
+    def decoder(path, min_long_side):
+        calls.append((path.name, min_long_side))
+        return np.zeros((10, 20, 3), np.uint8)
+
+    monkeypatch.setitem(thumbnails.RENDITION_DECODERS, ".xyz", decoder)
+    assert decode_reduced(tmp_path / "shot.XYZ", 256).shape == (10, 20, 3)
+    assert calls == [("shot.XYZ", 256)]
+
+
+def test_only_versioned_rendition_urls_are_immutable(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, "RENDITION_DIR", tmp_path / "renditions")
+    source = _write_jpeg(tmp_path / "photo.jpg", 320, 240)
+    engine = create_engine(f"sqlite:///{tmp_path / 'thumbs.sqlite'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    with Session() as session:
+        session.add(Image(id=1, filename="photo.jpg", filepath=str(source)))
+        session.commit()
+
+    def get_test_db():
+        with Session() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(thumbnails_api.router)
+    app.dependency_overrides[get_db] = get_test_db
+    client = TestClient(app)
+
+    url = rendition_url(1, "thumbnail", str(source))
+    assert url.startswith("/api/images/1/thumbnail?v=")
+    versioned = client.get(url)
+    assert versioned.status_code == 200 and "immutable" in versioned.headers["cache-control"]
+    plain = client.get("/api/images/1/thumbnail")
+    assert plain.headers["cache-control"] == "no-cache"
+    assert client.get("/api/images/1/thumbnail", headers={"If-None-Match": plain.headers["etag"]}).status_code == 304
+
+    # A new size changes the version, so old versioned URLs fall back to revalidation
+    monkeypatch.setitem(thumbnails.RENDITION_SIZES, "thumbnail", 64)
+    assert rendition_url(1, "thumbnail", str(source)) != url
+    stale = client.get(url)
+    assert stale.headers["cache-control"] == "no-cache" and stale.headers["etag"] != plain.headers["etag"]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from backend.services.image_processor import AdjustmentPipeline
+from backend.services.tiling import iter_tiles, plan_tiles, process_tiled
+
+
+def _image():
+    rng = np.random.default_rng(8)
+    return rng.integers(0, 256, (300, 420, 3), dtype=np.uint8)
+
+
+def test_tiles_cover_every_pixel_once():
+    coverage = np.zeros((300, 420), dtype=int)
+    for tile in iter_tiles(420, 300, 128, halo=4):
+        coverage[tile.inner] += 1
+        outer_y, outer_x = tile.outer
+        assert outer_y.start >= 0 and outer_x.stop <= 420
+    assert (coverage == 1).all()
+
+
+def test_small_images_are_not_tiled():
+    assert len(plan_tiles((100, 100, 3), 32, budget=1024 * 1024)) == 1
+    assert len(plan_tiles((100, 100, 3), 32, budget=0)) == 1
+
+
+def test_process_tiled_passes_halo_to_neighbourhood_kernels():
+    img = _image()
+    shift = lambda region: np.roll(region, 1, axis=1)
+    tiles = list(iter_tiles(420, 300, 64, halo=1))
+    result = process_tiled(img, shift, tiles)
+    assert np.array_equal(result[:, 1:-1], np.roll(img, 1, axis=1)[:, 1:-1])
+
+
+@pytest.mark.parametrize("settings", [
+    {"sharpness": 1.8},
+    {"contrast": 40, "exposure": 0.3, "sharpness": 1.5},
+    {"brightness": 30, "contrast": -25, "saturation": 20},
+])
+def test_tiled_pipeline_matches_whole_frame(settings):
+    img = _image()
+    pipeline = AdjustmentPipeline(**settings)
+    whole = pipeline.apply(img, memory_budget=0)
+    # Forces tiles of MIN_TILE_SIZE pixels
+    tiled = pipeline.apply(img, memory_budget=64 * 1024)
+
+    diff = np.abs(whole.astype(int) - tiled.astype(int))
+    assert diff.max() <= 1
+    if "brightness" not in settings:
+        assert diff.max() == 0
+
+
+def test_results_do_not_depend_on_thread_count():
+    img = np.random.default_rng(9).integers(0, 256, (700, 1100, 3), dtype=np.uint8)
+    pipeline = AdjustmentPipeline(brightness=15, contrast=30, saturation=-20, sharpness=1.4)
+
+    serial = pipeline.apply(img, threads=1)
+    assert np.array_equal(pipeline.apply(img, threads=3), serial)
+    assert np.array_equal(pipeline.apply(img, threads=8), serial)
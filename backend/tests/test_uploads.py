@@ -0,0 +1,88 @@
+import hashlib
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.services.uploads import StreamingMultipartImporter
+
+BOUNDARY = "darkroomboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def _body(parts):
+    body = b""
+    for name, filename, content_type, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if content_type:
+            body += f"Content-Type: {content_type}\r\n".encode()
+        body += b"\r\n" + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def _png(width, height):
+    img = np.random.default_rng(7).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def _feed(importer, body, chunk_size=7):
+    for start in range(0, len(body), chunk_size):
+        importer.write(body[start:start + chunk_size])
+    return importer.finish()
+
+
+def test_parts_stream_to_disk_with_hash_and_dimensions(tmp_path):
+    png = _png(40, 30)
+    body = _body([
+        ("files", "a.png", "image/png", png),
+        ("note", None, None, b"hello"),
+        ("files", "b.PNG", "image/png", png),
+    ])
+    importer = StreamingMultipartImporter(CONTENT_TYPE, tmp_path)
+    files = _feed(importer, body)
+
+    digest = hashlib.sha256(png).hexdigest()
+    assert [f.error for f in files] == [None, None]
+    assert importer.fields == {"note": "hello"}
+    # Identical content is stored once
+    assert [f.created for f in files] == [True, False]
+    for f in files:
+        assert f.path == tmp_path / digest[:2] / f"{digest}.png"
+        assert f.path.read_bytes() == png
+        assert f.sha256 == digest
+        assert (f.size, f.width, f.height, f.format) == (len(png), 40, 30, "PNG")
+    assert not list(tmp_path.rglob("*.part"))
+
+
+def test_invalid_parts_are_rejected_without_leaving_files(tmp_path):
+    png = _png(16, 16)
+    body = _body([
+        ("files", "notes.txt", "text/plain", b"plain text"),
+        ("files", "fake.jpg", "image/jpeg", b"<html>not an image</html>"),
+        ("files", "big.png", "image/png", png + b"\x00" * 2048),
+        ("files", "ok.png", "image/png", png),
+    ])
+    importer = StreamingMultipartImporter(CONTENT_TYPE, tmp_path, max_bytes=len(png) + 1024)
+    files = _feed(importer, body, chunk_size=64)
+
+    assert "Must be an image" in files[0].error
+    assert "not a supported image" in files[1].error
+    assert "upload limit" in files[2].error
+    assert files[3].error is None
+    assert [p for p in tmp_path.rglob("*") if p.is_file()] == [files[3].path]
+
+
+def test_discard_removes_written_files(tmp_path):
+    importer = StreamingMultipartImporter(CONTENT_TYPE, tmp_path)
+    body = _body([("files", "a.png", "image/png", _png(8, 8))])
+    importer.write(body[:-40])
+    importer.discard()
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+def test_rejects_non_multipart_bodies(tmp_path):
+    with pytest.raises(ValueError):
+        StreamingMultipartImporter("application/json", tmp_path)